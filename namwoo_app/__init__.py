@@ -3,6 +3,7 @@ import os
 import logging
 from logging.config import dictConfig
 from flask import Flask
+import click
 import redis
 from .config.config import Config
 from .utils.logging_utils import JsonFormatter
@@ -173,6 +174,161 @@ def register_cli_commands(app):
             logger.exception("Error during database table creation via CLI.")
             print(f"An error occurred during table creation: {e}")
 
+    @app.cli.command("backfill-product-embeddings")
+    def backfill_product_embeddings_command():
+        """Seeds the deduplicated product_embeddings table from legacy per-warehouse embeddings."""
+        with app.app_context():
+            from .services import product_service
+            count = product_service.backfill_product_embeddings_from_legacy_rows()
+            if count is None:
+                print("Error: Database session not available.")
+            else:
+                print(f"Backfilled {count} item embeddings into product_embeddings.")
+
+    @app.cli.command("backfill-product-derived-fields")
+    def backfill_product_derived_fields_command():
+        """Precomputes base_name/color, description_text and spec attributes for products ingested before those columns existed."""
+        with app.app_context():
+            from .services import product_service
+            count = product_service.backfill_product_derived_fields()
+            if count is None:
+                print("Error: Database session not available.")
+                return
+            print(f"Backfilled derived fields for {count} product rows.")
+            count = product_service.backfill_product_spec_attributes()
+            print(f"Parsed spec attributes for {count} product rows.")
+
+    @app.cli.command("refresh-catalog-index")
+    def refresh_catalog_index_command():
+        """Rebuilds derived catalog tables (brands, accessories, neighbours, branches) and invalidates cached searches."""
+        with app.app_context():
+            from .services import catalog_index_service
+            if catalog_index_service.refresh_catalog_derived_data():
+                print("Catalog derived data refreshed.")
+            else:
+                print("Error: Database session not available.")
+
+    @app.cli.command("benchmark-tool-encoding")
+    @click.option("--input", "input_path", default=None, help="JSONL of recorded tool outputs (raw results or tool messages with 'content').")
+    @click.option("--queries", "queries_path", default=None, help="Text file of find_products queries to record outputs from the live catalog.")
+    @click.option("--budget", default=None, type=int, help="Token budget (default: TOOL_RESULT_TOKEN_BUDGET).")
+    @click.option("--format", "fmt", default=None, help="json or table (default: TOOL_RESULT_FORMAT).")
+    def benchmark_tool_encoding_command(input_path, queries_path, budget, fmt):
+        """Compares prompt tokens of indented JSON vs the compact tool result encoder."""
+        import json
+        from .utils import token_utils, tool_result_encoder
+        outputs = []
+        if input_path:
+            with open(input_path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if isinstance(record, dict) and isinstance(record.get("content"), str):
+                        record = record["content"]
+                    outputs.append(record)
+        if queries_path:
+            with app.app_context():
+                from .services import product_service
+                with open(queries_path, encoding="utf-8") as f:
+                    for query in (q.strip() for q in f):
+                        if query and not query.startswith("#"):
+                            outputs.append(product_service.find_products(query=query, warehouse_names=None))
+        if not outputs:
+            print("Error: provide --input and/or --queries.")
+            return
+        report = tool_result_encoder.benchmark(
+            (o for o in outputs if o is not None),
+            budget or Config.TOOL_RESULT_TOKEN_BUDGET,
+            count=lambda text: token_utils.count_tokens(text, Config.OPENAI_CHAT_MODEL),
+            fmt=fmt or Config.TOOL_RESULT_FORMAT,
+        )
+        report["tokenizer"] = "tiktoken" if token_utils.is_exact() else "estimate (tiktoken unavailable)"
+        print(json.dumps(report, indent=2))
+
+    @app.cli.command("benchmark-query-parser")
+    @click.option("--corpus", "corpus_path", default=None, help="Text file with one search query per line.")
+    @click.option("--logs", "logs_dir", default=None, help="Directory whose *.log/*.json files are scanned for find_products queries (default: LOG_DIR).")
+    @click.option("--rounds", default=5, type=int, help="Times the corpus is replayed.")
+    def benchmark_query_parser_command(corpus_path, logs_dir, rounds):
+        """Times query parsing with and without the query_parser LRU over real queries."""
+        import glob
+        import json
+        import os
+        import re
+        from .utils import query_parser
+        queries = []
+        if corpus_path:
+            with open(corpus_path, encoding="utf-8") as f:
+                queries += [q.strip() for q in f if q.strip() and not q.startswith("#")]
+        else:
+            # Providers log "requested tool: find_products with args: {'query': ...}".
+            query_arg = re.compile(r"""find_products\b.*?['"]query['"]\s*:\s*(['"])(.*?)(?<!\\)\1""")
+            for path in sorted(glob.glob(os.path.join(logs_dir or Config.LOG_DIR, "*.log*")) +
+                               glob.glob(os.path.join(logs_dir or Config.LOG_DIR, "*.json*"))):
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    queries += [m.group(2) for line in f if "find_products" in line for m in query_arg.finditer(line)]
+        if not queries:
+            print("Error: no queries found; provide --corpus or point --logs at logs with find_products calls.")
+            return
+        print(json.dumps(query_parser.benchmark(queries, rounds=rounds), indent=2))
+
+    @app.cli.command("migrate-vector-storage")
+    def migrate_vector_storage_command():
+        """Converts embedding columns and the HNSW index to EMBEDDING_STORAGE / EMBEDDING_DIMENSION."""
+        with app.app_context():
+            from .utils import db_utils, vector_storage
+            mode = vector_storage.normalize_mode(Config.EMBEDDING_STORAGE)
+            with db_utils.get_db_session() as session:
+                if not session:
+                    print("Error: Database session not available.")
+                    return
+                try:
+                    statements = vector_storage.migrate_embedding_storage(session, mode, Config.EMBEDDING_DIMENSION)
+                except ValueError as e:
+                    session.rollback()
+                    print(f"Error: {e}")
+                    return
+                session.commit()
+                for stmt in statements:
+                    print(stmt)
+                print(f"Embedding storage is now '{mode}' with {Config.EMBEDDING_DIMENSION} dimensions.")
+
+    @app.cli.command("vector-storage-report")
+    @click.option("--modes", default="vector,halfvec,binary", help="Comma-separated storage modes to compare.")
+    @click.option("--dimensions", default=None, help="Comma-separated dimensions (default: EMBEDDING_DIMENSION).")
+    @click.option("--sample", default=100, help="Number of query items sampled from the catalog.")
+    @click.option("--k", default=10, help="Neighbours per query for recall@k.")
+    def vector_storage_report_command(modes, dimensions, sample, k):
+        """Prints recall@k, latency and size for each storage mode (uses temp tables only)."""
+        with app.app_context():
+            import json
+            from .utils import db_utils, vector_storage
+            dims = [int(d) for d in dimensions.split(",")] if dimensions else [Config.EMBEDDING_DIMENSION]
+            with db_utils.get_db_session() as session:
+                if not session:
+                    print("Error: Database session not available.")
+                    return
+                report = vector_storage.storage_report(
+                    session,
+                    modes=[m.strip() for m in modes.split(",") if m.strip()],
+                    dimensions=dims,
+                    sample_size=sample,
+                    k=k,
+                    rerank_factor=Config.EMBEDDING_RERANK_FACTOR,
+                )
+                session.rollback()  # Nothing to keep; temp tables are discarded with the transaction.
+            for row in report:
+                print(json.dumps(row))
+
+    @app.cli.command("clear-semantic-cache")
+    def clear_semantic_cache_command():
+        """Deletes every cached FAQ reply (entries also become unreachable when the system prompt changes)."""
+        with app.app_context():
+            from .extensions import get_redis_client
+            from .utils import semantic_cache
+            print(f"Removed {semantic_cache.clear(get_redis_client())} semantic cache keys.")
+
     logger.info("Custom CLI commands registered.")
 
 # Ensure Celery Tasks Are Imported so the worker can find them
@@ -12,7 +12,7 @@ from flask import request, jsonify, current_app, abort
 from sqlalchemy import text
 
 # --- Local Imports ---
-from ..utils import db_utils
+from ..utils import db_utils, metrics
 from ..config import Config
 from ..extensions import get_redis_client
 from ..models.conversation_pause import ConversationPause
@@ -22,9 +22,7 @@ from ..utils.text_utils import split_full_name
 # CORRECTED: Only import the main AI service dispatcher.
 from ..services import ai_service
 from ..services import support_board_service
-
-# This utility function is used for a special feature.
-from ..services.ai_service import extract_customer_info_via_llm
+from ..services import conversation_history_service
 
 from . import api_bp
 
@@ -88,7 +86,10 @@ def handle_support_board_webhook():
         except (json.JSONDecodeError, TypeError):
             logger.warning(f"Could not parse waid from payload: {payload_str}")
 
-    if not wa_message_id and sb_conversation_id and triggering_message_id is not None:
+    # Only customer messages come from WhatsApp with a waid; the bot's echoes and agent messages never
+    # have one, so looking them up would download the whole conversation for nothing.
+    if (not wa_message_id and sender_user_id_str == customer_user_id_str
+            and sb_conversation_id and triggering_message_id is not None):
         wa_message_id = support_board_service.extract_waid_from_conversation(
             str(sb_conversation_id), str(triggering_message_id)
         )
@@ -126,6 +127,9 @@ def handle_support_board_webhook():
             logger.error(f"Redis failure in idempotency check: {str(e)}")
     # --- END OF RESTORED LOGIC ---
 
+    # Every delivered message (customer, agents and our own echoes) extends the cached history.
+    conversation_history_service.record_webhook_message(str(sb_conversation_id), data)
+
     if order_vars and isinstance(order_vars, list) and len(order_vars) == 8:
         support_board_service.send_order_confirmation_template(
             user_id=customer_user_id_str, conversation_id=str(sb_conversation_id), variables=order_vars)
@@ -180,7 +184,7 @@ def handle_support_board_webhook():
             logger.info(f"Conv {sb_conversation_id} is paused in DB. Bot will not reply.")
             return jsonify({"status": "ok", "message": "Conversation explicitly paused"}), 200
 
-        conversation_data = support_board_service.get_sb_conversation_data(str(sb_conversation_id))
+        conversation_data = conversation_history_service.get_conversation(str(sb_conversation_id))
         is_implicitly_human_handled = False
         if conversation_data and conversation_data.get('messages'):
             for msg in reversed(conversation_data['messages']):
@@ -205,21 +209,18 @@ def handle_support_board_webhook():
         if is_implicitly_human_handled:
             return jsonify({"status": "ok", "message": "Implicit human takeover, bot will not reply"}), 200
 
-        if new_user_message_text:
-            try:
-                customer_data = extract_customer_info_via_llm(new_user_message_text)
-                required_keys = ["full_name", "cedula", "telefono", "correo", "direccion", "productos", "total"]
-                if customer_data and all(customer_data.get(k) for k in required_keys):
-                    nombre, apellido = split_full_name(str(customer_data["full_name"]))
-                    params = [str(nombre), str(apellido), str(customer_data["cedula"]).strip(), str(customer_data["telefono"]).strip(), str(customer_data["correo"]).strip(), str(customer_data["direccion"]).strip(), str(customer_data["productos"]).strip(), str(customer_data["total"]).strip()]
-                    phone = str(customer_data.get("telefono", "")).strip()
-                    if phone:
-                        support_board_service.send_template_by_phone_number(phone_number=phone, template_params=params)
-                        support_board_service.route_conversation_to_sales(str(sb_conversation_id))
-                        return jsonify({"status": "ok", "message": "Template sent via phone from extracted data"}), 200
-            except Exception as e:
-                logger.exception(f"LLM info extraction failed: {e}")
-        
+        # Order data is extracted by a separate LLM call, only for messages that pass the local
+        # pre-filter, and in parallel with the main turn. The turn's reply waits for the verdict:
+        # a complete order is sent as a template and routed to sales instead. The verdict is
+        # resolved once and kept, so the template is never sent after the reply was released.
+        # The main turn still runs its non-reply side effects for a complete order: its
+        # save_customer_reservation_details call stores the same order data, and routing to
+        # sales happens here, after the turn's default-department assignment.
+        extraction = ai_service.start_customer_info_extraction(new_user_message_text)
+        reply_gate = None
+        if extraction is not None:
+            reply_gate = lambda: ai_service.customer_info_result(extraction) is None
+
         # --- UNIFIED AI SERVICE CALL (THE ONLY CHANGE FROM THE OLD FILE) ---
         logger.info(f"Conv {sb_conversation_id} is active. Delegating to unified AI service.")
         try:
@@ -229,12 +230,26 @@ def handle_support_board_webhook():
                 conversation_source=conversation_source,
                 sender_user_id=sender_user_id_str,
                 customer_user_id=customer_user_id_str,
-                triggering_message_id=str(triggering_message_id) if triggering_message_id else None
+                triggering_message_id=str(triggering_message_id) if triggering_message_id else None,
+                reply_gate=reply_gate,
             )
-            return jsonify({"status": "ok", "message": "AI processing initiated"}), 200
         except Exception as e:
             logger.exception(f"CRITICAL: The AI service dispatcher failed for conv {sb_conversation_id}: {e}")
-            return jsonify({"status": "error", "message": "Critical error in AI service dispatcher"}), 500
+            if ai_service.customer_info_result(extraction) is None:  # Already resolved if the gate ran
+                return jsonify({"status": "error", "message": "Critical error in AI service dispatcher"}), 500
+
+        customer_data = ai_service.customer_info_result(extraction)
+        if customer_data:
+            try:
+                nombre, apellido = split_full_name(str(customer_data["full_name"]))
+                params = [str(nombre), str(apellido), str(customer_data["cedula"]).strip(), str(customer_data["telefono"]).strip(), str(customer_data["correo"]).strip(), str(customer_data["direccion"]).strip(), str(customer_data["productos"]).strip(), str(customer_data["total"]).strip()]
+                phone = str(customer_data.get("telefono", "")).strip()
+                support_board_service.send_template_by_phone_number(phone_number=phone, template_params=params)
+                support_board_service.route_conversation_to_sales(str(sb_conversation_id))
+                return jsonify({"status": "ok", "message": "Template sent via phone from extracted data"}), 200
+            except Exception as e:
+                logger.exception(f"Sending extracted customer info failed: {e}")
+        return jsonify({"status": "ok", "message": "AI processing initiated"}), 200
 
     # Rule 5: Final fallback for any other sender type
     logger.warning(f"Message in conv {sb_conversation_id} from unhandled sender {sender_user_id_str}. Pausing bot.")
@@ -257,6 +272,20 @@ def health_check():
     return jsonify({"status": "ok", "database_connected": db_ok}), 200
 
 
+@api_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Returns shared Redis counters with cache hit rates, the intent router share and average latencies."""
+    counters = metrics.snapshot()
+    return jsonify({
+        "counters": counters,
+        "find_products_cache_hit_rate": metrics.ratio(counters, "find_products_cache_hits", "find_products_cache_misses"),
+        "semantic_cache_hit_rate": metrics.ratio(counters, "semantic_cache_hits", "semantic_cache_misses"),
+        "semantic_cache_shadow_hit_rate": metrics.ratio(counters, "semantic_cache_shadow_hits", "semantic_cache_misses"),
+        "intent_router_routed_share": metrics.ratio(counters, "intent_router_routed", "intent_router_passed"),
+        "average_latency_ms": metrics.averages(counters),
+    }), 200
+
+
 @api_bp.route('/supportboard/test', methods=['GET'])
 def handle_support_board_test():
     """A simple test endpoint to confirm the API blueprint is active."""
@@ -11,14 +11,18 @@ from celery.exceptions import Ignore, MaxRetriesExceededError, OperationalError
 from .celery_app import celery_app, FlaskTask
 # --- START OF MODIFICATION: Corrected Imports ---
 # Import the specific services that this file actually uses.
-from .services import product_service, openai_service, llm_processing_service
+from .services import product_service, openai_service, llm_processing_service, catalog_index_service
 # --- END OF MODIFICATION ---
-from .utils import db_utils, product_utils
+from .utils import db_utils, product_utils, search_cache, spec_parser, text_utils
 from .models.product import Product
+from .models.product_embedding import ProductEmbedding
 from .config import Config
+from .extensions import get_redis_client
 
 logger = logging.getLogger(__name__)
 
+CATALOG_REFRESH_PENDING_KEY = "catalog:refresh_pending"
+
 # --- Pydantic Model for Validating Incoming Snake_Case Product Data ---
 class DamascoProductDataSnake(BaseModel):
     item_code: str
@@ -99,6 +103,8 @@ def process_products_batch_task(self, products_batch_snake_case: List[Dict[str,
 
     # --- STEP 2: FETCH EXISTING DATA ---
     existing_products_map = {}
+    existing_embedding_hashes: Dict[str, str] = {}
+    batch_item_codes = list({item[1].item_code for item in validated_items_for_processing})
     try:
         with db_utils.get_db_session() as session:
             if product_ids_for_db_lookup:
@@ -106,28 +112,37 @@ def process_products_batch_task(self, products_batch_snake_case: List[Dict[str,
                     Product.id,
                     Product.description,
                     Product.llm_summarized_description,
-                    Product.searchable_text_content,
-                    Product.embedding
+                    Product.searchable_text_content
                 ).filter(Product.id.in_(product_ids_for_db_lookup)).all()
 
                 for entry in existing_db_entries:
                     existing_products_map[entry.id] = {
                         "description": entry.description,
                         "llm_summarized_description": entry.llm_summarized_description,
-                        "searchable_text_content": entry.searchable_text_content,
-                        "embedding": entry.embedding
+                        "searchable_text_content": entry.searchable_text_content
                     }
+
+            # Embeddings are stored once per item_code, not per warehouse row.
+            existing_embedding_hashes = dict(
+                session.query(ProductEmbedding.item_code, ProductEmbedding.content_hash)
+                .filter(ProductEmbedding.item_code.in_(batch_item_codes)).all()
+            )
             logger.info(f"Task {task_id}: Fetched existing data for {len(existing_products_map)} of "
-                        f"{len(validated_items_for_processing)} validated products using lookup IDs.")
+                        f"{len(validated_items_for_processing)} validated products using lookup IDs, and "
+                        f"{len(existing_embedding_hashes)} of {len(batch_item_codes)} item embeddings.")
     except (SQLAlchemyOperationalError, CeleryOperationalError) as e:
         logger.error(f"Task {task_id}: Retriable DB/Broker error during batch read: {e}", exc_info=True)
         raise self.retry(exc=e)
 
     # --- STEP 3: PROCESS EACH ITEM (Summaries, Embeddings) ---
     db_ready_product_data_list = []
+    db_ready_embedding_data_list = []
+    item_codes_embedded_in_batch = set()
     for lookup_id, pydantic_product_obj, original_snake_case_data in validated_items_for_processing:
         try:
             existing_details = existing_products_map.get(lookup_id)
+            # Stripped once here and reused by the summarizer, both embedding texts and the stored column.
+            description_text = text_utils.strip_html_to_text(pydantic_product_obj.description)
             
             llm_summary_to_use = existing_details.get("llm_summarized_description") if existing_details else None
             needs_new_summary = (
@@ -139,7 +154,8 @@ def process_products_batch_task(self, products_batch_snake_case: List[Dict[str,
             if needs_new_summary and pydantic_product_obj.description:
                 new_summary = llm_processing_service.generate_llm_product_summary(
                     html_description=pydantic_product_obj.description,
-                    item_name=pydantic_product_obj.item_name
+                    item_name=pydantic_product_obj.item_name,
+                    plain_text_description=description_text
                 )
                 if new_summary:
                     llm_summary_to_use = new_summary
@@ -149,44 +165,55 @@ def process_products_batch_task(self, products_batch_snake_case: List[Dict[str,
             text_to_embed = Product.prepare_text_for_embedding(
                 damasco_product_data=product_data_dict_for_embedding,
                 llm_generated_summary=llm_summary_to_use,
-                raw_html_description_for_fallback=pydantic_product_obj.description
+                raw_html_description_for_fallback=pydantic_product_obj.description,
+                plain_description_for_fallback=description_text
             )
             
             if not text_to_embed:
                 logger.warning(f"Task {task_id}: No text for embedding for lookup_id {lookup_id}. Skipping item.")
                 continue
 
-            embedding_to_use = None
-            generate_new_embedding = False
-            
-            if not existing_details:
-                logger.info(f"Task {task_id}: Product {lookup_id} is new. Generating embedding.")
-                generate_new_embedding = True
-            else:
-                existing_embedding_value = existing_details.get("embedding")
-                if existing_embedding_value is None:
-                    logger.info(f"Task {task_id}: Product {lookup_id} has no existing embedding data. Generating embedding.")
-                    generate_new_embedding = True
-                elif text_to_embed != existing_details.get("searchable_text_content"):
-                    logger.info(f"Task {task_id}: Content changed for {lookup_id}. Regenerating embedding.")
-                    generate_new_embedding = True
-            
-            if generate_new_embedding:
-                # --- MODIFIED: Calling the correct service for embeddings ---
-                embedding_to_use = openai_service.generate_product_embedding(text_to_embed)
-                if embedding_to_use is None:
-                    logger.error(f"Task {task_id}: Failed to generate new embedding for {lookup_id}. Skipping item.")
-                    continue 
-            else:
-                embedding_to_use = existing_details["embedding"]
-                logger.info(f"Task {task_id}: Reusing existing embedding for product {lookup_id}.")
+            # One embedding per item_code: the location-free text is identical for every warehouse row.
+            item_code = pydantic_product_obj.item_code
+            if item_code not in item_codes_embedded_in_batch:
+                item_codes_embedded_in_batch.add(item_code)
+                item_text = Product.prepare_text_for_embedding(
+                    damasco_product_data=product_data_dict_for_embedding,
+                    llm_generated_summary=llm_summary_to_use,
+                    raw_html_description_for_fallback=pydantic_product_obj.description,
+                    include_location=False,
+                    plain_description_for_fallback=description_text
+                )
+                item_hash = product_utils.generate_content_hash(item_text)
+                if item_hash and item_hash != existing_embedding_hashes.get(item_code):
+                    logger.info(f"Task {task_id}: Item {item_code} is new or its content changed. Generating embedding.")
+                    # --- MODIFIED: Calling the correct service for embeddings ---
+                    embedding_to_use = openai_service.generate_product_embedding(item_text)
+                    if embedding_to_use is None:
+                        logger.error(f"Task {task_id}: Failed to generate embedding for item {item_code}. "
+                                     f"Stock rows are still written; the embedding will be retried on the next sync.")
+                    else:
+                        db_ready_embedding_data_list.append({
+                            "item_code": item_code,
+                            "content_hash": item_hash,
+                            "searchable_text_content": item_text,
+                            "embedding": embedding_to_use,
+                        })
+                elif item_hash:
+                    logger.debug(f"Task {task_id}: Reusing existing embedding for item {item_code}.")
 
+            base_name, color = product_utils.split_base_name_and_color(pydantic_product_obj.item_name)
+            spec_attributes = spec_parser.parse_specs(pydantic_product_obj.specifitacion, pydantic_product_obj.item_name)
             db_ready_product_data_list.append({
                 "item_code": pydantic_product_obj.item_code,
                 "item_name": pydantic_product_obj.item_name,
+                "base_name": base_name,
+                "color": color,
                 "description": pydantic_product_obj.description,
+                "description_text": description_text,
                 "llm_summarized_description": llm_summary_to_use,
                 "specifitacion": pydantic_product_obj.specifitacion,
+                **spec_attributes,
                 "category": pydantic_product_obj.category,
                 "sub_category": pydantic_product_obj.sub_category,
                 "brand": pydantic_product_obj.brand,
@@ -199,7 +226,6 @@ def process_products_batch_task(self, products_batch_snake_case: List[Dict[str,
                 "price_bolivar": pydantic_product_obj.price_bolivar,
                 "stock": pydantic_product_obj.stock,
                 "searchable_text_content": text_to_embed,
-                "embedding": embedding_to_use,
                 "source_data_json": original_snake_case_data,
             })
         except Exception as item_proc_exc:
@@ -214,9 +240,13 @@ def process_products_batch_task(self, products_batch_snake_case: List[Dict[str,
     try:
         with db_utils.get_db_session() as session:
             product_service.upsert_products_batch(session, db_ready_product_data_list)
+            product_service.upsert_product_embeddings_batch(session, db_ready_embedding_data_list)
             session.commit()
-            logger.info(f"Task {task_id}: Successfully upserted and COMMITTED {len(db_ready_product_data_list)} products.")
-            return {"status": "success", "processed_count": len(db_ready_product_data_list)}
+            logger.info(f"Task {task_id}: Successfully upserted and COMMITTED {len(db_ready_product_data_list)} products "
+                        f"and {len(db_ready_embedding_data_list)} item embeddings.")
+        search_cache.bump_catalog_version()
+        schedule_catalog_refresh()
+        return {"status": "success", "processed_count": len(db_ready_product_data_list)}
     except (SQLAlchemyOperationalError, CeleryOperationalError) as e_db_op:
         logger.error(f"Task {task_id}: Retriable DB/Broker error during final batch write: {e_db_op}", exc_info=True)
         raise self.retry(exc=e_db_op)
@@ -225,6 +255,44 @@ def process_products_batch_task(self, products_batch_snake_case: List[Dict[str,
         raise self.retry(exc=e_final)
 
 
+def schedule_catalog_refresh() -> None:
+    """
+    Debounced enqueue of refresh_catalog_derived_data_task: a full sync sends many batches,
+    but only the first one inside CATALOG_REFRESH_DEBOUNCE_SECONDS schedules a refresh.
+    """
+    debounce = Config.CATALOG_REFRESH_DEBOUNCE_SECONDS
+    try:
+        if not get_redis_client().set(CATALOG_REFRESH_PENDING_KEY, "1", nx=True, ex=debounce + 300):
+            return
+    except Exception as e:
+        logger.warning(f"Could not set catalog refresh debounce key, enqueueing anyway: {e}")
+    refresh_catalog_derived_data_task.apply_async(countdown=debounce)
+
+
+@celery_app.task(
+    bind=True,
+    base=FlaskTask,
+    name='namwoo_app.celery_tasks.refresh_catalog_derived_data_task',
+    max_retries=Config.CELERY_TASK_MAX_RETRIES_SHORT if hasattr(Config, 'CELERY_TASK_MAX_RETRIES_SHORT') else 3,
+    default_retry_delay=Config.CELERY_TASK_RETRY_DELAY_SHORT if hasattr(Config, 'CELERY_TASK_RETRY_DELAY_SHORT') else 60,
+    acks_late=True
+)
+def refresh_catalog_derived_data_task(self):
+    task_id = self.request.id
+    try:
+        # Clear first so batches committed while we refresh schedule a follow-up run.
+        get_redis_client().delete(CATALOG_REFRESH_PENDING_KEY)
+    except Exception as e:
+        logger.warning(f"Task {task_id}: Could not clear catalog refresh debounce key: {e}")
+    try:
+        if not catalog_index_service.refresh_catalog_derived_data():
+            raise self.retry(exc=RuntimeError("DB session unavailable for catalog refresh"))
+        return {"status": "success"}
+    except (SQLAlchemyOperationalError, CeleryOperationalError) as e_db_op:
+        logger.error(f"Task {task_id}: Retriable error during catalog refresh: {e_db_op}", exc_info=True)
+        raise self.retry(exc=e_db_op)
+
+
 # =================================================================================================
 # == DEPRECATED TASK - DO NOT USE =================================================================
 # =================================================================================================
@@ -261,6 +329,7 @@ def deactivate_product_task(self, product_id: str):
                     entry.stock = 0
                     logger.info(f"Task {task_id}: Product_id: {product_id} stock set to 0 for deactivation.")
                     session.commit() 
+                    search_cache.bump_catalog_version()
                 else:
                     logger.info(f"Task {task_id}: Product_id: {product_id} already has stock 0. No change needed.")
             else:
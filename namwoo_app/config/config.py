@@ -66,7 +66,32 @@ class Config:
     OPENAI_EMBEDDING_MODEL = os.environ.get('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small')
     OPENAI_CHAT_MODEL = os.environ.get('OPENAI_CHAT_MODEL', 'gpt-4o-mini')
     OPENAI_MAX_TOKENS = int(os.environ.get('OPENAI_MAX_TOKENS', 1024))
+    OPENAI_REQUEST_TIMEOUT = float(os.environ.get('OPENAI_REQUEST_TIMEOUT', 60.0))
+    # All OpenAI-compatible clients (chat, assistants, Gemini, embeddings, summaries) share one pooled
+    # httpx client per process (utils/llm_clients.py). HTTP/2 is used when the `h2` package is installed.
+    LLM_HTTP2 = os.environ.get('LLM_HTTP2', 'true').lower() == 'true'
+    LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get('LLM_HTTP_MAX_CONNECTIONS', 50))
+    LLM_HTTP_MAX_KEEPALIVE = int(os.environ.get('LLM_HTTP_MAX_KEEPALIVE', 20))
+    LLM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_HTTP_KEEPALIVE_EXPIRY', 120.0))
+    LLM_HTTP_CONNECT_TIMEOUT = float(os.environ.get('LLM_HTTP_CONNECT_TIMEOUT', 5.0))
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 2))
+    # openai_chat: stream completions and send each finished paragraph/sentence group as soon as it has
+    # at least OPENAI_STREAM_MIN_CHUNK_CHARS characters (see utils/reply_chunker.py for per-channel limits).
+    OPENAI_STREAMING_ENABLED = os.environ.get('OPENAI_STREAMING_ENABLED', 'false').lower() == 'true'
+    OPENAI_STREAM_MIN_CHUNK_CHARS = int(os.environ.get('OPENAI_STREAM_MIN_CHUNK_CHARS', 200))
+    # openai_chat: semantic cache of replies to FAQ-style questions (utils/semantic_cache.py).
+    # 'off', 'shadow' (store and log would-be hits only) or 'on'.
+    SEMANTIC_CACHE_MODE = os.environ.get('SEMANTIC_CACHE_MODE', 'off').lower()
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.95))
+    SEMANTIC_CACHE_TTL = int(os.environ.get('SEMANTIC_CACHE_TTL', 7 * 86400))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', 1000))
+    SEMANTIC_CACHE_MIN_WORDS = int(os.environ.get('SEMANTIC_CACHE_MIN_WORDS', 3))
+    SEMANTIC_CACHE_MAX_QUERY_CHARS = int(os.environ.get('SEMANTIC_CACHE_MAX_QUERY_CHARS', 300))
     EMBEDDING_DIMENSION = int(os.environ.get('EMBEDDING_DIMENSION', 1536))
+    # Embedding storage: 'vector' (float32), 'halfvec' (float16) or 'binary' (halfvec + bit HNSW index, re-ranked).
+    # Changing it requires `flask migrate-vector-storage`. See utils/vector_storage.py.
+    EMBEDDING_STORAGE = os.environ.get('EMBEDDING_STORAGE', 'vector').lower()
+    EMBEDDING_RERANK_FACTOR = int(os.environ.get('EMBEDDING_RERANK_FACTOR', 4))  # binary mode: candidates = limit * factor
 
     # Google Specific
     GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
@@ -124,8 +149,50 @@ class Config:
 
     # --- Application Specific ---
     MAX_HISTORY_MESSAGES = int(os.environ.get('MAX_HISTORY_MESSAGES', 16))
+    # openai_chat history window: newest messages up to this many tokens (tool calls kept with their results);
+    # older turns are condensed into a rolling memory of at most HISTORY_MEMORY_TOKEN_BUDGET tokens.
+    HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', 6000))
+    HISTORY_MEMORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_MEMORY_TOKEN_BUDGET', 400))
+    # Support Board conversations cached in Redis and appended from webhooks (conversation_history_service);
+    # a full refetch happens on a miss, a detected gap, or when the entry is older than RESYNC_SECONDS.
+    HISTORY_CACHE_ENABLED = os.environ.get('HISTORY_CACHE_ENABLED', 'true').lower() == 'true'
+    HISTORY_CACHE_TTL = int(os.environ.get('HISTORY_CACHE_TTL', 86400))
+    HISTORY_CACHE_RESYNC_SECONDS = int(os.environ.get('HISTORY_CACHE_RESYNC_SECONDS', 900))
+    # Unique items (item_codes) per find_products page; the model asks for more with page_token.
     PRODUCT_SEARCH_LIMIT = max(5, int(os.environ.get('PRODUCT_SEARCH_LIMIT', 10)))
+    # Unique items fetched from the product_embeddings ANN index before stock/warehouse filtering.
+    VECTOR_SEARCH_CANDIDATES = int(os.environ.get('VECTOR_SEARCH_CANDIDATES', 40))
     IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "300"))
+    # Tool results sent back to the LLM are compacted to this many tokens ('json' or 'table' format).
+    TOOL_RESULT_TOKEN_BUDGET = int(os.environ.get('TOOL_RESULT_TOKEN_BUDGET', 1500))
+    TOOL_RESULT_FORMAT = os.environ.get('TOOL_RESULT_FORMAT', 'json').lower()
+    # Read-only tool calls of one turn run concurrently on up to this many threads (1 = sequential).
+    TOOL_EXECUTION_MAX_WORKERS = int(os.environ.get('TOOL_EXECUTION_MAX_WORKERS', 4))
+    # Order-data extraction (webhook): only messages that pass utils/customer_info_prefilter.py reach the LLM
+    # extractor, which runs alongside the main AI turn. The turn's reply waits at most this long for its verdict.
+    CUSTOMER_INFO_EXTRACTION_TIMEOUT = float(os.environ.get('CUSTOMER_INFO_EXTRACTION_TIMEOUT', 20))
+    # Trivial messages answered without the LLM (services/intent_router.py). Opt-in: a comma-separated
+    # subset of 'greeting,thanks,location_pin,sku'; empty (the default) disables the router.
+    INTENT_ROUTER_INTENTS = os.environ.get('INTENT_ROUTER_INTENTS', '').lower()
+    INTENT_GREETING_REPLY = os.environ.get(
+        'INTENT_GREETING_REPLY',
+        "¡Hola! Soy Tomás, tu Asistente personal de Damasco, ¡el que siempre te da más! 😊 ¿En qué puedo ayudarte hoy?")
+    INTENT_THANKS_REPLY = os.environ.get(
+        'INTENT_THANKS_REPLY', "¡Con gusto! Si necesitas algo más, aquí estoy para ayudarte. 😊")
+    # find_products result cache (Redis). Entries are keyed by the catalog version that ingestion bumps;
+    # the TTL is only a safety net. Concurrent identical searches wait up to LOCK_TIMEOUT for the first one.
+    FIND_PRODUCTS_CACHE_ENABLED = os.environ.get('FIND_PRODUCTS_CACHE_ENABLED', 'true').lower() == 'true'
+    FIND_PRODUCTS_CACHE_TTL = int(os.environ.get('FIND_PRODUCTS_CACHE_TTL', 600))
+    FIND_PRODUCTS_CACHE_LOCK_TIMEOUT = float(os.environ.get('FIND_PRODUCTS_CACHE_LOCK_TIMEOUT', 10))
+    # Derived catalog tables (brand summary, ...) are rebuilt this many seconds after the last ingestion batch.
+    CATALOG_REFRESH_DEBOUNCE_SECONDS = int(os.environ.get('CATALOG_REFRESH_DEBOUNCE_SECONDS', 60))
+    BRAND_CACHE_CHECK_SECONDS = int(os.environ.get('BRAND_CACHE_CHECK_SECONDS', 30))
+    # Per-process LRU of parsed search queries (utils/query_parser) and of brand matches.
+    QUERY_PARSE_CACHE_SIZE = int(os.environ.get('QUERY_PARSE_CACHE_SIZE', 2048))
+    # Ranked accessories stored per item and city by the catalog refresh (query_accessories reads them).
+    ACCESSORY_RECS_PER_ITEM = int(os.environ.get('ACCESSORY_RECS_PER_ITEM', 5))
+    # Similar items stored per item_code in product_neighbors (search_similar_products reads them).
+    PRODUCT_NEIGHBORS_PER_ITEM = int(os.environ.get('PRODUCT_NEIGHBORS_PER_ITEM', 20))
 
     # --- Damasco Specific ---
     DAMASCO_RECEIVER_API_URL = os.environ.get('DAMASCO_RECEIVER_API_URL')
@@ -15,9 +15,12 @@ CREATE TABLE products (
 
     item_code VARCHAR(64) NOT NULL,      -- Original Item Code from Damasco (e.g., D0007277)
     item_name TEXT NOT NULL,             -- Product name
+    base_name TEXT,                      -- item_name without SKU/trailing color (set at ingestion, used for grouping)
+    color VARCHAR(64),                   -- Trailing color parsed from item_name
     
     -- Descriptive attributes for the product itself
     description TEXT,                    -- Raw HTML product description from Damasco
+    description_text TEXT,               -- Plain text of description, stripped once at ingestion
     specifitacion TEXT,                  -- Detailed product specifications
     category VARCHAR(128),               -- Main category
     sub_category VARCHAR(128),           -- Sub-category
@@ -48,17 +51,97 @@ CREATE TABLE products (
 ALTER TABLE products
 ADD CONSTRAINT uq_item_code_per_warehouse UNIQUE (item_code, warehouse_name);
 
+-- Existing databases: add the precomputed columns, then run `flask backfill-product-derived-fields`.
+-- ALTER TABLE products ADD COLUMN IF NOT EXISTS base_name TEXT;
+-- ALTER TABLE products ADD COLUMN IF NOT EXISTS color VARCHAR(64);
+-- ALTER TABLE products ADD COLUMN IF NOT EXISTS description_text TEXT;
+-- Typed spec attributes (utils/spec_parser.py), filled by the same backfill command:
+-- ALTER TABLE products ADD COLUMN IF NOT EXISTS ram_gb DOUBLE PRECISION;
+-- ALTER TABLE products ADD COLUMN IF NOT EXISTS storage_gb DOUBLE PRECISION;
+-- ALTER TABLE products ADD COLUMN IF NOT EXISTS screen_in DOUBLE PRECISION;
+-- ALTER TABLE products ADD COLUMN IF NOT EXISTS camera_mp DOUBLE PRECISION;
+-- ALTER TABLE products ADD COLUMN IF NOT EXISTS battery_mah DOUBLE PRECISION;
+
 -- 3. Indexes for common filters
 CREATE INDEX IF NOT EXISTS idx_products_item_code ON products (item_code); -- For finding all locations of an item_code
 CREATE INDEX IF NOT EXISTS idx_products_brand ON products (brand);
 CREATE INDEX IF NOT EXISTS idx_products_category ON products (category);
 CREATE INDEX IF NOT EXISTS idx_products_warehouse_name ON products (warehouse_name);
 CREATE INDEX IF NOT EXISTS idx_products_branch_name ON products (branch_name);
+-- Structured spec filters in find_products (ranges on typed attributes)
+CREATE INDEX IF NOT EXISTS ix_products_ram_gb ON products (ram_gb);
+CREATE INDEX IF NOT EXISTS ix_products_storage_gb ON products (storage_gb);
+CREATE INDEX IF NOT EXISTS ix_products_screen_in ON products (screen_in);
+CREATE INDEX IF NOT EXISTS ix_products_camera_mp ON products (camera_mp);
+CREATE INDEX IF NOT EXISTS ix_products_battery_mah ON products (battery_mah);
 -- No need for item_name index if primarily using vector search for names/descriptions
 
--- 4. Vector Similarity Index (HNSW for pgvector)
--- Ensure this matches your typical query needs (e.g., vector_cosine_ops or vector_l2_ops)
-CREATE INDEX IF NOT EXISTS idx_products_embedding_hnsw ON products USING hnsw (embedding vector_cosine_ops);
+-- 4. Deduplicated embeddings: one vector per item_code instead of one per warehouse row.
+-- products.embedding is legacy and no longer written; its HNSW index is dropped so the
+-- ANN index only holds unique items. Search joins back to products for stock rows.
+DROP INDEX IF EXISTS idx_products_embedding_hnsw;
+CREATE TABLE IF NOT EXISTS product_embeddings (
+    item_code VARCHAR(64) PRIMARY KEY,          -- Shared by all warehouse rows of the item
+    content_hash VARCHAR(64) NOT NULL,          -- SHA-256 of searchable_text_content ('legacy' for backfilled rows)
+    searchable_text_content TEXT NOT NULL,      -- Location-independent text used to generate the embedding
+    embedding vector(1536) NOT NULL,            -- Vector embedding (dimension from config.EMBEDDING_DIMENSION)
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_product_embeddings_content_hash ON product_embeddings (content_hash);
+CREATE INDEX IF NOT EXISTS idx_product_embeddings_hnsw ON product_embeddings USING hnsw (embedding vector_cosine_ops);
+
+-- Reduced storage (EMBEDDING_STORAGE=halfvec|binary, pgvector >= 0.7): run `flask migrate-vector-storage`,
+-- which converts product_embeddings.embedding and products.embedding to halfvec(d) and rebuilds the index as
+--   halfvec: CREATE INDEX ... USING hnsw (embedding halfvec_cosine_ops);
+--   binary:  CREATE INDEX ... USING hnsw ((binary_quantize(embedding)::bit(d)) bit_hamming_ops);
+-- Compare modes first with `flask vector-storage-report`.
+
+-- One-off backfill from legacy rows (same as `flask backfill-product-embeddings`):
+-- INSERT INTO product_embeddings (item_code, content_hash, searchable_text_content, embedding)
+-- SELECT DISTINCT ON (item_code) item_code, 'legacy', COALESCE(searchable_text_content, item_name), embedding
+-- FROM products WHERE embedding IS NOT NULL ORDER BY item_code, updated_at DESC
+-- ON CONFLICT (item_code) DO NOTHING;
+
+-- 4b. In-stock brands per sub_category, rebuilt after ingestion (`flask refresh-catalog-index`
+-- or the debounced refresh_catalog_derived_data_task) so product searches skip SELECT DISTINCT brand.
+CREATE TABLE IF NOT EXISTS brand_category_summary (
+    sub_category VARCHAR(128) NOT NULL,         -- UPPER(sub_category), '' when missing
+    brand VARCHAR(128) NOT NULL,
+    item_count INTEGER NOT NULL,                -- Distinct in-stock item_codes
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (sub_category, brand)
+);
+
+-- 4c. Ranked accessory recommendations per main item and city, rebuilt by the same refresh.
+-- query_accessories reads one row by primary key instead of querying products.
+CREATE TABLE IF NOT EXISTS product_accessory_recs (
+    main_item_code VARCHAR(64) NOT NULL,
+    city VARCHAR(64) NOT NULL,                  -- Canonical city from tiendas_data.json, '' for nationwide
+    accessories JSONB NOT NULL,                 -- Ranked [{item_code, name, price, score}]
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (main_item_code, city)
+);
+
+-- 4d. Top-N similar items per item_code (exact cosine over product_embeddings), rebuilt by the same refresh.
+CREATE TABLE IF NOT EXISTS product_neighbors (
+    item_code VARCHAR(64) NOT NULL,
+    neighbor_item_code VARCHAR(64) NOT NULL,
+    rank INTEGER NOT NULL,                      -- 1 = most similar
+    score DOUBLE PRECISION NOT NULL,            -- Cosine similarity
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (item_code, neighbor_item_code)
+);
+CREATE INDEX IF NOT EXISTS idx_product_neighbors_item_rank ON product_neighbors (item_code, rank);
+
+-- 4e. Store directory (branch -> warehouse, city, address) built from products and data/tiendas_data.json
+-- by the same refresh; get_branch_address matches names in memory and never scans products.
+CREATE TABLE IF NOT EXISTS branches (
+    branch_name VARCHAR(255) PRIMARY KEY,
+    warehouse_name VARCHAR(255),
+    city VARCHAR(128),                          -- Canonical lowercase city as used by conversation_location
+    address TEXT,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
 
 -- 5. Table for storing human takeover pause state per Support Board conversation (Unchanged)
 CREATE TABLE IF NOT EXISTS conversation_pauses (
@@ -1,10 +1,25 @@
-from flask import current_app
+from typing import Optional
+
+from flask import current_app, has_app_context
 from redis import Redis
 
+from .config import Config
+
+_standalone_redis_client: Optional[Redis] = None
+
 
 def get_redis_client() -> Redis:
-    """Return a shared Redis client if available, otherwise create one."""
-    client = getattr(current_app, "redis_client", None)
-    if client is None:
-        client = Redis.from_url(current_app.config["REDIS_URL"])
-    return client
+    """Return a shared Redis client if available, otherwise create one.
+
+    Outside an app context (e.g. worker threads) a module-level client built from
+    Config.REDIS_URL is used instead.
+    """
+    global _standalone_redis_client
+    if has_app_context():
+        client = getattr(current_app, "redis_client", None)
+        if client is None:
+            client = Redis.from_url(current_app.config["REDIS_URL"])
+        return client
+    if _standalone_redis_client is None:
+        _standalone_redis_client = Redis.from_url(Config.REDIS_URL)
+    return _standalone_redis_client
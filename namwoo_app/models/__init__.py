@@ -11,6 +11,11 @@ Base = declarative_base()
 # Base.metadata.create_all() to find the tables.
 from .product import Product                 # Assuming product.py contains the Product model
 from .conversation_pause import ConversationPause # Assuming conversation_pause.py contains ConversationPause model
+from .product_embedding import ProductEmbedding   # One deduplicated embedding per item_code
+from .brand_category_summary import BrandCategorySummary  # In-stock brands per sub_category, refreshed after ingestion
+from .product_accessory_rec import ProductAccessoryRec     # Ranked accessories per item and city, refreshed after ingestion
+from .product_neighbor import ProductNeighbor              # Top-N similar items per item_code, refreshed after ingestion
+from .branch import Branch                                 # Store directory (addresses), refreshed after ingestion
 
 # You can add other models here if you create more later.
 # e.g., from .user import User
@@ -0,0 +1,26 @@
+# namwoo_app/models/branch.py
+import logging
+from sqlalchemy import Column, String, Text, TIMESTAMP, func
+
+from . import Base
+
+logger = logging.getLogger(__name__)
+
+class Branch(Base):
+    """
+    Store directory: one row per branch with its warehouse, city and address.
+
+    Rebuilt by branch_directory_service after ingestion from the distinct
+    branch/warehouse/address values in `products`, merged with data/tiendas_data.json,
+    so address lookups never scan the products table.
+    """
+    __tablename__ = 'branches'
+
+    branch_name = Column(String(255), primary_key=True)
+    warehouse_name = Column(String(255), nullable=True)
+    city = Column(String(128), nullable=True, comment="Canonical city (lowercase) as used by conversation_location")
+    address = Column(Text, nullable=True)
+    refreshed_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<Branch(branch_name='{self.branch_name}', city='{self.city}')>"
@@ -0,0 +1,24 @@
+# namwoo_app/models/brand_category_summary.py
+import logging
+from sqlalchemy import Column, String, Integer, TIMESTAMP, func
+
+from . import Base
+
+logger = logging.getLogger(__name__)
+
+class BrandCategorySummary(Base):
+    """
+    Precomputed in-stock brands per sub_category for the DAMASCO TECNO group.
+
+    Rebuilt from `products` by catalog_index_service after ingestion, so searches
+    and the `get_available_brands` tool never run SELECT DISTINCT over products.
+    """
+    __tablename__ = 'brand_category_summary'
+
+    sub_category = Column(String(128), primary_key=True)
+    brand = Column(String(128), primary_key=True)
+    item_count = Column(Integer, nullable=False, comment="Distinct in-stock item_codes for this brand/sub_category")
+    refreshed_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<BrandCategorySummary(sub_category='{self.sub_category}', brand='{self.brand}', items={self.item_count})>"
@@ -2,15 +2,15 @@
 import logging
 import re  # For whitespace normalization in prepare_text_for_embedding
 from sqlalchemy import (
-    Column, String, Text, TIMESTAMP, func, UniqueConstraint, Integer, NUMERIC
+    Column, String, Text, TIMESTAMP, func, Integer, NUMERIC, Index, Float
 )
 from sqlalchemy.dialects.postgresql import JSONB
-from pgvector.sqlalchemy import Vector
 from typing import Dict, Optional, List, Any  # Added List, Any
 
 from . import Base  # Assuming Base is defined in models/__init__.py
 from ..config import Config
 from ..utils.text_utils import strip_html_to_text  # Ensure this utility exists and works
+from ..utils import vector_storage
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +37,16 @@ class Product(Base):
         nullable=False,
         comment="Product's full name or title"
     )
+    base_name = Column(
+        Text,
+        nullable=True,
+        comment="item_name without SKU and trailing color; precomputed at ingestion for result grouping"
+    )
+    color = Column(
+        String(64),
+        nullable=True,
+        comment="Trailing color parsed from item_name, if any"
+    )
     
     # Descriptions
     description = Column(
@@ -44,6 +54,11 @@ class Product(Base):
         nullable=True,
         comment="Raw HTML product description from Damasco"
     )
+    description_text = Column(
+        Text,
+        nullable=True,
+        comment="Plain text of `description`, stripped once at ingestion"
+    )
     llm_summarized_description = Column(
         Text,
         nullable=True,
@@ -55,6 +70,13 @@ class Product(Base):
         comment="Detailed product specifications, typically a list or structured text"
     )
 
+    # Typed attributes parsed from specifitacion/item_name at ingestion (utils.spec_parser)
+    ram_gb = Column(Float, nullable=True, index=True, comment="RAM in GB")
+    storage_gb = Column(Float, nullable=True, index=True, comment="Internal storage in GB")
+    screen_in = Column(Float, nullable=True, index=True, comment="Screen diagonal in inches")
+    camera_mp = Column(Float, nullable=True, index=True, comment="Main camera resolution in MP")
+    battery_mah = Column(Float, nullable=True, index=True, comment="Battery capacity in mAh")
+
     # Descriptive attributes
     category = Column(
         String(128),
@@ -133,13 +155,14 @@ class Product(Base):
         comment="PLAIN TEXT content used to generate the embedding"
     )
     embedding = Column(
-        Vector(
+        vector_storage.column_type(
+            getattr(Config, 'EMBEDDING_STORAGE', 'vector'),
             Config.EMBEDDING_DIMENSION
             if hasattr(Config, 'EMBEDDING_DIMENSION') and Config.EMBEDDING_DIMENSION
             else 1536
         ),
         nullable=True,
-        comment="pgvector embedding"
+        comment="Legacy per-warehouse pgvector embedding; superseded by product_embeddings"
     )
     
     # Auditing
@@ -163,11 +186,13 @@ class Product(Base):
     )
 
     __table_args__ = (
-        # Enforce uniqueness on item_code + canonical warehouse name
-        UniqueConstraint(
-            'item_code',
+        # Enforce uniqueness on item_code (case-insensitive) + canonical warehouse name. As in production,
+        # this is a functional unique index; its leading lower(item_code) column also serves SKU lookups.
+        Index(
+            'uq_item_code_per_whs_canonical',
+            func.lower(item_code),
             'warehouse_name_canonical',
-            name='uq_item_code_per_whs_canonical'
+            unique=True,
         ),
     )
 
@@ -183,12 +208,17 @@ class Product(Base):
             "id": self.id,
             "item_code": self.item_code,
             "item_name": self.item_name,
+            "base_name": self.base_name,
+            "color": self.color,
             "description": self.description,
             "llm_summarized_description": self.llm_summarized_description,
             "specifitacion": self.specifitacion,
-            "plain_text_description_derived": strip_html_to_text(
-                self.description or ""
-            ),
+            "ram_gb": self.ram_gb,
+            "storage_gb": self.storage_gb,
+            "screen_in": self.screen_in,
+            "camera_mp": self.camera_mp,
+            "battery_mah": self.battery_mah,
+            "plain_text_description_derived": self.plain_description(),
             "category": self.category,
             "sub_category": self.sub_category,
             "brand": self.brand,
@@ -212,6 +242,12 @@ class Product(Base):
             ),
         }
 
+    def plain_description(self) -> str:
+        """Plain-text description; parses the HTML only for rows ingested before description_text existed."""
+        if self.description_text is not None:
+            return self.description_text
+        return strip_html_to_text(self.description or "")
+
     def format_for_llm(self, include_stock_location: bool = True) -> str:
         """Formats product information for presentation by an LLM."""
         price_str = (
@@ -225,10 +261,8 @@ class Product(Base):
         current_description_text = ""
         if self.llm_summarized_description and self.llm_summarized_description.strip():
             current_description_text = self.llm_summarized_description.strip()
-        elif self.description:
-            stripped = strip_html_to_text(self.description)
-            if stripped and stripped.strip():
-                current_description_text = stripped.strip()
+        else:
+            current_description_text = self.plain_description()
         
         desc_str_for_llm = (
             f"Descripción: {current_description_text}"
@@ -265,19 +299,25 @@ class Product(Base):
         cls,
         damasco_product_data: Dict[str, Any], # Expects snake_case keys from Pydantic model_dump()
         llm_generated_summary: Optional[str],
-        raw_html_description_for_fallback: Optional[str]
+        raw_html_description_for_fallback: Optional[str],
+        include_location: bool = True,
+        plain_description_for_fallback: Optional[str] = None
     ) -> Optional[str]:
         """
         Constructs and cleans the text string for semantic embeddings.
-        Prioritizes LLM-generated summary; falls back to raw HTML stripped.
-        Also includes location/warehouse info for better LLM reasoning.
+        Prioritizes LLM-generated summary; falls back to the already-stripped
+        `plain_description_for_fallback`, or to stripping the raw HTML.
+        Also includes location/warehouse info for better LLM reasoning, unless
+        `include_location` is False (the per-item text stored in product_embeddings,
+        which must be identical for every warehouse row of the same item_code).
         """
         description_content_for_embedding = ""
 
         if llm_generated_summary and llm_generated_summary.strip():
             description_content_for_embedding = llm_generated_summary.lower().strip()
-        elif raw_html_description_for_fallback:
-            plain = strip_html_to_text(raw_html_description_for_fallback)
+        elif plain_description_for_fallback is not None or raw_html_description_for_fallback:
+            plain = (plain_description_for_fallback if plain_description_for_fallback is not None
+                     else strip_html_to_text(raw_html_description_for_fallback))
             if plain and plain.strip():
                 description_content_for_embedding = plain.lower().strip()
 
@@ -308,6 +348,9 @@ class Product(Base):
         add_part(damasco_product_data.get("specifitacion"))
 
         # ✅ Location context for smarter search and fallback reasoning - Ensure all keys are snake_case
+        if not include_location:
+            return cls._join_embedding_parts(parts_to_join, damasco_product_data)
+
         whs_val = damasco_product_data.get("warehouse_name")
         branch_val = damasco_product_data.get("branch_name")
         address_val = damasco_product_data.get("store_address") # This relies on 'store_address' being in Pydantic model
@@ -334,6 +377,10 @@ class Product(Base):
         if location_parts_texts:
             add_part(" ".join(location_parts_texts))
 
+        return cls._join_embedding_parts(parts_to_join, damasco_product_data)
+
+    @staticmethod
+    def _join_embedding_parts(parts_to_join: List[str], damasco_product_data: Dict[str, Any]) -> Optional[str]:
         if not parts_to_join:
             item_code_for_log = damasco_product_data.get("item_code")
             logger.warning(
@@ -0,0 +1,30 @@
+# namwoo_app/models/product_accessory_rec.py
+import logging
+from sqlalchemy import Column, String, TIMESTAMP, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from . import Base
+
+logger = logging.getLogger(__name__)
+
+class ProductAccessoryRec(Base):
+    """
+    Precomputed, ranked accessory recommendations per main item and city.
+
+    Rebuilt by accessory_rec_service after ingestion, so the `query_accessories`
+    tool is a single primary-key lookup. `city` is the canonical city from
+    tiendas_data.json, or '' for the nationwide list.
+    """
+    __tablename__ = 'product_accessory_recs'
+
+    main_item_code = Column(String(64), primary_key=True)
+    city = Column(String(64), primary_key=True, comment="Canonical city, '' for nationwide")
+    accessories = Column(
+        JSONB,
+        nullable=False,
+        comment="Ranked list of {item_code, name, price, score}"
+    )
+    refreshed_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<ProductAccessoryRec(main_item_code='{self.main_item_code}', city='{self.city}', n={len(self.accessories or [])})>"
@@ -0,0 +1,64 @@
+# namwoo_app/models/product_embedding.py
+import logging
+from sqlalchemy import Column, String, Text, TIMESTAMP, func
+
+from . import Base
+from ..config import Config
+from ..utils import vector_storage
+
+logger = logging.getLogger(__name__)
+
+_EMBEDDING_DIMENSION = (
+    Config.EMBEDDING_DIMENSION
+    if hasattr(Config, 'EMBEDDING_DIMENSION') and Config.EMBEDDING_DIMENSION
+    else 1536
+)
+_EMBEDDING_STORAGE = vector_storage.normalize_mode(getattr(Config, 'EMBEDDING_STORAGE', 'vector'))
+
+class ProductEmbedding(Base):
+    """
+    One embedding per unique item_code.
+
+    All warehouse rows of an item share the same descriptive text, so the
+    vector lives here once instead of being repeated on every `products` row.
+    The ANN index is built over this table and the matching stock rows are
+    joined afterwards.
+    """
+    __tablename__ = 'product_embeddings'
+
+    item_code = Column(
+        String(64),
+        primary_key=True,
+        comment="Original item code from Damasco (shared by all warehouse rows)"
+    )
+    content_hash = Column(
+        String(64),
+        nullable=False,
+        index=True,
+        comment="SHA-256 of searchable_text_content, used to skip re-embedding unchanged items"
+    )
+    searchable_text_content = Column(
+        Text,
+        nullable=False,
+        comment="Location-independent PLAIN TEXT used to generate the embedding"
+    )
+    embedding = Column(
+        vector_storage.column_type(_EMBEDDING_STORAGE, _EMBEDDING_DIMENSION),
+        nullable=False,
+        comment="pgvector embedding (vector or halfvec depending on EMBEDDING_STORAGE)"
+    )
+    updated_at = Column(
+        TIMESTAMP(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False
+    )
+
+    __table_args__ = (
+        vector_storage.hnsw_index(
+            'idx_product_embeddings_hnsw', embedding, _EMBEDDING_STORAGE, _EMBEDDING_DIMENSION
+        ),
+    )
+
+    def __repr__(self):
+        return f"<ProductEmbedding(item_code='{self.item_code}', content_hash='{self.content_hash[:12]}...')>"
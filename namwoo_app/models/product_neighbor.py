@@ -0,0 +1,30 @@
+# namwoo_app/models/product_neighbor.py
+import logging
+from sqlalchemy import Column, String, Integer, Float, TIMESTAMP, Index, func
+
+from . import Base
+
+logger = logging.getLogger(__name__)
+
+class ProductNeighbor(Base):
+    """
+    Precomputed top-N most similar items per item_code (cosine over product_embeddings).
+
+    Rebuilt by product_neighbor_service after ingestion, so similar-product lookups
+    read (item_code, rank) from an index instead of running an ANN query per call.
+    Stock and warehouse filters are applied at read time on the join to `products`.
+    """
+    __tablename__ = 'product_neighbors'
+
+    item_code = Column(String(64), primary_key=True)
+    neighbor_item_code = Column(String(64), primary_key=True)
+    rank = Column(Integer, nullable=False, comment="1 = most similar")
+    score = Column(Float, nullable=False, comment="Cosine similarity")
+    refreshed_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('idx_product_neighbors_item_rank', 'item_code', 'rank'),
+    )
+
+    def __repr__(self):
+        return f"<ProductNeighbor(item_code='{self.item_code}', neighbor='{self.neighbor_item_code}', rank={self.rank}, score={self.score:.3f})>"
@@ -0,0 +1,150 @@
+# namwoo_app/services/accessory_rec_service.py
+"""
+Accessory recommendations precomputed after ingestion.
+
+For every in-stock main item (any DAMASCO TECNO sub_category except ACCESORIO) the
+in-stock ACCESORIO items are scored by
+
+    score = W_SIMILARITY * cosine(main, accessory)      (product_embeddings)
+          + W_BRAND      * (same brand)
+          + W_STOCK      * log1p(stock) / log1p(max stock)   (stock in that city)
+
+and the top ACCESSORY_RECS_PER_ITEM are stored per city (plus a nationwide list) in
+product_accessory_recs. Items without an embedding simply score 0 on similarity, so
+unbranded or new products still get stock-ranked suggestions.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from ..config import Config
+from ..models.product import Product
+from ..models.product_accessory_rec import ProductAccessoryRec
+from ..utils import conversation_location, db_utils, product_utils
+from .product_neighbor_service import load_normalized_embeddings
+
+logger = logging.getLogger(__name__)
+
+ACCESSORY_SUB_CATEGORY = "ACCESORIO"
+NATIONWIDE = ""
+
+W_SIMILARITY = 0.55
+W_BRAND = 0.30
+W_STOCK = 0.15
+
+_MAIN_CHUNK = 512
+_INSERT_CHUNK = 2000
+
+
+def _load_stock(session: Session, accessories: bool) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, int]]]:
+    """Returns ({item_code: info}, {item_code: {warehouse_name: stock}}) for in-stock items."""
+    sub_category_filter = (Product.sub_category == ACCESSORY_SUB_CATEGORY if accessories
+                           else Product.sub_category.is_distinct_from(ACCESSORY_SUB_CATEGORY))
+    rows = (session.query(Product.item_code, Product.item_name, Product.base_name, Product.brand,
+                          Product.price, Product.warehouse_name, Product.stock)
+            .filter(Product.stock > 0, Product.item_group_name == "DAMASCO TECNO", sub_category_filter)
+            .all())
+    info: Dict[str, Dict[str, Any]] = {}
+    stock: Dict[str, Dict[str, int]] = {}
+    for row in rows:
+        if row.item_code not in info:
+            name = row.base_name or product_utils.split_base_name_and_color(row.item_name)[0] or row.item_name
+            info[row.item_code] = {
+                "name": name,
+                "brand": (row.brand or "").strip().upper(),
+                "price": float(row.price) if row.price is not None else None,
+            }
+        per_whs = stock.setdefault(row.item_code, {})
+        per_whs[row.warehouse_name] = per_whs.get(row.warehouse_name, 0) + int(row.stock or 0)
+    return info, stock
+
+
+def _stock_matrix(codes: List[str], stock: Dict[str, Dict[str, int]], cities: Dict[str, List[str]]) -> np.ndarray:
+    """(len(cities), len(codes)) stock totals, one row per city key in `cities` order."""
+    out = np.zeros((len(cities), len(codes)), dtype=np.float32)
+    for c, warehouses in enumerate(cities.values()):
+        for i, code in enumerate(codes):
+            per_whs = stock.get(code, {})
+            out[c, i] = sum(per_whs.values()) if warehouses is None else sum(per_whs.get(w, 0) for w in warehouses)
+    return out
+
+
+def refresh_accessory_recommendations(session: Session) -> int:
+    """Rebuilds product_accessory_recs from products and product_embeddings. The caller commits."""
+    top_n = max(1, Config.ACCESSORY_RECS_PER_ITEM)
+    main_info, main_stock = _load_stock(session, accessories=False)
+    acc_info, acc_stock = _load_stock(session, accessories=True)
+    session.execute(text("DELETE FROM product_accessory_recs"))
+    if not main_info or not acc_info:
+        logger.info("Accessory recommendations: no main items or no accessories in stock.")
+        return 0
+
+    cities: Dict[str, Optional[List[str]]] = {NATIONWIDE: None}
+    cities.update(conversation_location.get_warehouse_city_map())
+
+    main_codes, acc_codes = list(main_info), list(acc_info)
+    _, main_emb = load_normalized_embeddings(session, main_codes)
+    _, acc_emb = load_normalized_embeddings(session, acc_codes)
+
+    acc_stock_by_city = _stock_matrix(acc_codes, acc_stock, cities)
+    main_stock_by_city = _stock_matrix(main_codes, main_stock, cities)
+    stock_term = np.log1p(acc_stock_by_city)
+    stock_term /= np.clip(stock_term.max(axis=1, keepdims=True), 1e-12, None)
+
+    acc_brands = np.array([acc_info[c]["brand"] for c in acc_codes], dtype=object)
+    city_keys = list(cities)
+    written = 0
+    pending: List[Dict[str, Any]] = []
+
+    for start in range(0, len(main_codes), _MAIN_CHUNK):
+        chunk_codes = main_codes[start:start + _MAIN_CHUNK]
+        base_scores = W_SIMILARITY * (main_emb[start:start + _MAIN_CHUNK] @ acc_emb.T)
+        for row, main_code in enumerate(chunk_codes):
+            brand = main_info[main_code]["brand"]
+            scores = base_scores[row] + (W_BRAND * (acc_brands == brand) if brand else 0.0)
+            for c, city in enumerate(city_keys):
+                if main_stock_by_city[c, start + row] <= 0:
+                    continue  # Main item not sold in this city; the nationwide row covers it.
+                available = np.flatnonzero(acc_stock_by_city[c] > 0)
+                if available.size == 0:
+                    continue
+                city_scores = scores[available] + W_STOCK * stock_term[c, available]
+                k = min(top_n, available.size)
+                best = available[np.argsort(-city_scores, kind="stable")[:k]]
+                pending.append({
+                    "main_item_code": main_code,
+                    "city": city,
+                    "accessories": [
+                        {"item_code": acc_codes[i], "name": acc_info[acc_codes[i]]["name"],
+                         "price": acc_info[acc_codes[i]]["price"],
+                         "score": round(float(scores[i] + W_STOCK * stock_term[c, i]), 4)}
+                        for i in best
+                    ],
+                })
+        if len(pending) >= _INSERT_CHUNK:
+            session.execute(insert(ProductAccessoryRec), pending)
+            written += len(pending)
+            pending = []
+
+    if pending:
+        session.execute(insert(ProductAccessoryRec), pending)
+        written += len(pending)
+    logger.info(f"Accessory recommendations: {written} rows for {len(main_codes)} items and {len(acc_codes)} accessories.")
+    return written
+
+
+def get_recommendations(main_item_code: str, city: Optional[str], limit: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Primary-key lookup of the precomputed list for (item, city), or the nationwide one when no city
+    is known. Returns None when nothing was precomputed (caller falls back to a live query).
+    """
+    with db_utils.get_db_session() as session:
+        if not session:
+            return None
+        rec = session.get(ProductAccessoryRec, (main_item_code, (city or NATIONWIDE).lower()))
+        if rec is None:
+            return None
+        return list(rec.accessories or [])[:limit]
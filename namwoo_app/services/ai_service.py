@@ -2,17 +2,26 @@
 # -*- coding: utf-8 -*-
 import logging
 import json
-from typing import Dict, Any, Optional
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional, Tuple
+
+from flask import current_app, has_app_context
 
 from ..config import Config
 from . import support_board_service
+from . import conversation_history_service
+from . import intent_router
 
 # --- START OF MODIFICATION ---
 # CORRECTED IMPORT PATHS:
 # We are in the 'services' package. 'utils' is a sibling.
 # So we must go up one level ('..') to the parent 'namwoo_app'
 # and then down into the 'utils' package.
-from ..utils import conversation_details
+from ..utils import conversation_details, customer_info_prefilter, metrics, reply_chunker
+from ..utils.llm_clients import get_openai_client
 # --- END OF MODIFICATION ---
 
 # Import the provider modules
@@ -24,16 +33,32 @@ logger = logging.getLogger(__name__)
 
 # --- Provider Factory ---
 
+# Providers hold no per-conversation state, so one instance (and its pooled client) is reused per
+# process. Keyed by pid as well: a forked worker must not reuse its parent's connections.
+_providers: Dict[Tuple[int, str], Any] = {}
+_providers_lock = threading.Lock()
+
+
 def get_ai_provider():
     """
-    Factory function to read the config and instantiate the correct AI provider.
+    Returns the configured AI provider, creating it on first use in this process.
     This is the core of the dynamic switching mechanism.
     """
     # NOTE: The code expects the environment variable to be named 'AI_PROVIDER'.
     # Please ensure your .env file uses this key, not 'LLM_PROVIDER'.
     provider_name = getattr(Config, "AI_PROVIDER", "openai_chat").lower()
-    logger.info(f"AI Provider selected: '{provider_name}'")
+    key = (os.getpid(), provider_name)
+    provider = _providers.get(key)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(key)
+            if provider is None:
+                provider = _providers[key] = _create_ai_provider(provider_name)
+                logger.info(f"AI Provider selected: '{provider_name}'")
+    return provider
 
+
+def _create_ai_provider(provider_name: str):
     # This function uses Config values, which are loaded correctly. No changes needed here.
     if provider_name == "openai_assistant":
         if not Config.OPENAI_ASSISTANT_ID:
@@ -63,15 +88,34 @@ def process_new_message(
     sender_user_id: str,
     customer_user_id: str,
     triggering_message_id: Optional[str],
+    reply_gate: Optional[Callable[[], bool]] = None,
 ) -> None:
     """
     This is the single, unified entry point for the main application.
     It determines the correct AI provider and delegates the message processing.
+
+    `reply_gate`, if given, is called once before the first message is sent; when it
+    returns False the turn's reply is dropped (the message was handled elsewhere). The gate
+    only holds back replies: the turn's other effects still happen, e.g. the default
+    department assignment and the reservation details saved by save_customer_reservation_details.
     """
+    gate_state: Dict[str, bool] = {}
+
+    def reply_allowed() -> bool:
+        if reply_gate is None:
+            return True
+        if "open" not in gate_state:
+            gate_state["open"] = bool(reply_gate())
+            if not gate_state["open"]:
+                logger.info(f"Reply for Conv {sb_conversation_id} suppressed by the reply gate.")
+        return gate_state["open"]
+
     try:
         provider = get_ai_provider()
     except Exception as e:
         logger.exception("Failed to initialize an AI provider. Check configuration.")
+        if not reply_allowed():
+            return
         support_board_service.send_reply_to_channel(
             conversation_id=sb_conversation_id,
             message_text=f"Error de configuración del servidor de IA: {e}",
@@ -83,7 +127,7 @@ def process_new_message(
 
     # Dynamic context is common to all providers and is fetched here
     reservation_context = conversation_details.get_reservation_details(sb_conversation_id)
-    conversation_data = support_board_service.get_sb_conversation_data(sb_conversation_id)
+    conversation_data = conversation_history_service.get_conversation(sb_conversation_id)
 
     # --- START OF FIX: Automatic Department Routing ---
     # This block checks if the conversation is unassigned and routes it to the
@@ -102,20 +146,66 @@ def process_new_message(
                         conversation_id=sb_conversation_id,
                         department_id=dept_id_int
                     )
+                    conversation_history_service.update_details(sb_conversation_id, department=dept_id_int)
                 except (ValueError, TypeError):
                     logger.error(f"Cannot auto-route conversation {sb_conversation_id}: Configured SUPPORT_BOARD_ATENCION_AL_CLIENTE_ID ('{default_dept_id}') is not a valid integer.")
             else:
                 logger.warning(f"Cannot auto-route conversation {sb_conversation_id}: SUPPORT_BOARD_ATENCION_AL_CLIENTE_ID is not configured in the environment.")
     # --- END OF FIX ---
 
+    # Trivial messages (greetings, thanks, map pins, bare item codes) are answered without the LLM.
+    routed = intent_router.route(sb_conversation_id, new_user_message, conversation_data, reservation_context)
+    if routed:
+        if reply_allowed():
+            support_board_service.send_reply_to_channel(
+                conversation_id=sb_conversation_id,
+                message_text=routed["reply"],
+                source=conversation_source,
+                target_user_id=customer_user_id,
+                conversation_details=conversation_data,
+                triggering_message_id=triggering_message_id,
+            )
+        return
+
+    # Providers that stream deliver the reply piece by piece through this callback.
+    streamed_chunks = []
+
+    def send_reply_chunk(chunk: str) -> None:
+        if not reply_allowed():
+            return
+        streamed_chunks.append(chunk)
+        support_board_service.send_reply_to_channel(
+            conversation_id=sb_conversation_id,
+            message_text=chunk,
+            source=conversation_source,
+            target_user_id=customer_user_id,
+            conversation_details=conversation_data,
+            triggering_message_id=triggering_message_id,
+        )
+
+    streaming_kwargs = {}
+    if getattr(provider, "supports_streaming", False):
+        streaming_kwargs = {"on_reply_chunk": send_reply_chunk,
+                            "reply_max_chars": reply_chunker.max_chars_for(conversation_source)}
+
     # Delegate the entire processing task to the selected provider
+    turn_started = time.monotonic()
     final_assistant_response = provider.process_message(
         sb_conversation_id=sb_conversation_id,
         new_user_message=new_user_message,
         conversation_data=conversation_data,
-        reservation_context=reservation_context
+        reservation_context=reservation_context,
+        **streaming_kwargs
     )
-    
+    metrics.incr("ai_turn_count")
+    metrics.incr("ai_turn_ms_total", int((time.monotonic() - turn_started) * 1000))
+
+    if streamed_chunks:
+        logger.info(f"Reply for Conv {sb_conversation_id} was streamed in {len(streamed_chunks)} message(s).")
+        return
+    if not reply_allowed():
+        return
+
     # Sending the final reply back to the user is also a common task
     if final_assistant_response:
         support_board_service.send_reply_to_channel(
@@ -138,14 +228,80 @@ def process_new_message(
             triggering_message_id=triggering_message_id,
         )
 
+# --- Customer order data extraction ---
+
+CUSTOMER_INFO_REQUIRED_KEYS = ("full_name", "cedula", "telefono", "correo", "direccion", "productos", "total")
+
+_extraction_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="customer-info")
+
+
+def is_complete_customer_info(customer_data: Optional[Dict[str, Any]]) -> bool:
+    return bool(customer_data) and all(customer_data.get(k) for k in CUSTOMER_INFO_REQUIRED_KEYS)
+
+
+class CustomerInfoExtraction:
+    """
+    A started order-data extraction. The verdict is waited for (up to
+    CUSTOMER_INFO_EXTRACTION_TIMEOUT) only once and then kept, so the reply gate and the
+    template decision always agree, even when the first wait timed out.
+    """
+
+    def __init__(self, future: Future):
+        self._future = future
+        self._lock = threading.Lock()
+        self._resolved = False
+        self._customer_data: Optional[Dict[str, Any]] = None
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Complete order data, or None (also on error or timeout)."""
+        with self._lock:
+            if not self._resolved:
+                try:
+                    customer_data = self._future.result(timeout=Config.CUSTOMER_INFO_EXTRACTION_TIMEOUT)
+                except Exception as e:
+                    logger.warning(f"Customer info extraction did not finish: {e!r}")
+                    customer_data = None
+                self._customer_data = customer_data if is_complete_customer_info(customer_data) else None
+                self._resolved = True
+            return self._customer_data
+
+
+def start_customer_info_extraction(message_text: Optional[str]) -> Optional[CustomerInfoExtraction]:
+    """
+    Starts extract_customer_info_via_llm in the background when the message could hold a
+    complete order (see customer_info_prefilter); returns None when it cannot.
+    """
+    if not message_text:
+        return None
+    missing = customer_info_prefilter.missing_fields(message_text)
+    if missing:
+        metrics.incr("customer_info_extraction_skipped")
+        logger.debug(f"Customer info extraction skipped; message lacks: {', '.join(missing)}.")
+        return None
+    metrics.incr("customer_info_extraction_runs")
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def run() -> Optional[Dict[str, Any]]:
+        if app is None:
+            return extract_customer_info_via_llm(message_text)
+        with app.app_context():
+            return extract_customer_info_via_llm(message_text)
+
+    return CustomerInfoExtraction(_extraction_pool.submit(run))
+
+
+def customer_info_result(extraction: Optional[CustomerInfoExtraction]) -> Optional[Dict[str, Any]]:
+    """Complete order data from a started extraction, or None; see CustomerInfoExtraction."""
+    return extraction.result() if extraction is not None else None
+
+
 # This utility function should ideally live in its own file (e.g., services/llm_utils.py)
 # but for now, we leave it here and correct its dependency.
 def extract_customer_info_via_llm(message_text: str) -> Optional[Dict[str, Any]]:
-    # This function depends on the OpenAI client, which is now inside the provider.
-    # For now, let's create a temporary client instance.
-    from openai import OpenAI
-    client = OpenAI(api_key=Config.OPENAI_API_KEY)
-    
+    client = get_openai_client()
+    if not client:
+        return None
+
     system_prompt = ("Extrae la siguiente información del mensaje del cliente. "
         "Devuelve solo JSON válido con las claves: full_name, cedula, telefono, "
         "correo, direccion, productos y total. Si falta algún campo, usa null. "
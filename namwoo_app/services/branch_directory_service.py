@@ -0,0 +1,136 @@
+# namwoo_app/services/branch_directory_service.py
+"""
+Branch (store) directory used for address lookups.
+
+The `branches` table is rebuilt with the other derived catalog data after ingestion,
+from the distinct branch/warehouse/address values in `products` merged with
+data/tiendas_data.json. Each process keeps it as an in-memory BranchIndex, revalidated
+against the catalog version like the brand cache; when the table is empty or the DB is
+unavailable, the index is built from tiendas_data.json alone.
+"""
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from ..config import Config
+from ..models.branch import Branch
+from ..utils import conversation_location, db_utils, search_cache
+from ..utils.branch_matching import BranchIndex, normalize_name
+
+logger = logging.getLogger(__name__)
+
+TIENDAS_DATA_PATH = Path(__file__).parent.parent / 'data' / 'tiendas_data.json'
+
+_DISTINCT_PRODUCT_BRANCHES_SQL = text("""
+    SELECT DISTINCT ON (branch_name) branch_name, warehouse_name, store_address
+    FROM products
+    WHERE branch_name IS NOT NULL AND branch_name <> ''
+    ORDER BY branch_name, (store_address IS NULL OR store_address = ''), updated_at DESC
+""")
+
+_index: Optional[BranchIndex] = None
+_index_version: Optional[int] = None
+_index_checked_at: float = 0.0
+
+
+def _load_tiendas() -> List[Dict[str, Any]]:
+    try:
+        with open(TIENDAS_DATA_PATH, 'r', encoding='utf-8') as f:
+            tiendas = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Could not load {TIENDAS_DATA_PATH}: {e}")
+        return []
+    return [
+        {"branch_name": t["branchName"], "warehouse_name": t.get("whsName"),
+         "city": (t.get("city") or "").lower() or None, "address": t.get("address")}
+        for t in tiendas if t.get("branchName")
+    ]
+
+
+def _city_for(branch_name: str, warehouse_name: Optional[str]) -> Optional[str]:
+    for city, warehouses in conversation_location.get_warehouse_city_map().items():
+        if warehouse_name in warehouses:
+            return city
+    return conversation_location.BRANCH_TO_CITY_MAP.get((branch_name or "").lower())
+
+
+# ===========================================================================
+# Refresh (worker side)
+# ===========================================================================
+
+def build_directory(session: Session) -> List[Dict[str, Any]]:
+    """tiendas_data.json entries, with addresses from ingested products taking precedence."""
+    by_key: Dict[str, Dict[str, Any]] = {}
+    for record in _load_tiendas():
+        by_key.setdefault(normalize_name(record["branch_name"]), record)
+
+    for branch_name, warehouse_name, store_address in session.execute(_DISTINCT_PRODUCT_BRANCHES_SQL):
+        key = normalize_name(branch_name)
+        record = by_key.get(key)
+        if record is None:
+            record = by_key[key] = {"branch_name": branch_name, "warehouse_name": warehouse_name,
+                                    "city": _city_for(branch_name, warehouse_name), "address": None}
+        if store_address and store_address.strip():
+            record["address"] = store_address.strip()
+        record["warehouse_name"] = record.get("warehouse_name") or warehouse_name
+    return list(by_key.values())
+
+
+def refresh_branches(session: Session) -> int:
+    """Rebuilds the branches table. The caller commits."""
+    records = build_directory(session)
+    session.execute(text("DELETE FROM branches"))
+    if records:
+        session.execute(insert(Branch), records)
+    return len(records)
+
+
+# ===========================================================================
+# Read side (in-process index)
+# ===========================================================================
+
+def invalidate_local_cache() -> None:
+    global _index, _index_version, _index_checked_at
+    _index, _index_version, _index_checked_at = None, None, 0.0
+
+
+def _load_index() -> BranchIndex:
+    records: List[Dict[str, Any]] = []
+    try:
+        with db_utils.get_db_session() as session:
+            if session:
+                records = [
+                    {"branch_name": b.branch_name, "warehouse_name": b.warehouse_name, "city": b.city, "address": b.address}
+                    for b in session.query(Branch).all()
+                ]
+    except Exception as e:
+        logger.warning(f"Could not read branches table, using tiendas_data.json: {e}")
+    if not records:
+        records = _load_tiendas()
+    for record in records:
+        record["aliases"] = [record["warehouse_name"]] if record.get("warehouse_name") else []
+    return BranchIndex(records)
+
+
+def _get_index() -> BranchIndex:
+    global _index, _index_version, _index_checked_at
+    now = time.monotonic()
+    if _index is not None and now - _index_checked_at < Config.BRAND_CACHE_CHECK_SECONDS:
+        return _index
+    version = search_cache.get_catalog_version()
+    _index_checked_at = now
+    if _index is None or _index_version != version:
+        _index, _index_version = _load_index(), version
+        logger.info(f"Branch directory loaded for catalog version {version}: {len(_index)} branches.")
+    return _index
+
+
+def find_branch(branch_name: str, city: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Best directory entry for a user-typed branch name; `city` narrows ambiguous names."""
+    canonical_city = conversation_location.detect_city_from_text(city) if city else None
+    return _get_index().match(branch_name, canonical_city or city)
@@ -0,0 +1,175 @@
+# namwoo_app/services/catalog_index_service.py
+"""
+Derived catalog data that is rebuilt after ingestion instead of being queried per search.
+
+- `brand_category_summary`: in-stock brands per sub_category (replaces SELECT DISTINCT brand).
+- `product_accessory_recs`: ranked accessories per item and city (see accessory_rec_service).
+- `product_neighbors`: top-N similar items per item_code (see product_neighbor_service).
+- `branches`: the store directory for address lookups (see branch_directory_service).
+- An in-process cache of that table with one precompiled brand regex per sub_category.
+
+The in-process cache is revalidated against the Redis catalog version at most every
+BRAND_CACHE_CHECK_SECONDS, so a refresh on the worker reaches every web process quickly
+without a DB round-trip on each search.
+"""
+import logging
+import re
+import time
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from ..config import Config
+from ..models.product import Product
+from ..models.brand_category_summary import BrandCategorySummary
+from ..utils import db_utils, search_cache
+from . import accessory_rec_service, branch_directory_service, product_neighbor_service
+
+logger = logging.getLogger(__name__)
+
+_REFRESH_BRAND_SUMMARY_SQL = text("""
+    INSERT INTO brand_category_summary (sub_category, brand, item_count, refreshed_at)
+    SELECT UPPER(COALESCE(sub_category, '')), brand, COUNT(DISTINCT item_code), NOW()
+    FROM products
+    WHERE stock > 0 AND item_group_name = 'DAMASCO TECNO' AND brand IS NOT NULL AND brand <> ''
+    GROUP BY UPPER(COALESCE(sub_category, '')), brand
+""")
+
+# {sub_category: (sorted brands, compiled matcher)}
+_brand_cache: Dict[str, Tuple[List[str], Optional[Pattern]]] = {}
+_brand_cache_version: Optional[int] = None
+_brand_cache_checked_at: float = 0.0
+# match_brand() answers for the loaded brand cache, keyed by (sub_category, query); reset on reload.
+_brand_match_memo: Dict[Tuple[str, str], Optional[str]] = {}
+
+
+def _compile_brand_pattern(brands: List[str]) -> Optional[Pattern]:
+    """
+    One alternation over all brands, longest first so 'TCL' cannot shadow 'TCL Mobile'.
+    Brands must appear as whole words; the original substring check matched 'LG' inside 'algo'.
+    """
+    if not brands:
+        return None
+    alternatives = "|".join(re.escape(b) for b in sorted(brands, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)({alternatives})(?!\w)", re.IGNORECASE)
+
+
+# ===========================================================================
+# Refresh (worker side)
+# ===========================================================================
+
+def refresh_brand_category_summary(session: Session) -> int:
+    """Rebuilds brand_category_summary from products. The caller commits."""
+    session.execute(text("DELETE FROM brand_category_summary"))
+    session.execute(_REFRESH_BRAND_SUMMARY_SQL)
+    return session.query(BrandCategorySummary).count()
+
+
+def refresh_catalog_derived_data() -> bool:
+    """Refreshes every derived catalog table in one transaction, then bumps the catalog version."""
+    with db_utils.get_db_session() as session:
+        if not session:
+            logger.error("DB session unavailable for catalog refresh.")
+            return False
+        brand_rows = refresh_brand_category_summary(session)
+        accessory_rows = accessory_rec_service.refresh_accessory_recommendations(session)
+        neighbor_rows = product_neighbor_service.refresh_product_neighbors(session)
+        branch_rows = branch_directory_service.refresh_branches(session)
+        session.commit()
+    logger.info(f"Catalog derived data refreshed: {brand_rows} brand/sub_category rows, "
+                f"{accessory_rows} accessory lists, {neighbor_rows} neighbour pairs, {branch_rows} branches.")
+    search_cache.bump_catalog_version()
+    invalidate_local_cache()
+    branch_directory_service.invalidate_local_cache()
+    return True
+
+
+# ===========================================================================
+# Read side (in-process cache)
+# ===========================================================================
+
+def invalidate_local_cache() -> None:
+    global _brand_cache, _brand_cache_version, _brand_cache_checked_at
+    _brand_cache = {}
+    _brand_match_memo.clear()
+    _brand_cache_version = None
+    _brand_cache_checked_at = 0.0
+
+
+def _load_brand_cache() -> Optional[Dict[str, Tuple[List[str], Optional[Pattern]]]]:
+    with db_utils.get_db_session() as session:
+        if not session:
+            return None
+        rows = (session.query(BrandCategorySummary.sub_category, BrandCategorySummary.brand)
+                .order_by(BrandCategorySummary.sub_category, BrandCategorySummary.brand)
+                .all())
+        if not rows:
+            # Summary never built (fresh install): fall back to the live catalog once.
+            rows = (session.query(func.upper(func.coalesce(Product.sub_category, '')), Product.brand)
+                    .filter(Product.item_group_name == "DAMASCO TECNO", Product.stock > 0, Product.brand.isnot(None))
+                    .distinct().all())
+    by_category: Dict[str, List[str]] = {}
+    for sub_category, brand in rows:
+        by_category.setdefault(sub_category or "", []).append(brand)
+    return {
+        category: (sorted(set(brands)), _compile_brand_pattern(brands))
+        for category, brands in by_category.items()
+    }
+
+
+def _get_brand_cache() -> Optional[Dict[str, Tuple[List[str], Optional[Pattern]]]]:
+    global _brand_cache, _brand_cache_version, _brand_cache_checked_at
+    now = time.monotonic()
+    if _brand_cache_version is not None and now - _brand_cache_checked_at < Config.BRAND_CACHE_CHECK_SECONDS:
+        return _brand_cache
+
+    version = search_cache.get_catalog_version()
+    _brand_cache_checked_at = now
+    if _brand_cache_version == version:
+        return _brand_cache
+
+    try:
+        loaded = _load_brand_cache()
+    except Exception as e:
+        logger.exception(f"Error loading brand summary: {e}")
+        loaded = None
+    if loaded is None:
+        return _brand_cache or None
+    _brand_cache, _brand_cache_version = loaded, version
+    _brand_match_memo.clear()
+    logger.info(f"Brand cache loaded for catalog version {version}: {len(loaded)} sub_categories.")
+    return _brand_cache
+
+
+def get_brands(category: str = 'CELULAR') -> Optional[List[str]]:
+    cache = _get_brand_cache()
+    if cache is None:
+        return None
+    brands, _ = cache.get((category or "").upper(), ([], None))
+    return list(brands)
+
+
+def match_brand(query: str, category: str = 'CELULAR') -> Optional[str]:
+    """Returns the first brand of `category` named in `query` (leftmost, longest), or None."""
+    cache = _get_brand_cache()
+    if not cache or not query:
+        return None
+    memo_key = ((category or "").upper(), query)
+    if memo_key in _brand_match_memo:
+        return _brand_match_memo[memo_key]
+    if len(_brand_match_memo) >= Config.QUERY_PARSE_CACHE_SIZE:
+        _brand_match_memo.clear()
+    _brand_match_memo[memo_key] = found = _match_brand(cache, *memo_key)
+    return found
+
+
+def _match_brand(cache: Dict[str, Tuple[List[str], Optional[Pattern]]], category: str, query: str) -> Optional[str]:
+    brands, pattern = cache.get(category, ([], None))
+    if pattern is None:
+        return None
+    match = pattern.search(query)
+    if not match:
+        return None
+    found = match.group(1).lower()
+    return next((b for b in brands if b.lower() == found), match.group(1))
@@ -0,0 +1,219 @@
+# namwoo_app/services/conversation_history_service.py
+"""
+Per-conversation message cache in Redis, kept in step with Support Board incrementally.
+
+`get_conversation()` returns the same shape as support_board_service.get_sb_conversation_data
+(`details` and `messages`) plus `openai_messages`, the history already converted for the
+chat provider. The full conversation is fetched from Support Board only when there is no
+cache entry, when the entry is older than HISTORY_CACHE_RESYNC_SECONDS, or after a gap was
+detected. Every `message-sent` webhook is appended through `record_webhook_message()` and
+converted once. Messages we add ourselves (replies, virtual tool calls) are appended right
+after the send through `record_sent_message()`, so the history does not depend on their
+echoes; when an echo does arrive it is recognised as already cached.
+
+Layout (both keys expire after HISTORY_CACHE_TTL of inactivity):
+    sbhist:{conversation_id}:msgs  list of JSON entries {id, user_id, message, payload, openai}
+    sbhist:{conversation_id}:meta  hash {details (JSON), last_id, synced_at}
+
+Message ids are increasing. A webhook message whose id is not newer than the last cached
+one, and that is not already cached, arrived out of order: the entry is dropped and the next
+read refetches. A webhook that never arrives at all is not detected; the cache only catches
+up at the next periodic resync. A send whose new message id is unknown drops the entry too.
+"""
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import redis
+
+from ..config import Config
+from ..extensions import get_redis_client
+from . import support_board_service
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "sbhist"
+
+
+def _keys(conversation_id: str):
+    return f"{_KEY_PREFIX}:{conversation_id}:msgs", f"{_KEY_PREFIX}:{conversation_id}:meta"
+
+
+def _message_id(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_sb_message(msg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """One Support Board message as a chat-completions message (None for empty messages)."""
+    bot_user_id_str = str(Config.SUPPORT_BOARD_DM_BOT_USER_ID)
+    role = "assistant" if str(msg.get("user_id")) == bot_user_id_str else "user"
+    payload = msg.get("payload")
+    if role == "assistant" and payload:
+        try:
+            payload_json = json.loads(payload) if isinstance(payload, str) else payload
+            if isinstance(payload_json, dict):
+                if "tool_calls" in payload_json:
+                    return {"role": "assistant", "content": None, "tool_calls": payload_json["tool_calls"]}
+                # Tool results are stored by the bot user too; pair them with their call again.
+                if "tool_call_id" in payload_json and "name" in payload_json:
+                    return {"role": "tool", "tool_call_id": payload_json["tool_call_id"],
+                            "name": payload_json["name"], "content": payload_json.get("content")}
+        except (json.JSONDecodeError, TypeError):
+            pass
+    text_content = (msg.get("message") or "").strip()
+    return {"role": role, "content": text_content} if text_content else None
+
+
+def _entry(msg: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": msg.get("id"), "user_id": msg.get("user_id"), "message": msg.get("message") or "",
+        "payload": msg.get("payload") or "", "openai": format_sb_message(msg),
+    }
+
+
+def _to_conversation(details: Dict[str, Any], entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "details": details,
+        "messages": [{k: e.get(k) for k in ("id", "user_id", "message", "payload")} for e in entries],
+        "openai_messages": [e["openai"] for e in entries if e.get("openai")],
+    }
+
+
+def _full_sync(client: Optional[redis.Redis], conversation_id: str) -> Optional[Dict[str, Any]]:
+    data = support_board_service.get_sb_conversation_data(conversation_id)
+    if not isinstance(data, dict):
+        return data
+    entries = [_entry(m) for m in data.get("messages") or []]
+    conversation = dict(data, openai_messages=_to_conversation({}, entries)["openai_messages"])
+    if client is None:
+        return conversation
+    msgs_key, meta_key = _keys(conversation_id)
+    ids = [i for i in (_message_id(e["id"]) for e in entries) if i is not None]
+    try:
+        pipe = client.pipeline()
+        pipe.delete(msgs_key, meta_key)
+        if entries:
+            pipe.rpush(msgs_key, *[json.dumps(e, ensure_ascii=False) for e in entries])
+        pipe.hset(meta_key, mapping={
+            "details": json.dumps(data.get("details") or {}, ensure_ascii=False),
+            "last_id": max(ids) if ids else 0,
+            "synced_at": time.time(),
+        })
+        pipe.expire(msgs_key, Config.HISTORY_CACHE_TTL)
+        pipe.expire(meta_key, Config.HISTORY_CACHE_TTL)
+        pipe.execute()
+        logger.info(f"History cache for conv {conversation_id} rebuilt from Support Board ({len(entries)} messages).")
+    except redis.RedisError as e:
+        logger.warning(f"Could not store history cache for conv {conversation_id}: {e}")
+    return conversation
+
+
+def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """Cached conversation data; falls back to a full Support Board fetch (and re-caches)."""
+    if not Config.HISTORY_CACHE_ENABLED:
+        return _full_sync(None, conversation_id)
+    try:
+        client = get_redis_client()
+        msgs_key, meta_key = _keys(conversation_id)
+        pipe = client.pipeline()
+        pipe.hgetall(meta_key)
+        pipe.lrange(msgs_key, 0, -1)
+        meta, raw_entries = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"History cache unavailable for conv {conversation_id}: {e}")
+        return _full_sync(None, conversation_id)
+
+    synced_at = float(meta.get(b"synced_at", 0)) if meta else 0.0
+    if not meta or time.time() - synced_at > Config.HISTORY_CACHE_RESYNC_SECONDS:
+        return _full_sync(client, conversation_id)
+    details = json.loads(meta.get(b"details") or b"{}")
+    return _to_conversation(details, [json.loads(raw) for raw in raw_entries])
+
+
+def record_webhook_message(conversation_id: str, message: Dict[str, Any]) -> None:
+    """
+    Appends a `message-sent` webhook message (`message_id`, `user_id`, `message`, `payload`)
+    to the cached conversation, if there is one.
+    """
+    if not Config.HISTORY_CACHE_ENABLED or not conversation_id:
+        return
+    _record(conversation_id, {"id": message.get("message_id"), "user_id": message.get("user_id"),
+                              "message": message.get("message"), "payload": message.get("payload")})
+
+
+def record_sent_message(conversation_id: str, message: Dict[str, Any]) -> None:
+    """
+    Appends a message we just added to Support Board (`id`, `user_id`, `message`, `payload`).
+    Without the new message id its place in the history is unknown, so the entry is dropped.
+    """
+    if not Config.HISTORY_CACHE_ENABLED or not conversation_id:
+        return
+    if _message_id(message.get("id")) is None:
+        invalidate(str(conversation_id))
+        return
+    _record(conversation_id, message)
+
+
+def _record(conversation_id: str, msg: Dict[str, Any]) -> None:
+    message_id = _message_id(msg["id"])
+    msgs_key, meta_key = _keys(str(conversation_id))
+    try:
+        client = get_redis_client()
+        for _ in range(3):
+            try:
+                _append(client, str(conversation_id), msg, message_id, msgs_key, meta_key)
+                return
+            except redis.WatchError:
+                continue  # A concurrent append or resync changed the entry; re-read it.
+        invalidate(str(conversation_id))
+    except redis.RedisError as e:
+        logger.warning(f"Could not append to history cache for conv {conversation_id}: {e}")
+
+
+def _append(client: redis.Redis, conversation_id: str, msg: Dict[str, Any], message_id: Optional[int],
+            msgs_key: str, meta_key: str) -> None:
+    with client.pipeline() as pipe:
+        pipe.watch(meta_key)
+        last_id = pipe.hget(meta_key, "last_id")
+        if last_id is None:
+            return  # Not cached; the next read does a full sync.
+        if message_id is None or message_id <= int(last_id):
+            cached_ids = {str(json.loads(raw).get("id")) for raw in pipe.lrange(msgs_key, 0, -1)}
+            if str(msg["id"]) in cached_ids:
+                return  # Duplicate delivery
+            logger.info(f"History gap in conv {conversation_id} (message {msg['id']} after {int(last_id)}); dropping cache.")
+            pipe.multi()
+            pipe.delete(msgs_key, meta_key)
+            pipe.execute()
+            return
+        pipe.multi()
+        pipe.rpush(msgs_key, json.dumps(_entry(msg), ensure_ascii=False))
+        pipe.hset(meta_key, "last_id", message_id)
+        pipe.expire(msgs_key, Config.HISTORY_CACHE_TTL)
+        pipe.expire(meta_key, Config.HISTORY_CACHE_TTL)
+        pipe.execute()
+
+
+def update_details(conversation_id: str, **changes: Any) -> None:
+    """Applies local changes (e.g. a department assignment) to the cached conversation details."""
+    if not Config.HISTORY_CACHE_ENABLED:
+        return
+    _, meta_key = _keys(conversation_id)
+    try:
+        client = get_redis_client()
+        raw = client.hget(meta_key, "details")
+        if raw is not None:
+            client.hset(meta_key, "details", json.dumps(dict(json.loads(raw), **changes), ensure_ascii=False))
+    except redis.RedisError as e:
+        logger.warning(f"Could not update cached details for conv {conversation_id}: {e}")
+
+
+def invalidate(conversation_id: str) -> None:
+    try:
+        get_redis_client().delete(*_keys(conversation_id))
+    except redis.RedisError as e:
+        logger.warning(f"Could not invalidate history cache for conv {conversation_id}: {e}")
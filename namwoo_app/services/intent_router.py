@@ -0,0 +1,148 @@
+# namwoo_app/services/intent_router.py
+"""
+Fast path for trivial messages, answered without the LLM.
+
+`route()` runs before the AI provider and returns a templated reply when the message is
+one of the intents enabled in INTENT_ROUTER_INTENTS (none by default), otherwise None (the
+provider handles it):
+
+    greeting      first message of the conversation is a bare greeting -> system prompt's Caso A
+    thanks        a bare "gracias" outside a reservation -> INTENT_THANKS_REPLY
+    location_pin  a shared map pin (no other text) outside a reservation -> nearest stores
+    sku           a bare item code that exists, outside a reservation -> product details (one catalog lookup)
+
+The templates follow the system prompt so the routed replies read like the model's own.
+The location result is also stored in the conversation as the usual virtual
+`get_location_details_from_user` tool call, so later LLM turns can use `nearby_stores`.
+Routing is skipped for the Assistants provider, whose thread would miss the exchange.
+
+Metrics: intent_router_routed / intent_router_passed (routed share), and per intent
+intent_router_{intent}_count with intent_router_{intent}_ms_total (average latency).
+"""
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from ..config import Config
+from ..utils import conversation_location, intent_rules, message_parser, metrics
+from . import geolocation_service, product_service, support_board_service
+
+logger = logging.getLogger(__name__)
+
+_URL_RE = re.compile(r"https?://\S+")
+# A pin may come with a couple of words ("aquí estoy"); anything longer goes to the LLM.
+_MAX_WORDS_WITH_PIN = 3
+
+
+def enabled_intents() -> List[str]:
+    if Config.AI_PROVIDER == "openai_assistant":
+        return []
+    return [name.strip() for name in (Config.INTENT_ROUTER_INTENTS or "").split(",") if name.strip()]
+
+
+def detect_intent(
+    message: Optional[str],
+    conversation_data: Optional[Dict[str, Any]],
+    reservation_context: Optional[Dict[str, Any]],
+) -> Optional[str]:
+    if not message:
+        return None
+    if message_parser.extract_location_from_text(message):
+        if reservation_context or len(_URL_RE.sub(" ", message).split()) > _MAX_WORDS_WITH_PIN:
+            return None  # During a reservation a pin is a delivery address, not a store lookup.
+        return "location_pin"
+    intent = intent_rules.classify(message)
+    if intent == "greeting" and _bot_has_replied(conversation_data):
+        return None
+    if intent in ("thanks", "sku") and reservation_context:
+        return None  # During a reservation a bare number is usually a cédula or phone number.
+    return intent
+
+
+def route(
+    sb_conversation_id: str,
+    message: Optional[str],
+    conversation_data: Optional[Dict[str, Any]],
+    reservation_context: Optional[Dict[str, Any]],
+) -> Optional[Dict[str, str]]:
+    """{"intent", "reply"} for a routed message, None to use the AI provider."""
+    intents = enabled_intents()
+    if not intents:
+        return None
+    started = time.monotonic()
+    intent = detect_intent(message, conversation_data, reservation_context)
+    reply = _reply(intent, sb_conversation_id, message) if intent in intents else None
+    if not reply:
+        metrics.incr("intent_router_passed")
+        return None
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    metrics.incr("intent_router_routed")
+    metrics.incr(f"intent_router_{intent}_count")
+    metrics.incr(f"intent_router_{intent}_ms_total", elapsed_ms)
+    logger.info(f"Intent router answered '{intent}' for Conv {sb_conversation_id} in {elapsed_ms} ms.")
+    return {"intent": intent, "reply": reply}
+
+
+def _reply(intent: str, sb_conversation_id: str, message: str) -> Optional[str]:
+    try:
+        if intent == "greeting":
+            return Config.INTENT_GREETING_REPLY
+        if intent == "thanks":
+            return Config.INTENT_THANKS_REPLY
+        if intent == "location_pin":
+            return _nearest_stores_reply(sb_conversation_id, message)
+        return _product_reply(sb_conversation_id, message.strip())
+    except Exception as e:
+        logger.exception(f"Intent router failed on '{intent}' for Conv {sb_conversation_id}: {e}")
+        return None
+
+
+def _bot_has_replied(conversation_data: Optional[Dict[str, Any]]) -> bool:
+    bot_user_id = str(Config.SUPPORT_BOARD_DM_BOT_USER_ID)
+    return any(str(m.get("user_id")) == bot_user_id for m in (conversation_data or {}).get("messages") or [])
+
+
+def _nearest_stores_reply(sb_conversation_id: str, message: str) -> Optional[str]:
+    location = message_parser.extract_location_from_text(message)
+    details = geolocation_service.get_location_details(latitude=location["latitude"], longitude=location["longitude"])
+    stores = details.get("nearby_stores") or []
+    if not stores:
+        return None  # Let the model explain (locations not loaded, geocoding failure...).
+
+    # Same virtual tool call the chat provider records, so the next turns see `nearby_stores`.
+    tool_call_id = "user_location_tool_call"
+    tool_calls = [{"id": tool_call_id, "type": "function",
+                   "function": {"name": "get_location_details_from_user", "arguments": "{}"}}]
+    support_board_service.add_message_to_sb_conversation(sb_conversation_id, {"payload": json.dumps({"tool_calls": tool_calls})})
+    support_board_service.add_message_to_sb_conversation(sb_conversation_id, {"payload": json.dumps({
+        "tool_call_id": tool_call_id, "role": "tool", "name": "get_location_details_from_user",
+        "content": json.dumps(details, ensure_ascii=False),
+    })})
+
+    lines = [f"{i}. {store['branch_name']} (a {store['distance_km']} km)" for i, store in enumerate(stores, 1)]
+    return ("¡Gracias por compartir tu ubicación! Aquí tienes las tiendas más cercanas:\n\n" + "\n".join(lines)
+            + "\n\n¿Quieres que verifique la disponibilidad de algún producto en alguna de ellas? 😊")
+
+
+def _price(value: Optional[float]) -> str:
+    return f"{value:,.2f}" if value is not None else "N/D"
+
+
+def _product_reply(sb_conversation_id: str, item_code: str) -> Optional[str]:
+    warehouses = conversation_location.get_city_warehouses(sb_conversation_id)
+    result = product_service.get_products_by_skus(codes=[item_code], warehouse_names=warehouses)
+    products = (result or {}).get("products") or []
+    if not products:
+        return None  # Unknown code or not stocked in the customer's city: the model has templates for that.
+    details = products[0]
+    lines = [f"¡Excelente! Aquí tienes los detalles del {details.get('item_name') or item_code}:", ""]
+    for variant in details.get("variants") or []:
+        lines.append(f"  - {variant.get('full_item_name')}")
+        lines.append(f"    Precio: ${_price(variant.get('price'))} (o Bs. {_price(variant.get('price_bolivar'))})")
+        if variant.get("color") and variant["color"] != "N/A":
+            lines.append(f"    Color: {variant['color']}")
+        lines.append(f"    Código: {variant.get('item_code')}")
+    lines += ["", "**¿Te gustaría iniciar el proceso de reserva?**"]
+    return "\n".join(lines)
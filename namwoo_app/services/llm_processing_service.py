@@ -2,40 +2,25 @@
 import logging
 from typing import Optional
 
-from openai import OpenAI, APIError, APITimeoutError
+from openai import APIError, APITimeoutError
 from ..config import Config
+from ..utils.llm_clients import get_openai_client
 from ..utils.text_utils import strip_html_to_text
 
 logger = logging.getLogger(__name__)
 
-# --- START OF MODIFICATION: Create a dedicated, self-contained client ---
-# This client is ONLY for the purpose of summarization within this service.
-try:
-    # It correctly reads the API key from your Config, which reads from .env
-    if not Config.OPENAI_API_KEY:
-        raise ValueError("OPENAI_API_KEY not found in configuration. Summarization service will fail.")
-    
-    # Initialize the client specifically for this service's needs.
-    llm_client = OpenAI(
-        api_key=Config.OPENAI_API_KEY,
-        timeout=getattr(Config, 'OPENAI_REQUEST_TIMEOUT', 30.0)
-    )
-    logger.info("OpenAI client for LLM Processing Service (Summarization) initialized.")
-except Exception as e:
-    logger.exception("Failed to initialize OpenAI client for LLM Processing Service.")
-    llm_client = None
-# --- END OF MODIFICATION ---
-
-
 def generate_llm_product_summary(
     html_description: Optional[str],
-    item_name: Optional[str] = None
+    item_name: Optional[str] = None,
+    plain_text_description: Optional[str] = None
 ) -> Optional[str]:
     """
     Generates a product summary using the OpenAI Chat Completions API directly.
-    It first strips HTML from the description before sending to the LLM.
+    It first strips HTML from the description before sending to the LLM, unless
+    the caller already has the stripped text (`plain_text_description`).
     """
     # --- START OF MODIFICATION: Simplified logic ---
+    llm_client = get_openai_client(timeout=getattr(Config, 'OPENAI_REQUEST_TIMEOUT', 30.0))
     if not llm_client:
         logger.error("OpenAI client not available for summarization. Check API key configuration.")
         return None
@@ -44,7 +29,8 @@ def generate_llm_product_summary(
         logger.debug("No HTML description provided for summarization.")
         return None
 
-    plain_text_description = strip_html_to_text(html_description)
+    if plain_text_description is None:
+        plain_text_description = strip_html_to_text(html_description)
     if not plain_text_description or len(plain_text_description) < 40: # Don't summarize very short text
         logger.debug(f"Description for '{item_name or 'Unknown'}' is too short after stripping HTML; skipping summarization.")
         return None
@@ -2,28 +2,13 @@
 import logging
 from typing import Optional, List
 
-from openai import OpenAI, APIError, APITimeoutError
+from openai import APIError, APITimeoutError
 from ..config import Config
+from ..utils import vector_storage
+from ..utils.llm_clients import get_openai_client
 
 logger = logging.getLogger(__name__)
 
-# Initialize the client at the module level.
-# It's thread-safe and can be reused.
-try:
-    # Ensure that OPENAI_API_KEY is loaded via your Config class
-    if not Config.OPENAI_API_KEY:
-        logger.error("OPENAI_API_KEY not found in configuration. Embedding service will fail.")
-        client = None
-    else:
-        client = OpenAI(
-            api_key=Config.OPENAI_API_KEY,
-            timeout=getattr(Config, 'OPENAI_EMBEDDING_TIMEOUT', 20.0) # Use a specific timeout
-        )
-        logger.info("OpenAI client for embedding service initialized.")
-except Exception as e:
-    logger.exception("Failed to initialize OpenAI client for embedding service.")
-    client = None
-
 def generate_product_embedding(text: str) -> Optional[List[float]]:
     """
     Generates a vector embedding for a given text using the configured OpenAI model.
@@ -34,6 +19,7 @@ def generate_product_embedding(text: str) -> Optional[List[float]]:
     Returns:
         Optional[List[float]]: A list of floats representing the embedding, or None on error.
     """
+    client = get_openai_client(timeout=getattr(Config, 'OPENAI_EMBEDDING_TIMEOUT', 20.0))
     if not client:
         logger.error("OpenAI client is not initialized; cannot generate embedding.")
         return None
@@ -51,7 +37,11 @@ def generate_product_embedding(text: str) -> Optional[List[float]]:
         
         logger.debug(f"Requesting embedding for text (first 100 chars): '{text[:100]}...' using model: {model}")
         
-        response = client.embeddings.create(input=[text], model=model)
+        response = client.embeddings.create(
+            input=[text],
+            model=model,
+            **vector_storage.embedding_request_kwargs(model, getattr(Config, 'EMBEDDING_DIMENSION', None))
+        )
         
         embedding_vector = response.data[0].embedding
         
@@ -0,0 +1,103 @@
+# namwoo_app/services/product_neighbor_service.py
+"""
+Nearest-neighbour table precomputed after ingestion.
+
+All product_embeddings are loaded once, unit-normalized, and multiplied in row
+batches (exact cosine, no ANN approximation); the top PRODUCT_NEIGHBORS_PER_ITEM
+neighbours of every item are stored in product_neighbors with their scores.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from ..config import Config
+from ..models.product_embedding import ProductEmbedding
+from ..models.product_neighbor import ProductNeighbor
+from ..utils import vector_storage
+
+logger = logging.getLogger(__name__)
+
+_BATCH_ROWS = 1024
+_INSERT_CHUNK = 5000
+
+
+def load_normalized_embeddings(
+    session: Session,
+    codes: Optional[List[str]] = None,
+    dimension: Optional[int] = None,
+) -> Tuple[List[str], np.ndarray]:
+    """
+    Unit-normalized float32 embeddings from product_embeddings. With `codes`, rows follow
+    that order and items without an embedding get a zero row; otherwise every item is loaded.
+    """
+    dimension = dimension or Config.EMBEDDING_DIMENSION
+    if codes is None:
+        rows = session.query(ProductEmbedding.item_code, ProductEmbedding.embedding).order_by(ProductEmbedding.item_code).all()
+        codes = [r[0] for r in rows]
+        fetched = [rows]
+    else:
+        fetched = (
+            session.query(ProductEmbedding.item_code, ProductEmbedding.embedding)
+            .filter(ProductEmbedding.item_code.in_(codes[start:start + 1000]))
+            for start in range(0, len(codes), 1000)
+        )
+    matrix = np.zeros((len(codes), dimension), dtype=np.float32)
+    position = {code: i for i, code in enumerate(codes)}
+    for chunk in fetched:
+        for item_code, embedding in chunk:
+            vec = np.asarray(vector_storage.as_float_list(embedding), dtype=np.float32)
+            if vec.shape[0] == dimension:
+                matrix[position[item_code]] = vec
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return codes, matrix / np.clip(norms, 1e-12, None)
+
+
+def top_neighbors(matrix: np.ndarray, n: int, batch_rows: int = _BATCH_ROWS):
+    """
+    Yields (row index, neighbour indices, scores) per row of a unit-normalized matrix,
+    best first, excluding the row itself. Memory is bounded by batch_rows x len(matrix).
+    """
+    total = matrix.shape[0]
+    n = min(n, total - 1)
+    if n <= 0:
+        return
+    for start in range(0, total, batch_rows):
+        scores = matrix[start:start + batch_rows] @ matrix.T
+        rows = np.arange(scores.shape[0])
+        scores[rows, start + rows] = -np.inf
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        for r in rows:
+            order = top[r][np.argsort(-scores[r, top[r]], kind="stable")]
+            yield start + r, order, scores[r, order]
+
+
+def refresh_product_neighbors(session: Session) -> int:
+    """Rebuilds product_neighbors from product_embeddings. The caller commits."""
+    codes, matrix = load_normalized_embeddings(session)
+    session.execute(text("DELETE FROM product_neighbors"))
+    has_vector = np.linalg.norm(matrix, axis=1) > 0
+
+    written = 0
+    pending: List[Dict[str, Any]] = []
+    for row, neighbors, scores in top_neighbors(matrix, Config.PRODUCT_NEIGHBORS_PER_ITEM):
+        if not has_vector[row]:
+            continue
+        rank = 0
+        for neighbor, score in zip(neighbors, scores):
+            if not has_vector[neighbor]:
+                continue
+            rank += 1
+            pending.append({"item_code": codes[row], "neighbor_item_code": codes[neighbor],
+                            "rank": rank, "score": float(score)})
+        if len(pending) >= _INSERT_CHUNK:
+            session.execute(insert(ProductNeighbor), pending)
+            written += len(pending)
+            pending = []
+    if pending:
+        session.execute(insert(ProductNeighbor), pending)
+        written += len(pending)
+    logger.info(f"Product neighbours: {written} pairs for {len(codes)} items.")
+    return written
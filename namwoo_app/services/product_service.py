@@ -1,132 +1,176 @@
 # NAMWOO/services/product_service.py
 
+import base64
+import hashlib
+import json
 import logging
-import re
+import operator
+from collections import namedtuple
 from typing import List, Dict, Any, Optional, Tuple
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation as InvalidDecimalOperation
 from datetime import datetime
 
 import numpy as np
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
-from sqlalchemy import case, func, or_
+from sqlalchemy.orm import Session, defer
+from sqlalchemy import case, func, literal, or_, text, update
 from sqlalchemy.dialects.postgresql import insert
 
 from ..models.product import Product
-from ..utils import db_utils, embedding_utils, text_utils
+from ..models.product_embedding import ProductEmbedding
+from ..models.product_neighbor import ProductNeighbor
+from ..utils import db_utils, embedding_utils, product_utils, query_parser, search_cache, spec_parser, text_utils, vector_storage
 from ..config import Config
+from . import accessory_rec_service, branch_directory_service, catalog_index_service
 
 logger = logging.getLogger(__name__)
 
-# --- Regex and Keywords for Intelligent Search ---
-SPEC_REGEX = re.compile(r'\b(\d+)\s*(gb|tb)\s*(?:de\s*)?(ram|almacenamiento|storage|memoria|interno)?\b', re.IGNORECASE)
-CATEGORY_KEYWORDS = {
-    'CELULAR': ['celular', 'celulares', 'teléfono', 'telefonos', 'smartphone'],
-    'TABLET': ['tablet', 'tablets'],
-    'LAPTOP': ['laptop', 'laptops', 'portátil', 'portatiles'],
-    'TELEVISOR': ['televisor', 'televisores', 'tv', 'pantalla'],
+# --- Spec Operators for Intelligent Search (query keywords live in utils/query_parser) ---
+_SPEC_OPERATORS = {
+    "=": operator.eq, ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
 }
-_SKU_PAT = re.compile(r'\b(SM-[A-Z0-9]+[A-Z]*|[A-Z0-9]{8,})\b')
-_KNOWN_COLORS = {
-    'negro', 'blanco', 'azul', 'rojo', 'verde', 'gris', 'plata', 'dorado',
-    'rosado', 'violeta', 'morado', 'amarillo', 'naranja', 'marrón', 'beige',
-    'celeste', 'turquesa', 'lila', 'crema', 'grafito', 'titanio', 'cobre',
-    'negra', 'blanca', 'claro', 'oscuro', 'marino'
-}
-
 # ===========================================================================
 # Helper Functions for Search Logic
 # ===========================================================================
 
 def _extract_base_name_and_color(item_name: str) -> Tuple[str, Optional[str]]:
-    if not item_name: return "", None
-    name_without_sku = _SKU_PAT.sub('', item_name).strip()
-    words = name_without_sku.split()
-    base_parts, color_parts = [], []
-    found_color = False
-    for w in reversed(words):
-        if not found_color and w.lower() in _KNOWN_COLORS:
-            color_parts.insert(0, w)
-        else:
-            found_color = True
-            base_parts.insert(0, w)
-    base = " ".join(base_parts).strip()
-    color = " ".join(color_parts).strip()
-    return (base or name_without_sku, color.capitalize() if color else None)
-
-def _detect_sub_category(query: str) -> Optional[str]:
-    """Detects a target sub_category from keywords in the user's query."""
-    query_lower = query.lower()
-    for sub_category, keywords in CATEGORY_KEYWORDS.items():
-        if any(keyword in query_lower for keyword in keywords):
-            return sub_category
-    return None
-
-def _group_product_results(product_rows: List[Product]) -> Dict[str, Any]:
-    """Helper to group multiple product rows into a structured dictionary for the LLM."""
+    return product_utils.split_base_name_and_color(item_name)
+
+def _row_base_name_and_color(row) -> Tuple[str, Optional[str]]:
+    """Precomputed (base_name, color) of a row; parses item_name for rows ingested before the columns existed."""
+    if row.base_name is not None:
+        return row.base_name, row.color
+    return _extract_base_name_and_color(row.item_name)
+
+# Columns read by the search formatters. Searches select only these (never description HTML
+# beyond what grouping needs, source_data_json or the embedding) into lightweight SearchRow tuples.
+_GROUPING_COLUMNS = (
+    Product.item_code, Product.item_name, Product.base_name, Product.color,
+    Product.description_text,
+    # Raw HTML only for rows ingested before description_text existed.
+    case((Product.description_text.is_(None), Product.description), else_=None).label("description"),
+    Product.llm_summarized_description, Product.specifitacion,
+    Product.brand, Product.category, Product.sub_category,
+    Product.price, Product.price_bolivar, Product.warehouse_name, Product.branch_name, Product.stock,
+)
+SearchRow = namedtuple("SearchRow", [column.key for column in _GROUPING_COLUMNS])
+
+def _row_description_text(row) -> str:
+    if row.description_text is not None:
+        return row.description_text
+    return text_utils.strip_html_to_text(row.description or "")
+
+def _fetch_search_rows(query) -> List[SearchRow]:
+    """Materializes a column-projected query as session-independent SearchRow tuples."""
+    return [SearchRow._make(row) for row in query.all()]
+
+def _group_product_results(product_rows: List[SearchRow]) -> Dict[str, Any]:
+    """
+    Helper to group multiple product rows into a structured dictionary for the LLM.
+    Single pass: variants and branch stock are keyed in dicts (insertion-ordered)
+    instead of being deduplicated with list membership checks.
+    """
     grouped: Dict[str, Dict[str, Any]] = {}
+    variants_by_group: Dict[str, Dict[Tuple, Dict[str, Any]]] = {}
+    locations_by_group: Dict[str, Dict[str, Dict[str, Any]]] = {}
     for prod_row in product_rows:
-        base, color = _extract_base_name_and_color(prod_row.item_name)
+        base, color = _row_base_name_and_color(prod_row)
         if not base: base = prod_row.item_name
 
         if base not in grouped:
-            desc = prod_row.llm_summarized_description or text_utils.strip_html_to_text(prod_row.description or "")
+            desc = prod_row.llm_summarized_description or _row_description_text(prod_row)
             specs = (prod_row.specifitacion or "").strip()
             grouped[base] = {
                 "base_name": base, "brand": prod_row.brand, "category": prod_row.category,
                 "sub_category": prod_row.sub_category, "marketing_description": desc.strip(),
                 "technical_specs": specs, "variants": [], "locations": []
             }
-        
-        variant = {
-            "color": color or "N/A", "price": float(prod_row.price) if prod_row.price else None,
-            "price_bolivar": float(prod_row.price_bolivar) if prod_row.price_bolivar else None,
-            "full_item_name": prod_row.item_name, "item_code": prod_row.item_code
-        }
-        if variant not in grouped[base]["variants"]:
-            grouped[base]["variants"].append(variant)
-        
-        grouped[base]["locations"].append({
-            "warehouse_name": prod_row.warehouse_name, "branch_name": prod_row.branch_name,
-            "branch_address": prod_row.store_address, "stock": prod_row.stock
-        })
-
-    for product_group in grouped.values():
-        merged_locations = {}
-        for loc in product_group["locations"]:
-            branch_name = loc["branch_name"]
-            if branch_name and branch_name not in merged_locations:
-                merged_locations[branch_name] = {"branch_name": branch_name, "total_stock": 0}
-            if branch_name:
-                merged_locations[branch_name]["total_stock"] += loc["stock"]
-        product_group["locations"] = list(merged_locations.values())
+            variants_by_group[base] = {}
+            locations_by_group[base] = {}
+
+        price = float(prod_row.price) if prod_row.price else None
+        price_bolivar = float(prod_row.price_bolivar) if prod_row.price_bolivar else None
+        variant_key = (color, price, price_bolivar, prod_row.item_name, prod_row.item_code)
+        variants = variants_by_group[base]
+        if variant_key not in variants:
+            variants[variant_key] = {
+                "color": color or "N/A", "price": price, "price_bolivar": price_bolivar,
+                "full_item_name": prod_row.item_name, "item_code": prod_row.item_code
+            }
+
+        branch_name = prod_row.branch_name
+        if branch_name:
+            locations = locations_by_group[base]
+            if branch_name in locations:
+                locations[branch_name]["total_stock"] += prod_row.stock
+            else:
+                locations[branch_name] = {"branch_name": branch_name, "total_stock": prod_row.stock}
+
+    for base, product_group in grouped.items():
+        product_group["variants"] = list(variants_by_group[base].values())
+        product_group["locations"] = list(locations_by_group[base].values())
 
     return {"status": "success", "products_grouped": list(grouped.values())}
 
-def _format_sku_result(product_rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+def _nearest_items_subquery(session: Session, query_embedding: List[float], limit: int):
+    """
+    ANN search over the deduplicated `product_embeddings` table.
+    The ORDER BY + LIMIT is kept alone in the subquery so the HNSW index is used;
+    score thresholds and stock/warehouse filters are applied by the caller on the join.
+    In 'binary' storage mode, `limit * EMBEDDING_RERANK_FACTOR` candidates are taken from the
+    Hamming-distance index and re-ranked by exact cosine distance on the halfvec column.
+    """
+    query_embedding = vector_storage.as_float_list(query_embedding)
+    distance = ProductEmbedding.embedding.cosine_distance(query_embedding).label("distance")
+    if vector_storage.normalize_mode(Config.EMBEDDING_STORAGE) != "binary":
+        vector_storage.set_ef_search(session, limit)
+        return (
+            session.query(ProductEmbedding.item_code.label("item_code"), distance)
+            .order_by(distance)
+            .limit(limit)
+            .subquery("nearest_items")
+        )
+
+    candidate_limit = limit * max(Config.EMBEDDING_RERANK_FACTOR, 1)
+    vector_storage.set_ef_search(session, candidate_limit)
+    hamming = vector_storage.hamming_distance(ProductEmbedding.embedding, query_embedding, Config.EMBEDDING_DIMENSION)
+    candidates = (
+        session.query(ProductEmbedding.item_code.label("item_code"), distance)
+        .order_by(hamming)
+        .limit(candidate_limit)
+        .subquery("binary_candidates")
+    )
+    return (
+        session.query(candidates.c.item_code.label("item_code"), candidates.c.distance.label("distance"))
+        .order_by(candidates.c.distance)
+        .limit(limit)
+        .subquery("nearest_items")
+    )
+
+def _format_sku_result(product_rows: List[SearchRow]) -> Dict[str, Any]:
     """Formats results for a single SKU into the 'product_details' structure."""
     first = product_rows[0]
-    base_name, _ = _extract_base_name_and_color(first.get("item_name", ""))
-    
+    base_name, _ = _row_base_name_and_color(first)
+
     variants = list({
-        p['item_code']: {
-            "color": _extract_base_name_and_color(p['item_name'])[1] or "N/A", 
-            "price": p.get("price"),
-            "price_bolivar": p.get("price_bolivar"), 
-            "full_item_name": p.get("item_name"), 
-            "item_code": p.get("item_code")
+        p.item_code: {
+            "color": _row_base_name_and_color(p)[1] or "N/A",
+            "price": float(p.price) if p.price is not None else None,
+            "price_bolivar": float(p.price_bolivar) if p.price_bolivar is not None else None,
+            "full_item_name": p.item_name,
+            "item_code": p.item_code
         } for p in product_rows
     }.values())
 
-    locations = list({p['branch_name']: {"branch_name": p['branch_name']} for p in product_rows if p.get('branch_name')}.values())
+    locations = list({p.branch_name: {"branch_name": p.branch_name} for p in product_rows if p.branch_name}.values())
 
     return {
         "status": "success",
         "product_details": {
             "item_name": base_name,
-            "brand": first.get("brand"),
-            "category": first.get("category"),
-            "specifitacion": first.get("specifitacion"),
+            "brand": first.brand,
+            "category": first.category,
+            "specifitacion": first.specifitacion,
             "variants": variants,
             "locations": locations
         }
@@ -137,41 +181,110 @@ def _format_sku_result(product_rows: List[Dict[str, Any]]) -> Dict[str, Any]:
 # ===========================================================================
 
 def get_available_brands_by_category(category: str = 'CELULAR') -> Optional[List[str]]:
-    """Fetches a distinct list of in-stock brands for a given product sub-category."""
+    """Returns in-stock brands for a product sub-category from the precomputed brand summary."""
     if not category: return []
-    logger.info(f"Fetching distinct, in-stock brands for sub_category: {category}")
-    with db_utils.get_db_session() as session:
-        if not session:
-            logger.error("DB session unavailable for get_available_brands_by_category.")
-            return None
-        try:
-            qry = (session.query(Product.brand)
-                   .filter(Product.sub_category == category.upper(),
-                           Product.item_group_name == "DAMASCO TECNO",
-                           Product.stock > 0)
-                   .distinct().order_by(Product.brand))
-            brands = [b[0] for b in qry.all() if b[0] is not None]
-            logger.info(f"Found {len(brands)} brands for {category}")
-            return brands
-        except Exception as e:
-            logger.exception(f"Error fetching distinct brands: {e}")
-            return None
-
-def find_products(query: str, warehouse_names: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    brands = catalog_index_service.get_brands(category)
+    if brands is None:
+        logger.error("Brand summary unavailable for get_available_brands_by_category.")
+        return None
+    logger.info(f"Found {len(brands)} brands for {category}")
+    return brands
+
+def find_products(
+    query: str,
+    warehouse_names: Optional[List[str]],
+    page_token: Optional[str] = None,
+    k: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
     """
     Performs an intelligent, multi-stage search pipeline for products.
     1. SKU Match -> 2. Specific Spec Filter -> 3. Brand Match -> 4. Vector Search
+    Stages 2-4 return the top `k` items (default PRODUCT_SEARCH_LIMIT) in relevance order;
+    when more exist the result carries `next_page_token`, which resumes the same stage.
+    The query is parsed once (query_parser, memoized) and every stage reads that ParsedQuery.
+    Results are cached per (accent-folded query, warehouse set, page) until the catalog version changes.
     """
-    if not query:
+    parsed = query_parser.parse_query(query)
+    if not parsed.key:
         logger.warning("find_products called with an empty query.")
         return {"status": "error", "message": "Query cannot be empty."}
 
+    k = max(1, int(k or Config.PRODUCT_SEARCH_LIMIT))
+    page = _decode_page_token(page_token, parsed.key) if page_token else None
+    if page_token and page is None:
+        return {"status": "error", "message": "page_token inválido para esta búsqueda; repite la búsqueda sin page_token."}
+
+    return search_cache.cached_search(
+        parsed.key, warehouse_names,
+        lambda: _find_products_uncached(parsed, warehouse_names, page, k),
+        page=f"{page_token or ''}:{k}",
+    )
+
+_PAGED_METHODS = ("spec_filter", "brand_match", "vector_search")
+
+def _query_fingerprint(query_key: str) -> str:
+    return hashlib.sha1(query_key.encode("utf-8")).hexdigest()[:10]
+
+def _encode_page_token(query_key: str, method: str, offset: int) -> str:
+    """Opaque cursor: the stage to resume, the item offset and a fingerprint of the query it belongs to."""
+    payload = {"q": _query_fingerprint(query_key), "m": method, "o": offset}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+def _decode_page_token(token: str, query_key: str) -> Optional[Tuple[str, int]]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        method, offset = payload["m"], int(payload["o"])
+    except (ValueError, KeyError, TypeError):
+        logger.warning(f"find_products: undecodable page_token '{token}'")
+        return None
+    if payload.get("q") != _query_fingerprint(query_key) or method not in _PAGED_METHODS or offset < 0:
+        logger.warning(f"find_products: page_token does not belong to query '{query_key}'")
+        return None
+    return method, offset
+
+def _fetch_ranked_page(session: Session, ranked_codes, row_filters: List[Any], offset: int, k: int) -> Tuple[List[SearchRow], bool]:
+    """
+    Takes one page of item_codes from a relevance-ordered query, then loads only the
+    warehouse rows of those items, ordered by rank. Returns (rows, has_more).
+    """
+    codes = [r[0] for r in ranked_codes.offset(offset).limit(k + 1).all()]
+    has_more = len(codes) > k
+    codes = codes[:k]
+    if not codes:
+        return [], False
+    rank = {code: i for i, code in enumerate(codes)}
+    rows = _fetch_search_rows(session.query(*_GROUPING_COLUMNS).filter(Product.item_code.in_(codes), *row_filters))
+    rows.sort(key=lambda r: rank[r.item_code])
+    return rows, has_more
+
+def _paged_result(rows: List[SearchRow], has_more: bool, query_key: str, method: str, offset: int, k: int) -> Dict[str, Any]:
+    results = _group_product_results(rows)
+    results['search_method'] = method
+    results['has_more'] = has_more
+    if has_more:
+        results['next_page_token'] = _encode_page_token(query_key, method, offset + k)
+    return results
+
+def _find_products_uncached(
+    parsed: query_parser.ParsedQuery,
+    warehouse_names: Optional[List[str]],
+    page: Optional[Tuple[str, int]] = None,
+    k: int = 10,
+) -> Optional[Dict[str, Any]]:
+    resume_method, offset = page or (None, 0)
+    query = parsed.raw
     with db_utils.get_db_session() as session:
+        row_filters = [Product.stock > 0, Product.item_group_name == "DAMASCO TECNO"]
+        if warehouse_names: row_filters.append(Product.warehouse_name.in_(warehouse_names))
+
         # Step 1: SKU Match
         logger.debug(f"find_products [1/4]: SKU match for '{query}'")
-        sku_results = get_live_product_details_by_sku(query)
+        code = parsed.sku_candidate
+        sku_results = _fetch_search_rows(
+            session.query(*_GROUPING_COLUMNS).filter(func.lower(Product.item_code) == func.lower(code))
+        ) if code and not resume_method else []
         if sku_results:
-            available_in_location = [p for p in sku_results if not warehouse_names or p.get("warehouse_name") in warehouse_names]
+            available_in_location = [p for p in sku_results if not warehouse_names or p.warehouse_name in warehouse_names]
             if available_in_location:
                 logger.info("find_products: Success [SKU Match]")
                 formatted_result = _format_sku_result(available_in_location)
@@ -180,62 +293,57 @@ def find_products(query: str, warehouse_names: Optional[List[str]]) -> Optional[
             elif warehouse_names: # Found by SKU but not in the requested city
                  return {"status": "not_found_in_city", "message": "Producto encontrado pero sin stock para retiro en la ciudad especificada."}
 
-        # Step 2: Specific Spec Filter
+        # Step 2: Structured Spec Filter (typed, indexed attribute columns)
         logger.debug(f"find_products [2/4]: Spec filter for '{query}'")
-        spec_match = SPEC_REGEX.search(query)
-        detected_category = _detect_sub_category(query)
-        if spec_match and detected_category:
-            value, unit = spec_match.group(1), spec_match.group(2)
-            search_term = f"%{value}{unit}%"
-            logger.info(f"Spec match found ('{search_term}'). Filtering by sub_category '{detected_category}'.")
-            q = session.query(Product).filter(
-                Product.stock > 0,
-                Product.item_group_name == "DAMASCO TECNO",
-                Product.sub_category == detected_category,
-                or_(Product.specifitacion.ilike(search_term), Product.item_name.ilike(search_term))
-            )
-            if warehouse_names: q = q.filter(Product.warehouse_name.in_(warehouse_names))
-            spec_rows = q.limit(300).all()
+        spec_conditions = parsed.spec_filters if resume_method in (None, "spec_filter") else ()
+        if spec_conditions:
+            logger.info(f"Spec filters parsed: {spec_conditions}.")
+            spec_filters = row_filters + [_SPEC_OPERATORS[op](getattr(Product, attr), value) for attr, op, value in spec_conditions]
+            detected_category = parsed.category
+            if detected_category: spec_filters.append(Product.sub_category == detected_category)
+            spec_brand = catalog_index_service.match_brand(query, detected_category or 'CELULAR')
+            if spec_brand: spec_filters.append(Product.brand.ilike(f"%{spec_brand}%"))
+            ranked = (session.query(Product.item_code).filter(*spec_filters)
+                      .group_by(Product.item_code).order_by(func.sum(Product.stock).desc(), Product.item_code))
+            spec_rows, has_more = _fetch_ranked_page(session, ranked, spec_filters, offset, k)
             if spec_rows:
-                logger.info(f"find_products: Success [Spec Match] found {len(spec_rows)} results.")
-                results = _group_product_results(spec_rows)
-                results['search_method'] = 'spec_filter'
-                return results
+                logger.info(f"find_products: Success [Spec Match] found {len(spec_rows)} rows (offset {offset}, more={has_more}).")
+                return _paged_result(spec_rows, has_more, parsed.key, 'spec_filter', offset, k)
 
         # Step 3: Brand Match
         logger.debug(f"find_products [3/4]: Brand match for '{query}'")
-        all_brands = get_available_brands_by_category() or []
-        matched_brand = next((b for b in all_brands if b.lower() in query.lower()), None)
+        matched_brand = catalog_index_service.match_brand(query) if resume_method in (None, "brand_match") else None
         if matched_brand:
             logger.info(f"Brand match found ('{matched_brand}').")
-            q = session.query(Product).filter(
-                Product.stock > 0,
-                Product.item_group_name == "DAMASCO TECNO",
-                Product.brand.ilike(f"%{matched_brand}%")
-            )
-            if warehouse_names: q = q.filter(Product.warehouse_name.in_(warehouse_names))
-            brand_rows = q.limit(300).all()
+            brand_filters = row_filters + [Product.brand.ilike(f"%{matched_brand}%")]
+            ranked = (session.query(Product.item_code).filter(*brand_filters)
+                      .group_by(Product.item_code).order_by(func.sum(Product.stock).desc(), Product.item_code))
+            brand_rows, has_more = _fetch_ranked_page(session, ranked, brand_filters, offset, k)
             if brand_rows:
-                logger.info(f"find_products: Success [Brand Match] found {len(brand_rows)} results.")
-                results = _group_product_results(brand_rows)
-                results['search_method'] = 'brand_match'
-                return results
+                logger.info(f"find_products: Success [Brand Match] found {len(brand_rows)} rows (offset {offset}, more={has_more}).")
+                return _paged_result(brand_rows, has_more, parsed.key, 'brand_match', offset, k)
 
         # Step 4: Vector Search (Fallback)
         logger.debug(f"find_products [4/4]: Vector search for '{query}'")
-        model = getattr(Config, 'OPENAI_EMBEDDING_MODEL', "text-embedding-3-small")
-        q_emb = embedding_utils.get_embedding(query, model=model)
+        q_emb = None
+        if resume_method in (None, "vector_search"):
+            model = getattr(Config, 'OPENAI_EMBEDDING_MODEL', "text-embedding-3-small")
+            q_emb = embedding_utils.get_embedding(query, model=model)
         if q_emb:
-            q = session.query(Product).filter(Product.stock > 0, Product.item_group_name == "DAMASCO TECNO")
-            if warehouse_names: q = q.filter(Product.warehouse_name.in_(warehouse_names))
-            q = q.filter((1 - Product.embedding.cosine_distance(q_emb)) >= 0.10)
-            q = q.order_by(Product.embedding.cosine_distance(q_emb)).limit(300)
-            vector_rows = q.all()
+            # Deeper pages widen the ANN candidate set so filtering still leaves a full page.
+            nearest = _nearest_items_subquery(session, q_emb, Config.VECTOR_SEARCH_CANDIDATES + offset)
+            ranked = (session.query(Product.item_code)
+                      .join(nearest, Product.item_code == nearest.c.item_code)
+                      .filter(*row_filters, (1 - nearest.c.distance) >= 0.10)
+                      .group_by(Product.item_code)
+                      .order_by(func.min(nearest.c.distance), Product.item_code))
+            vector_rows, has_more = _fetch_ranked_page(session, ranked, row_filters, offset, k)
             if vector_rows:
-                logger.info(f"find_products: Success [Vector Search] found {len(vector_rows)} results.")
-                results = _group_product_results(vector_rows)
-                results['search_method'] = 'vector_search'
-                return results
+                logger.info(f"find_products: Success [Vector Search] found {len(vector_rows)} rows (offset {offset}, more={has_more}).")
+                return _paged_result(vector_rows, has_more, parsed.key, 'vector_search', offset, k)
+
+        if resume_method:
+            return {"status": "not_found", "message": "No hay más resultados para esta búsqueda."}
 
         # All methods failed
         logger.warning(f"find_products: Failure - All search methods failed for '{query}'")
@@ -246,82 +354,142 @@ def get_live_product_details_by_sku(item_code_query: str) -> Optional[List[Dict[
     with db_utils.get_db_session() as session:
         if not session: return None
         try:
-            rows = session.query(Product).filter(func.lower(Product.item_code) == func.lower(code)).all()
+            rows = (session.query(Product)
+                    .options(defer(Product.embedding), defer(Product.source_data_json))
+                    .filter(func.lower(Product.item_code) == func.lower(code)).all())
             return [r.to_dict() for r in rows] if rows else []
         except Exception:
             logger.exception("DB error fetching by sku")
             return None
 
-def get_branch_address(branch_name: str, city: Optional[str] = None) -> Optional[Dict[str, str]]:
+MAX_BATCH_SKUS = 50
+
+def get_products_by_skus(codes: List[str], warehouse_names: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
     """
-    Fetches the address of a specific branch. The city parameter is optional and used for logging context.
+    Resolves several SKUs (e.g. a cart) in one query on the lower(item_code) index.
+    Each found SKU gets the same 'product_details' structure as a single SKU match, in request order.
+    SKUs that do not exist go to 'not_found'; with `warehouse_names`, SKUs without rows there go to 'not_found_in_city'.
     """
-    if not branch_name:
-        return {"status": "error", "message": "Branch name cannot be empty."}
-    
+    requested: Dict[str, str] = {}
+    for code in codes or []:
+        code = str(code or '').strip()
+        if code and code.lower() not in requested:
+            requested[code.lower()] = code
+    if not requested:
+        return {"status": "error", "message": "Debe indicar al menos un código de producto."}
+    if len(requested) > MAX_BATCH_SKUS:
+        logger.warning(f"get_products_by_skus: {len(requested)} codes requested; only the first {MAX_BATCH_SKUS} are resolved.")
+        requested = dict(list(requested.items())[:MAX_BATCH_SKUS])
+
     with db_utils.get_db_session() as session:
-        if not session:
-            return {"status": "error", "message": "Database session not available."}
+        if not session: return None
         try:
-            # Query for a product that is located at the specified branch and has an address.
-            # We use ILIKE for case-insensitive matching and only need one result.
-            result = (
-                session.query(Product.branch_name, Product.store_address)
-                .filter(
-                    Product.branch_name.ilike(f"%{branch_name.strip()}%"),
-                    Product.store_address.isnot(None),
-                    Product.store_address != ""
-                )
-                .first()
+            rows = _fetch_search_rows(
+                session.query(*_GROUPING_COLUMNS)
+                .filter(func.lower(Product.item_code).in_(list(requested)))
+                .order_by(Product.item_code, Product.warehouse_name)
             )
-            
-            if result:
-                # result is a tuple: (branch_name_from_db, store_address_from_db)
-                db_branch_name, db_store_address = result
-                logger.info(f"Address found for branch '{branch_name}': {db_store_address}")
-                return {
-                    "status": "success",
-                    "branch_name": db_branch_name,
-                    "branch_address": db_store_address
-                }
-            
-            logger.warning(f"Address not found for branch '{branch_name}' (city hint: '{city}').")
-            return {"status": "not_found", "message": f"No se encontró la dirección para la sucursal '{branch_name}'."}
+        except Exception:
+            logger.exception("DB error fetching products by skus")
+            return None
 
-        except Exception as e:
-            logger.exception(f"DB error fetching branch address for '{branch_name}': {e}")
-            return {"status": "error", "message": f"Error interno buscando la dirección para '{branch_name}'."}
+    rows_by_code: Dict[str, List[SearchRow]] = {}
+    for row in rows:
+        rows_by_code.setdefault(row.item_code.lower(), []).append(row)
+
+    products, not_found, not_found_in_city = [], [], []
+    for key, code in requested.items():
+        code_rows = rows_by_code.get(key)
+        if not code_rows:
+            not_found.append(code)
+            continue
+        if warehouse_names:
+            code_rows = [r for r in code_rows if r.warehouse_name in warehouse_names]
+            if not code_rows:
+                not_found_in_city.append(code)
+                continue
+        details = _format_sku_result(code_rows)["product_details"]
+        products.append({"item_code": code_rows[0].item_code, **details})
+
+    logger.info(f"get_products_by_skus: {len(products)} found, {len(not_found)} unknown, {len(not_found_in_city)} not in city.")
+    result: Dict[str, Any] = {"status": "success" if products else "not_found", "products": products}
+    if not_found: result["not_found"] = not_found
+    if not_found_in_city: result["not_found_in_city"] = not_found_in_city
+    return result
 
-def query_accessories(main_product_item_code: str, city_warehouses: Optional[List[str]], limit: int = 3) -> Optional[List[str]]:
+def get_branch_address(branch_name: str, city: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """
+    Fetches the address of a specific branch from the in-memory branch directory
+    (accent-insensitive, fuzzy name matching). The optional city narrows ambiguous names.
+    """
+    if not branch_name:
+        return {"status": "error", "message": "Branch name cannot be empty."}
+
+    try:
+        branch = branch_directory_service.find_branch(branch_name.strip(), city)
+    except Exception as e:
+        logger.exception(f"Error looking up branch address for '{branch_name}': {e}")
+        return {"status": "error", "message": f"Error interno buscando la dirección para '{branch_name}'."}
+
+    if branch and branch.get("address"):
+        logger.info(f"Address found for branch '{branch_name}' -> '{branch['branch_name']}': {branch['address']}")
+        return {
+            "status": "success",
+            "branch_name": branch["branch_name"],
+            "branch_address": branch["address"]
+        }
+
+    logger.warning(f"Address not found for branch '{branch_name}' (city hint: '{city}').")
+    return {"status": "not_found", "message": f"No se encontró la dirección para la sucursal '{branch_name}'."}
+
+def query_accessories(
+    main_product_item_code: str,
+    city_warehouses: Optional[List[str]],
+    limit: int = 3,
+    city: Optional[str] = None,
+) -> Optional[List[str]]:
     """
     Finds relevant accessories for a given main product.
 
-    The logic is to find accessories that are:
+    Reads the list precomputed after ingestion for (item, city) — ranked by embedding
+    similarity, brand and stock, see accessory_rec_service. Items not in that table yet
+    (new since the last rebuild) fall back to the live query: accessories
     1. From the same brand as the main product (highest priority).
     2. In the same general category (e.g., 'CELULAR').
     3. Filtered by the user's city if provided.
     """
     if not main_product_item_code:
         return []
-        
+
+    try:
+        precomputed = accessory_rec_service.get_recommendations(
+            main_product_item_code.strip(), city if city_warehouses else None, limit
+        )
+    except Exception as e:
+        logger.exception(f"Error reading precomputed accessories for {main_product_item_code}: {e}")
+        precomputed = None
+    if precomputed is not None:
+        logger.info(f"query_accessories: {len(precomputed)} precomputed accessories for {main_product_item_code} (city '{city or ''}').")
+        return [f"{acc['name']} (${acc['price']:.2f})" if acc.get("price") is not None else acc["name"] for acc in precomputed]
+
     with db_utils.get_db_session() as session:
         if not session:
             return None
         
         try:
-            main_product = session.query(Product).filter(Product.item_code == main_product_item_code).first()
-            if not main_product or not main_product.brand:
-                logger.warning(f"Could not find main product or its brand for item_code {main_product_item_code}")
-                return []
-            
-            logger.info(f"Querying accessories for '{main_product.item_name}' (Brand: {main_product.brand})")
+            # The main product's brand is resolved inside the same statement instead of a separate lookup.
+            main_brand = (session.query(Product.brand)
+                          .filter(func.lower(Product.item_code) == func.lower(main_product_item_code.strip()),
+                                  Product.brand.isnot(None), Product.brand != "")
+                          .limit(1).scalar_subquery())
+            logger.info(f"Querying accessories for main product {main_product_item_code}")
 
             # Base query for accessories
-            query = session.query(Product).filter(
+            query = session.query(Product.item_name, Product.base_name, Product.color, Product.price).filter(
                 Product.sub_category == "ACCESORIO",
                 Product.stock > 0,
                 Product.item_group_name == "DAMASCO TECNO",
-                Product.brand.ilike(f"%{main_product.brand}%") # Stricter filter for the same brand
+                Product.brand.ilike(literal('%') + main_brand + '%') # Same brand; NULL (unknown item) matches nothing
             )
 
             # If a city context exists, apply it.
@@ -332,11 +500,11 @@ def query_accessories(main_product_item_code: str, city_warehouses: Optional[Lis
             accessories = query.order_by(Product.stock.desc()).limit(limit).all()
             
             if not accessories:
-                logger.info(f"No matching brand accessories found for {main_product.brand}. No fallback implemented.")
+                logger.info(f"No same-brand accessories found for {main_product_item_code} (unknown item or no brand). No fallback implemented.")
                 return []
 
             # Format the results
-            return [f"{_extract_base_name_and_color(acc.item_name)[0]} (${acc.price:.2f})" for acc in accessories]
+            return [f"{_row_base_name_and_color(acc)[0]} (${acc.price:.2f})" for acc in accessories]
 
         except Exception as e:
             logger.exception(f"Error in query_accessories for {main_product_item_code}: {e}")
@@ -355,7 +523,8 @@ def upsert_products_batch(db_session: Session, products_data: List[Dict[str, Any
         index_elements=['id'],
         set_={
             'item_code': stmt.excluded.item_code, 'item_name': stmt.excluded.item_name,
-            'description': stmt.excluded.description, 'llm_summarized_description': stmt.excluded.llm_summarized_description,
+            'description': stmt.excluded.description, 'description_text': stmt.excluded.description_text,
+            'llm_summarized_description': stmt.excluded.llm_summarized_description,
             'specifitacion': stmt.excluded.specifitacion, 'category': stmt.excluded.category,
             'sub_category': stmt.excluded.sub_category, 'brand': stmt.excluded.brand,
             'line': stmt.excluded.line, 'item_group_name': stmt.excluded.item_group_name,
@@ -363,12 +532,101 @@ def upsert_products_batch(db_session: Session, products_data: List[Dict[str, Any
             'branch_name': stmt.excluded.branch_name, 'store_address': stmt.excluded.store_address,
             'price': stmt.excluded.price, 'price_bolivar': stmt.excluded.price_bolivar,
             'stock': stmt.excluded.stock, 'searchable_text_content': stmt.excluded.searchable_text_content,
-            'embedding': stmt.excluded.embedding, 'source_data_json': stmt.excluded.source_data_json,
+            'base_name': stmt.excluded.base_name, 'color': stmt.excluded.color,
+            'ram_gb': stmt.excluded.ram_gb, 'storage_gb': stmt.excluded.storage_gb,
+            'screen_in': stmt.excluded.screen_in, 'camera_mp': stmt.excluded.camera_mp,
+            'battery_mah': stmt.excluded.battery_mah,
+            'source_data_json': stmt.excluded.source_data_json,
         }
     )
     db_session.execute(on_conflict_stmt)
     logger.info(f"Executed batch upsert for {len(products_data)} products.")
 
+def upsert_product_embeddings_batch(db_session: Session, embeddings_data: List[Dict[str, Any]]):
+    """Upserts one row per item_code into `product_embeddings` (keys: item_code, content_hash, searchable_text_content, embedding)."""
+    if not embeddings_data:
+        logger.info("upsert_product_embeddings_batch called with an empty list.")
+        return
+    stmt = insert(ProductEmbedding).values(embeddings_data)
+    on_conflict_stmt = stmt.on_conflict_do_update(
+        index_elements=['item_code'],
+        set_={
+            'content_hash': stmt.excluded.content_hash,
+            'searchable_text_content': stmt.excluded.searchable_text_content,
+            'embedding': stmt.excluded.embedding,
+            'updated_at': func.now(),
+        }
+    )
+    db_session.execute(on_conflict_stmt)
+    logger.info(f"Executed batch upsert for {len(embeddings_data)} product embeddings.")
+
+def backfill_product_embeddings_from_legacy_rows() -> Optional[int]:
+    """
+    Seeds `product_embeddings` from the legacy per-warehouse `products.embedding` column,
+    one row per item_code. Seeded rows get content_hash 'legacy' so the next sync
+    re-embeds them with the location-independent text.
+    """
+    with db_utils.get_db_session() as session:
+        if not session: return None
+        result = session.execute(text("""
+            INSERT INTO product_embeddings (item_code, content_hash, searchable_text_content, embedding)
+            SELECT DISTINCT ON (item_code) item_code, 'legacy', COALESCE(searchable_text_content, item_name), embedding
+            FROM products
+            WHERE embedding IS NOT NULL
+            ORDER BY item_code, updated_at DESC
+            ON CONFLICT (item_code) DO NOTHING
+        """))
+        session.commit()
+        logger.info(f"Backfilled {result.rowcount} product embeddings from legacy product rows.")
+        return result.rowcount
+
+def backfill_product_derived_fields(chunk_size: int = 1000) -> Optional[int]:
+    """
+    Fills base_name/color and description_text for rows ingested before those columns
+    existed. Returns the number of rows updated.
+    """
+    updated = 0
+    with db_utils.get_db_session() as session:
+        if not session: return None
+        while True:
+            rows = (session.query(Product.id, Product.item_name, Product.description)
+                    .filter(or_(Product.base_name.is_(None), Product.description_text.is_(None)))
+                    .limit(chunk_size).all())
+            if not rows: break
+            params = []
+            for row in rows:
+                base_name, color = product_utils.split_base_name_and_color(row.item_name)
+                params.append({
+                    "id": row.id, "base_name": base_name or (row.item_name or ""), "color": color,
+                    "description_text": text_utils.strip_html_to_text(row.description),
+                })
+            session.execute(update(Product), params)
+            session.commit()
+            updated += len(params)
+    logger.info(f"Backfilled derived fields for {updated} product rows.")
+    return updated
+
+def backfill_product_spec_attributes(chunk_size: int = 1000) -> Optional[int]:
+    """
+    (Re)parses the typed spec columns (ram_gb, storage_gb, ...) of every row, e.g. after
+    the columns were added or spec_parser improved. Walks the table by id. Returns rows updated.
+    """
+    updated, last_id = 0, ""
+    with db_utils.get_db_session() as session:
+        if not session: return None
+        while True:
+            rows = (session.query(Product.id, Product.item_name, Product.specifitacion)
+                    .filter(Product.id > last_id).order_by(Product.id)
+                    .limit(chunk_size).all())
+            if not rows: break
+            params = [{"id": row.id, **spec_parser.parse_specs(row.specifitacion, row.item_name)} for row in rows]
+            session.execute(update(Product), params)
+            session.commit()
+            updated += len(params)
+            last_id = rows[-1].id
+    logger.info(f"Backfilled spec attributes for {updated} product rows.")
+    return updated
+
 def add_or_update_product_in_db(*args, **kwargs):
     # This function is part of a legacy data ingestion flow and is not called by the live agent.
     # It remains here for compatibility with other system components.
@@ -379,20 +637,44 @@ def get_product_by_id_from_db(db_session: Session, product_id: str) -> Optional[
     return db_session.query(Product).filter(Product.id == product_id).first()
 
 def search_similar_products(item_code: str, warehouse_names: Optional[List[str]], limit: int = 5, min_score: float = 0.75) -> Optional[Dict[str, Any]]:
+    """
+    Similar in-stock items, read from the precomputed product_neighbors table (indexed on
+    item_code, rank). Items without precomputed neighbours (new since the last catalog
+    refresh), or whose neighbours are all out of stock in `warehouse_names`, fall back to a
+    live ANN query, which looks further than the precomputed top-N.
+    """
     if not item_code: return {}
     with db_utils.get_db_session() as session:
         if not session: return None
-        source_product = session.query(Product).filter(Product.item_code == item_code).first()
-        if not source_product or source_product.embedding is None: return {}
-        
-        q = session.query(Product).filter(
-            Product.stock > 0,
-            Product.item_group_name == "DAMASCO TECNO",
-            Product.item_code != item_code,
-            (1 - Product.embedding.cosine_distance(source_product.embedding)) >= min_score
-        )
-        if warehouse_names: q = q.filter(Product.warehouse_name.in_(warehouse_names))
-        rows = q.order_by(Product.embedding.cosine_distance(source_product.embedding)).limit(limit).all()
-        
+        row_filters = [Product.stock > 0, Product.item_group_name == "DAMASCO TECNO"]
+        if warehouse_names: row_filters.append(Product.warehouse_name.in_(warehouse_names))
+
+        neighbors = (session.query(ProductNeighbor.neighbor_item_code.label("item_code"), ProductNeighbor.rank.label("rank"))
+                     .filter(ProductNeighbor.item_code == item_code, ProductNeighbor.score >= min_score)
+                     .subquery("neighbors"))
+        ranked = (session.query(Product.item_code)
+                  .join(neighbors, Product.item_code == neighbors.c.item_code)
+                  .filter(*row_filters)
+                  .group_by(Product.item_code, neighbors.c.rank)
+                  .order_by(neighbors.c.rank))
+        rows, _ = _fetch_ranked_page(session, ranked, row_filters, 0, limit)
+        if rows:
+            return _group_product_results(rows)
+
+        logger.info(f"search_similar_products: no precomputed neighbours in stock for {item_code}; using ANN search.")
+        source_embedding = (session.query(ProductEmbedding.embedding)
+                            .filter(ProductEmbedding.item_code == item_code)
+                            .scalar())
+        if source_embedding is None: return {}
+
+        # Over-fetch unique items from the ANN index; stock/warehouse filters may discard some.
+        nearest = _nearest_items_subquery(session, source_embedding, max(limit * 4, 20))
+        ranked = (session.query(Product.item_code)
+                  .join(nearest, Product.item_code == nearest.c.item_code)
+                  .filter(*row_filters, Product.item_code != item_code, (1 - nearest.c.distance) >= min_score)
+                  .group_by(Product.item_code)
+                  .order_by(func.min(nearest.c.distance), Product.item_code))
+        rows, _ = _fetch_ranked_page(session, ranked, row_filters, 0, limit)
+
         if not rows: return {"status": "not_found", "products_grouped": []}
-        return _group_product_results(rows)
\ No newline at end of file
+        return _group_product_results(rows)
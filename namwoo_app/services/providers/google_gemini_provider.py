@@ -3,7 +3,7 @@
 import logging
 import json
 from typing import List, Dict, Optional, Any, Union
-from openai import OpenAI, APIError, RateLimitError, APITimeoutError, BadRequestError
+from openai import APIError, RateLimitError, APITimeoutError, BadRequestError
 
 # --- CORRECTED IMPORTS ---
 # Go up one level '..' from 'providers' to the 'services' directory.
@@ -12,6 +12,7 @@ from .. import support_board_service
 # Go up two levels '...' from 'providers' to the 'namwoo_app' root for config/utils.
 from ...config import Config
 from ...utils import conversation_location
+from ...utils import llm_clients
 
 logger = logging.getLogger(__name__)
 
@@ -61,7 +62,7 @@ class GoogleGeminiProvider:
         google_base_url = "https://generativelanguage.googleapis.com/v1beta/openai/"
         timeout_seconds = getattr(Config, 'GOOGLE_REQUEST_TIMEOUT', 60.0)
         
-        self.client = OpenAI(
+        self.client = llm_clients.get_openai_client(
             api_key=api_key,
             base_url=google_base_url,
             timeout=timeout_seconds,
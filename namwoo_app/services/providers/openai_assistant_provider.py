@@ -6,7 +6,6 @@ import time
 from typing import List, Dict, Optional, Any
 
 import redis
-from openai import OpenAI
 from openai.types.beta.threads import Run
 
 # Import local services and utils
@@ -14,22 +13,35 @@ from .. import product_service
 from .. import support_board_service
 from .. import geolocation_service
 from .. import thread_mapping_service 
+from . import tool_state
 from ...config import Config
 from ...utils import conversation_location
 from ...utils import conversation_details
+from ...utils import llm_clients
 from ...utils import message_parser
+from ...utils import token_utils
+from ...utils import tool_executor
+from ...utils import tool_result_encoder
 
 logger = logging.getLogger(__name__)
 
+def _parse_tool_args(tc: Any) -> Dict[str, Any]:
+    try:
+        return json.loads(tc.function.arguments)
+    except json.JSONDecodeError:
+        logger.error(f"Invalid JSON for {tc.function.name}: {tc.function.arguments}")
+        return {}
+
+
 class OpenAIAssistantProvider:
     def __init__(self, api_key: str, assistant_id: str):
         if not api_key or not assistant_id:
             raise ValueError("API key and Assistant ID are required for OpenAIAssistantProvider.")
         
-        self.client = OpenAI(api_key=api_key)
+        self.client = llm_clients.get_openai_client(api_key=api_key)
         self.assistant_id = assistant_id
 
-        # Polling configuration
+        # Runs are streamed; polling is only used to wait for an orphaned run to be cancelled.
         self.polling_interval_seconds = 1
         self.run_timeout_seconds = 120
 
@@ -49,23 +61,79 @@ class OpenAIAssistantProvider:
 
     def _wait_for_thread_free(self, thread_id: str):
         """
-        Polls until there are no active runs on the thread.
-        Cancels the run and raises if timeout is exceeded.
+        Makes sure the thread has no active run before a new one is created. Runs of this
+        provider finish inside their stream and turns are serialized by the Redis lock, so an
+        active run here was orphaned (e.g. by a crashed worker): it is cancelled, and only then
+        polled until the cancellation settles.
         """
-        start = time.time()
         resp = self.client.beta.threads.runs.list(thread_id=thread_id, limit=1)
         if not resp.data:
             return  # no runs yet
 
         run = resp.data[0]
-        while run.status in ("queued", "in_progress", "requires_action"):
+        if run.status not in ("queued", "in_progress", "requires_action", "cancelling"):
+            return
+        logger.warning(f"Run {run.id} on thread {thread_id} is still '{run.status}'; cancelling it.")
+        if run.status != "cancelling":
+            run = self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+        start = time.time()
+        while run.status in ("queued", "in_progress", "requires_action", "cancelling"):
             if time.time() - start > self.run_timeout_seconds:
-                logger.warning(f"Run {run.id} hung; cancelling after {self.run_timeout_seconds}s")
-                self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
                 raise RuntimeError(f"Run {run.id} did not finish in time.")
             time.sleep(self.polling_interval_seconds)
             run = self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
 
+    def _stream_run(self, thread_id: str, instructions: str, sb_conversation_id: str) -> Optional[str]:
+        """
+        Creates a run with the streaming API and follows its events: `requires_action` executes
+        the tool calls and continues with submit_tool_outputs_stream, `completed` returns the
+        text of the last assistant message of the run (None when the run ended on a tool call,
+        e.g. routing), and failed/cancelled/expired runs return an error message.
+        """
+        deadline = time.time() + self.run_timeout_seconds
+        manager = self.client.beta.threads.runs.stream(
+            thread_id=thread_id, assistant_id=self.assistant_id, instructions=instructions,
+            timeout=self.run_timeout_seconds,
+        )
+        final_text: Optional[str] = None
+        while manager is not None:
+            pending_tool_calls, run = None, None
+            with manager as stream:
+                for event in stream:
+                    if event.event == "thread.run.created":
+                        logger.info(f"Created Run {event.data.id} for Thread {thread_id}.")
+                    elif event.event == "thread.message.completed":
+                        texts = [c.text.value for c in event.data.content if c.type == "text"]
+                        final_text = "\n".join(texts) if texts else None
+                    elif event.event == "thread.run.requires_action":
+                        run = event.data
+                        pending_tool_calls = run.required_action.submit_tool_outputs.tool_calls
+                    elif event.event == "thread.run.completed":
+                        logger.info(f"Run {event.data.id} completed.")
+                        if final_text is None:
+                            logger.info(f"Run {event.data.id} completed after a tool call with no subsequent text response. No message to send.")
+                        return final_text
+                    elif event.event in ("thread.run.failed", "thread.run.cancelled", "thread.run.expired"):
+                        run = event.data
+                        logger.error(f"Run {run.id} ended with {run.status}: {run.last_error}")
+                        return f"Lo siento, la operación falló con estado: {run.status}."
+
+            if pending_tool_calls is None:
+                logger.error(f"Run stream for Thread {thread_id} ended without a final event.")
+                return "Lo siento, la operación tardó demasiado en completarse."
+            if time.time() > deadline:
+                logger.error(f"Run {run.id} timed out after {self.run_timeout_seconds}s")
+                self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+                return "Lo siento, la operación tardó demasiado en completarse."
+
+            logger.info(f"Run {run.id} requires action.")
+            tool_outputs = self._execute_tool_calls(pending_tool_calls, sb_conversation_id)
+            manager = self.client.beta.threads.runs.submit_tool_outputs_stream(
+                thread_id=thread_id, run_id=run.id, tool_outputs=tool_outputs,
+                timeout=max(1.0, deadline - time.time()),
+            )
+        return final_text
+
     def _handle_geolocation_injection(self, thread_id: str, new_user_message: str) -> bool:
         location_data = message_parser.extract_location_from_text(new_user_message)
         if not location_data:
@@ -133,136 +201,105 @@ class OpenAIAssistantProvider:
                     ctx = "\n".join(f"- {k}: {v}" for k,v in reservation_context.items())
                     instructions += f"{header}Estado actual de la reserva:\n{ctx}{footer}"
 
-                # 4) create a new run
-                run = self.client.beta.threads.runs.create(
-                    thread_id=thread_id,
-                    assistant_id=self.assistant_id,
-                    instructions=instructions
-                )
-                logger.info(f"Created Run {run.id} for Thread {thread_id}.")
-
-                # 5) poll for completion / handle tool calls
-                start = time.time()
-                while time.time() - start < self.run_timeout_seconds:
-                    run = self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
-
-                    if run.status == 'completed':
-                        logger.info(f"Run {run.id} completed.")
-                        msgs = self.client.beta.threads.messages.list(thread_id=thread_id, limit=1)
-                        # --- START OF MODIFICATION: Handle No-Response Tool Calls ---
-                        # If the last message is a tool call, there is no text response to the user.
-                        # This happens on successful routing, so we should return None.
-                        last_message = msgs.data[0]
-                        if last_message.role == "assistant" and last_message.content[0].type == "text":
-                            return last_message.content[0].text.value
-                        else:
-                            # This can happen if the last action was a tool call (e.g., routing)
-                            # without a final text response from the assistant.
-                            logger.info(f"Run {run.id} completed after a tool call with no subsequent text response. No message to send.")
-                            return None
-                        # --- END OF MODIFICATION ---
-
-                    if run.status == 'requires_action':
-                        logger.info(f"Run {run.id} requires action.")
-                        tool_outputs = self._execute_tool_calls(run.required_action.submit_tool_outputs.tool_calls, sb_conversation_id)
-                        self.client.beta.threads.runs.submit_tool_outputs(
-                            thread_id=thread_id,
-                            run_id=run.id,
-                            tool_outputs=tool_outputs
-                        )
-
-                    if run.status in ('failed', 'cancelled', 'expired'):
-                        logger.error(f"Run {run.id} ended with {run.status}: {run.last_error}")
-                        return f"Lo siento, la operación falló con estado: {run.status}."
-
-                    time.sleep(self.polling_interval_seconds)
-
-                # timeout
-                logger.error(f"Run {run.id} timed out after {self.run_timeout_seconds}s")
-                return "Lo siento, la operación tardó demasiado en completarse."
+                # 4) run the assistant, streaming events instead of polling
+                return self._stream_run(thread_id, instructions, sb_conversation_id)
 
             except Exception as e:
                 logger.exception(f"Error in OpenAIAssistantProvider for Conv {sb_conversation_id}: {e}")
                 return "Ocurrió un error inesperado con nuestro asistente. Por favor, intenta de nuevo."
 
     def _execute_tool_calls(self, tool_calls: List[Any], sb_conversation_id: str) -> List[Dict[str, str]]:
-        tool_outputs = []
-        for tc in tool_calls:
-            fn = tc.function.name
-            try:
-                args = json.loads(tc.function.arguments)
-            except json.JSONDecodeError:
-                logger.error(f"Invalid JSON for {fn}: {tc.function.arguments}")
-                args = {}
-
-            logger.info(f"Tool requested: {fn} args={args} for Conv {sb_conversation_id}")
-            output: Any = {}
+        """Runs a run's tool calls (read-only ones concurrently, see utils/tool_executor); outputs keep call order."""
+        requests = [(tc, _parse_tool_args(tc)) for tc in tool_calls]
+        return tool_executor.run_tool_calls(
+            requests,
+            execute=lambda request: self._execute_tool_call(*request, sb_conversation_id),
+            parallel_safe=lambda request: request[0].function.name in tool_executor.READ_ONLY_TOOLS,
+            prepare=lambda request: tool_state.apply_tool_call_state(*request, sb_conversation_id),
+            max_workers=Config.TOOL_EXECUTION_MAX_WORKERS,
+            changes_state=lambda request: tool_state.changes_state(*request),
+        )
 
-            try:
-                if fn == "find_products":
-                    # ... existing logic ...
-                    query, city_arg = args.get("query"), args.get("city")
-                    if city_arg:
-                        conversation_location.set_conversation_city(sb_conversation_id, city_arg)
-                        warehouses = conversation_location.get_city_warehouses(sb_conversation_id)
-                        if not warehouses:
-                            output = {"status": "city_not_served", "city": city_arg}
-                        else:
-                            res = product_service.find_products(query=query, warehouse_names=warehouses)
-                            if not res or not (res.get("products_grouped") or res.get("product_details")):
-                                output = {"status": "not_found_in_city", "city": city_arg}
-                            else:
-                                output = res
+    def _execute_tool_call(self, tc: Any, args: Dict[str, Any], sb_conversation_id: str) -> Dict[str, str]:
+        fn = tc.function.name
+        logger.info(f"Tool requested: {fn} args={args} for Conv {sb_conversation_id}")
+        output: Any = {}
+
+        try:
+            if fn == "find_products":
+                # ... existing logic ...
+                query, city_arg, page_token = args.get("query"), args.get("city"), args.get("page_token")
+                if city_arg:
+                    # The conversation city was already stored by tool_state.apply_tool_call_state.
+                    warehouses = conversation_location.get_warehouses_for_city(city_arg)
+                    if not warehouses:
+                        output = {"status": "city_not_served", "city": city_arg}
                     else:
-                        output = product_service.find_products(query=query, warehouse_names=None)
+                        res = product_service.find_products(query=query, warehouse_names=warehouses, page_token=page_token)
+                        if not res or not (res.get("products_grouped") or res.get("product_details")):
+                            output = {"status": "not_found_in_city", "city": city_arg}
+                        else:
+                            output = res
+                else:
+                    output = product_service.find_products(query=query, warehouse_names=None, page_token=page_token)
 
-                elif fn == "get_available_brands":
-                    brands = product_service.get_available_brands_by_category(category=args.get("category", "CELULAR"))
-                    output = {"status": "success", "brands": brands} if brands else {"status": "not_found"}
+            elif fn == "get_available_brands":
+                brands = product_service.get_available_brands_by_category(category=args.get("category", "CELULAR"))
+                output = {"status": "success", "brands": brands} if brands else {"status": "not_found"}
 
-                elif fn == "get_branch_address":
-                    output = product_service.get_branch_address(
-                        branch_name=args.get("branchName"),
-                        city=args.get("city")
-                    )
+            elif fn == "get_branch_address":
+                output = product_service.get_branch_address(
+                    branch_name=args.get("branchName"),
+                    city=args.get("city")
+                )
 
-                elif fn == "query_accessories":
-                    warehouses = conversation_location.get_city_warehouses(sb_conversation_id)
-                    res = product_service.query_accessories(main_product_item_code=args.get("itemCode"), city_warehouses=warehouses)
-                    output = {"status": "success", "accessories_list": res} if res else {"status": "not_found"}
+            elif fn == "get_products_by_skus":
+                warehouses = conversation_location.get_city_warehouses(sb_conversation_id)
+                output = product_service.get_products_by_skus(codes=args.get("itemCodes") or [], warehouse_names=warehouses) \
+                    or {"status": "error", "message": "Error interno consultando los productos."}
 
-                elif fn == "get_location_details_from_address":
-                    output = geolocation_service.get_location_details_from_address(address=args.get("address"))
+            elif fn == "query_accessories":
+                warehouses = conversation_location.get_city_warehouses(sb_conversation_id)
+                res = product_service.query_accessories(
+                    main_product_item_code=args.get("itemCode"), city_warehouses=warehouses,
+                    city=conversation_location.get_conversation_city(sb_conversation_id),
+                )
+                output = {"status": "success", "accessories_list": res} if res else {"status": "not_found"}
 
-                elif fn == "save_customer_reservation_details":
-                    saved = [k for k,v in args.items() if conversation_details.store_reservation_detail(sb_conversation_id, k, v)]
-                    if 'city' in args:
-                        conversation_location.set_conversation_city(sb_conversation_id, args['city'])
-                    output = {"status": "success", "message": f"OK. Detalles guardados: {', '.join(saved)}."} if saved else {"status": "no_action"}
+            elif fn == "get_location_details_from_address":
+                output = geolocation_service.get_location_details_from_address(address=args.get("address"))
 
-                elif fn == "send_whatsapp_order_summary_template":
-                    output = {"status": "success", "message": "OK_TEMPLATE_SENT"}
+            elif fn == "save_customer_reservation_details":
+                saved = [k for k,v in args.items() if conversation_details.store_reservation_detail(sb_conversation_id, k, v)]
+                if 'city' in args:
+                    conversation_location.set_conversation_city(sb_conversation_id, args['city'])
+                output = {"status": "success", "message": f"OK. Detalles guardados: {', '.join(saved)}."} if saved else {"status": "no_action"}
 
-                # --- START OF MODIFICATION: Add Routing Logic ---
-                elif fn == "route_to_sales_department":
-                    support_board_service.route_conversation_to_sales(sb_conversation_id)
-                    output = {"status": "success", "message": "Conversation has been routed to the Sales department."}
+            elif fn == "send_whatsapp_order_summary_template":
+                output = {"status": "success", "message": "OK_TEMPLATE_SENT"}
 
-                elif fn == "route_to_human_support":
-                    support_board_service.route_conversation_to_support(sb_conversation_id)
-                    output = {"status": "success", "message": "Conversation has been routed to the Support department."}
-                # --- END OF MODIFICATION ---
+            # --- START OF MODIFICATION: Add Routing Logic ---
+            elif fn == "route_to_sales_department":
+                support_board_service.route_conversation_to_sales(sb_conversation_id)
+                output = {"status": "success", "message": "Conversation has been routed to the Sales department."}
 
-                else:
-                    output = {"status": "error", "message": f"Herramienta desconocida '{fn}'."}
+            elif fn == "route_to_human_support":
+                support_board_service.route_conversation_to_support(sb_conversation_id)
+                output = {"status": "success", "message": "Conversation has been routed to the Support department."}
+            # --- END OF MODIFICATION ---
 
-            except Exception as ex:
-                logger.exception(f"Error executing {fn}: {ex}")
-                output = {"status": "error", "message": f"Error interno en {fn}: {ex}"}
+            else:
+                output = {"status": "error", "message": f"Herramienta desconocida '{fn}'."}
 
-            tool_outputs.append({
-                "tool_call_id": tc.id,
-                "output": json.dumps(output, ensure_ascii=False)
-            })
+        except Exception as ex:
+            logger.exception(f"Error executing {fn}: {ex}")
+            output = {"status": "error", "message": f"Error interno en {fn}: {ex}"}
 
-        return tool_outputs
\ No newline at end of file
+        encoded_output, output_tokens = tool_result_encoder.encode(
+            output, Config.TOOL_RESULT_TOKEN_BUDGET, count=token_utils.count_tokens, fmt=Config.TOOL_RESULT_FORMAT
+        )
+        logger.info(f"Tool result for {fn} encoded as {Config.TOOL_RESULT_FORMAT}: {output_tokens} tokens.")
+        return {
+            "tool_call_id": tc.id,
+            "output": encoded_output
+        }
\ No newline at end of file
@@ -3,18 +3,32 @@
 import logging
 import json
 import time
-from typing import List, Dict, Optional, Any
-from openai import OpenAI, APIError, RateLimitError, APITimeoutError, BadRequestError
+from types import SimpleNamespace
+from typing import Callable, List, Dict, Optional, Any, Tuple
+from openai import APIError, RateLimitError, APITimeoutError, BadRequestError
 
 # Import local services and utils. Note the adjusted relative paths.
+from .. import conversation_history_service
 from .. import product_service
 from .. import support_board_service
 from .. import geolocation_service
+from . import tool_state
 from ...config import Config
+from ...extensions import get_redis_client
 from ...utils import embedding_utils
 from ...utils import conversation_location
 from ...utils import conversation_details
+from ...utils import history_window as history_window_util
+from ...utils import intent_rules
+from ...utils import llm_clients
 from ...utils import message_parser
+from ...utils import metrics
+from ...utils import reply_chunker
+from ...utils import semantic_cache
+from ...utils.search_cache import normalize_query
+from ...utils import token_utils
+from ...utils import tool_executor
+from ...utils import tool_result_encoder
 from ...utils.conversation_details import (
     KEY_ITEM_CODE, KEY_ITEM_NAME, KEY_FULL_NAME, KEY_CEDULA, KEY_PHONE,
     KEY_EMAIL, KEY_DELIVERY_METHOD, KEY_BRANCH_NAME, KEY_DELIVERY_ADDRESS,
@@ -28,12 +42,13 @@ tools_schema = [
     {
         "type": "function", "function": {
             "name": "find_products",
-            "description": "Searches the product catalog by keyword, SKU, or brand. If 'city' is provided, it filters for stock in that city's stores. Otherwise, it performs a nationwide search.",
+            "description": "Searches the product catalog by keyword, SKU, or brand. If 'city' is provided, it filters for stock in that city's stores. Otherwise, it performs a nationwide search. Returns the most relevant products first; 'has_more' and 'next_page_token' indicate that more results are available.",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "query": {"type": "string", "description": "User's search term (e.g., 'iPhone 15', 'Honor', 'celular 16gb ram')."},
-                    "city": {"type": "string", "description": "Optional. City to check for in-store stock."}
+                    "city": {"type": "string", "description": "Optional. City to check for in-store stock."},
+                    "page_token": {"type": "string", "description": "Optional. The 'next_page_token' of a previous find_products result, to see more products for the same query. Only use it when the user wants more options."}
                 }, "required": ["query"]
             }
         }
@@ -65,6 +80,16 @@ tools_schema = [
             }
         }
     },
+    {
+        "type": "function", "function": {
+            "name": "get_products_by_skus",
+            "description": "Obtiene en una sola llamada los detalles (precios, variantes, tiendas) de varios productos por su itemCode (SKU), por ejemplo los del carrito. Usar en lugar de varias búsquedas individuales.",
+            "parameters": {"type": "object", "properties": {
+                    "itemCodes": {"type": "array", "items": {"type": "string"}, "description": "Lista de itemCodes (SKU) a consultar."}
+                },"required": ["itemCodes"]
+            }
+        }
+    },
     {
         "type": "function", "function": {
             "name": "query_accessories",
@@ -149,18 +174,56 @@ tools_schema = [
 ]
 
 
+def _canonical_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Key-sorted copy of the tool schema, so its serialization (part of the cached prompt prefix) never varies."""
+    return json.loads(json.dumps(tools, sort_keys=True, ensure_ascii=False))
+
+
+tools_schema = _canonical_tools(tools_schema)
+
+
+def _log_usage(usage: Any, sb_conversation_id: str) -> None:
+    """Logs prompt/cached/completion tokens of one completion; cached tokens come from the prompt cache."""
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    ratio = f"{100 * cached / prompt:.0f}%" if prompt else "n/a"
+    logger.info(f"OpenAI usage for Conv {sb_conversation_id}: prompt={prompt} cached={cached} ({ratio}) "
+                f"completion={getattr(usage, 'completion_tokens', 0)}")
+
+
+def _parse_tool_args(tc: Any) -> Optional[Dict[str, Any]]:
+    try:
+        args = json.loads(tc.function.arguments or "{}")
+    except json.JSONDecodeError:
+        logger.error(f"Invalid JSON for {tc.function.name}: {tc.function.arguments}")
+        return None
+    return args if isinstance(args, dict) else None
+
+
 class OpenAIChatProvider:
+    supports_streaming = True
+
     def __init__(self, api_key: str):
         if not api_key:
             raise ValueError("OpenAI API key is required for OpenAIChatProvider.")
         
-        timeout_seconds = getattr(Config, 'OPENAI_REQUEST_TIMEOUT', 60.0)
-        self.client = OpenAI(api_key=api_key, timeout=timeout_seconds)
+        self.client = llm_clients.get_openai_client(api_key=api_key, timeout=Config.OPENAI_REQUEST_TIMEOUT)
         self.model = getattr(Config, "OPENAI_CHAT_MODEL", "gpt-4o-mini")
-        self.max_history_messages = Config.MAX_HISTORY_MESSAGES
+        self.history_token_budget = Config.HISTORY_TOKEN_BUDGET
+        self.history_memory_token_budget = Config.HISTORY_MEMORY_TOKEN_BUDGET
         self.tool_call_retry_limit = 2
         self.max_tokens = getattr(Config, "OPENAI_MAX_TOKENS", 1024)
         self.temperature = getattr(Config, "OPENAI_TEMPERATURE", 0.7)
+        self.semantic_cache = semantic_cache.SemanticCache(
+            Config, get_redis_client,
+            embed=lambda text: embedding_utils.get_embedding(text, retries=0),
+            normalize=normalize_query, incr=metrics.incr,
+            is_trivial=lambda text: intent_rules.classify(text) in ("greeting", "thanks"),
+        )
+        self.semantic_cache_namespace = self.semantic_cache.namespace(Config.SYSTEM_PROMPT, tools_schema, self.model)
         logger.info(f"OpenAIChatProvider initialized with model '{self.model}'.")
 
     def process_message(
@@ -168,15 +231,29 @@ class OpenAIChatProvider:
         sb_conversation_id: str,
         new_user_message: Optional[str],
         conversation_data: Dict[str, Any],
-        reservation_context: Dict[str, Any]
+        reservation_context: Dict[str, Any],
+        on_reply_chunk: Optional[Callable[[str], None]] = None,
+        reply_max_chars: Optional[int] = None,
     ) -> Optional[str]:
-        sb_history_list = (conversation_data.get("messages", []) if conversation_data else [])
-        openai_history = self._format_sb_history_for_openai(sb_history_list)
+        """
+        Returns the final reply text. With OPENAI_STREAMING_ENABLED and an `on_reply_chunk`
+        callback, the reply is also delivered through the callback while it is generated
+        (whole sentences/paragraphs, see utils/reply_chunker); the caller must not send it again.
+        """
+        if conversation_data and "openai_messages" in conversation_data:
+            openai_history = list(conversation_data["openai_messages"])  # Converted once, when cached
+        else:
+            sb_history_list = (conversation_data.get("messages", []) if conversation_data else [])
+            openai_history = self._format_sb_history_for_openai(sb_history_list)
         
+        # Replies to FAQ-style messages without earlier context may come from (and go to) the semantic cache.
+        cache_eligible = self.semantic_cache.is_eligible(new_user_message, reservation_context, openai_history)
+
         # --- GEOLOCATION INTEGRATION ---
         if new_user_message:
             location_data = message_parser.extract_location_from_text(new_user_message)
             if location_data:
+                cache_eligible = False
                 logger.info(f"Location URL detected for Conv {sb_conversation_id}. Processing with geolocation.")
                 geo_details = geolocation_service.get_location_details(
                     latitude=location_data['latitude'],
@@ -205,16 +282,45 @@ class OpenAIChatProvider:
         if not openai_history:
             return None
 
+        if cache_eligible:
+            cached_reply = self.semantic_cache.lookup(new_user_message, self.semantic_cache_namespace, sb_conversation_id)
+            if cached_reply:
+                return cached_reply
+
+        # The static prompt must stay a byte-identical prefix so the provider's prompt cache can reuse it;
+        # per-conversation context goes after it.
         system_prompt_content = Config.SYSTEM_PROMPT
         if reservation_context:
             context_header = "\n\n--- CONTEXTO DE RESERVA ---\n"
-            context_footer = "\n---------------------------\n\n"
+            context_footer = "\n---------------------------"
             context_str = "Estado actual de la reserva del cliente (no preguntar de nuevo):\n" + "\n".join([f"- {key}: {value}" for key, value in reservation_context.items()])
-            system_prompt_content = context_header + context_str + context_footer + system_prompt_content
+            system_prompt_content = system_prompt_content + context_header + context_str + context_footer
 
-        messages: List[Dict[str, Any]] = [{"role": "system", "content": system_prompt_content}] + openai_history
-        if len(messages) > (self.max_history_messages + 1):
-            messages = [messages[0]] + messages[-(self.max_history_messages):]
+        history_window, history_memory, history_tokens = history_window_util.build_window(
+            openai_history, self.history_token_budget,
+            count=lambda text: token_utils.count_tokens(text, self.model),
+            memory_budget_tokens=self.history_memory_token_budget,
+        )
+        logger.info(f"History for Conv {sb_conversation_id}: {len(history_window)}/{len(openai_history)} messages, "
+                    f"{history_tokens} tokens{' + rolling memory' if history_memory else ''}.")
+        messages: List[Dict[str, Any]] = [{"role": "system", "content": system_prompt_content}]
+        if history_memory:
+            messages.append({"role": "system", "content": history_memory})
+        messages += history_window
+
+        chunker = None
+        if on_reply_chunk and Config.OPENAI_STREAMING_ENABLED:
+            chunker = reply_chunker.SentenceChunker(
+                min_chars=Config.OPENAI_STREAM_MIN_CHUNK_CHARS,
+                max_chars=reply_max_chars or reply_chunker.DEFAULT_MAX_CHARS,
+            )
+        chunks_sent = 0
+
+        def deliver(chunks: List[str]) -> None:
+            nonlocal chunks_sent
+            for chunk in chunks:
+                on_reply_chunk(chunk)
+                chunks_sent += 1
 
         final_assistant_response: Optional[str] = None
         try:
@@ -224,80 +330,158 @@ class OpenAIChatProvider:
                     "model": self.model, "messages": messages, "max_tokens": self.max_tokens,
                     "temperature": self.temperature, "tools": tools_schema, "tool_choice": "auto"
                 }
-                response = self.client.chat.completions.create(**call_params)
-                response_message = response.choices[0].message
-                messages.append(response_message.model_dump(exclude_none=True))
+                if chunker:
+                    assistant_message, tool_calls, usage = self._create_streamed(call_params, chunker, deliver)
+                else:
+                    response = self.client.chat.completions.create(**call_params)
+                    response_message = response.choices[0].message
+                    assistant_message, tool_calls = response_message.model_dump(exclude_none=True), response_message.tool_calls
+                    usage = response.usage
+                _log_usage(usage, sb_conversation_id)
+                messages.append(assistant_message)
 
-                if not response_message.tool_calls:
-                    final_assistant_response = response_message.content
+                if not tool_calls:
+                    final_assistant_response = assistant_message.get("content")
                     break
 
-                tool_outputs_for_llm = self._execute_tool_calls(response_message.tool_calls, sb_conversation_id)
+                tool_outputs_for_llm = self._execute_tool_calls(tool_calls, sb_conversation_id)
                 messages.extend(tool_outputs_for_llm)
                 
                 tool_call_count += 1
                 if tool_call_count > self.tool_call_retry_limit and not final_assistant_response:
                     break
 
+            if chunker:
+                deliver(chunker.flush())
+                logger.info(f"Streamed reply for Conv {sb_conversation_id} in {chunks_sent} message(s).")
+            if cache_eligible and tool_call_count == 0 and final_assistant_response:
+                self.semantic_cache.store(new_user_message, final_assistant_response, self.semantic_cache_namespace)
+
         except Exception as e:
             logger.exception(f"OpenAIChatProvider error for Conv {sb_conversation_id}: {e}")
             final_assistant_response = "Ocurrió un error inesperado con nuestro asistente. Por favor, intenta de nuevo."
-        
+            if chunker and chunks_sent:
+                # Part of the reply already reached the customer; the caller will not send anything else.
+                on_reply_chunk(final_assistant_response)
+
         return final_assistant_response
 
+    def _create_streamed(
+        self,
+        call_params: Dict[str, Any],
+        chunker: reply_chunker.SentenceChunker,
+        deliver: Callable[[List[str]], None],
+    ) -> Tuple[Dict[str, Any], List[Any], Any]:
+        """
+        Runs one completion with stream=True. Text deltas are passed through `chunker` to
+        `deliver` as they arrive; tool-call deltas are merged by index (id and name come in the
+        first fragment, arguments are split across many). Text is held back once a tool call
+        starts. Returns the assistant message for the history, the tool calls to execute and
+        the usage reported in the final event.
+        """
+        content_parts: List[str] = []
+        calls: Dict[int, Dict[str, str]] = {}
+        usage = None
+        stream = self.client.chat.completions.create(**call_params, stream=True, stream_options={"include_usage": True})
+        for event in stream:
+            usage = getattr(event, "usage", None) or usage
+            if not event.choices:
+                continue
+            delta = event.choices[0].delta
+            for fragment in delta.tool_calls or []:
+                call = calls.setdefault(fragment.index, {"id": "", "name": "", "arguments": ""})
+                call["id"] = fragment.id or call["id"]
+                if fragment.function:
+                    call["name"] += fragment.function.name or ""
+                    call["arguments"] += fragment.function.arguments or ""
+            if delta.content:
+                content_parts.append(delta.content)
+                if not calls:
+                    deliver(chunker.feed(delta.content))
+
+        assistant_message: Dict[str, Any] = {"role": "assistant", "content": "".join(content_parts) or None}
+        if not calls:
+            return assistant_message, [], usage
+        assistant_message["tool_calls"] = [
+            {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+            for _, c in sorted(calls.items())
+        ]
+        tool_calls = [
+            SimpleNamespace(id=c["id"], function=SimpleNamespace(name=c["name"], arguments=c["arguments"]))
+            for _, c in sorted(calls.items())
+        ]
+        return assistant_message, tool_calls, usage
+
     def _execute_tool_calls(self, tool_calls: List[Any], sb_conversation_id: str) -> List[Dict[str, str]]:
-        tool_outputs_for_llm: List[Dict[str, str]] = []
-        for tc in tool_calls:
-            fn_name = tc.function.name
-            tool_call_id = tc.id
-            output_txt = ""
-            try:
-                args = json.loads(tc.function.arguments)
-                logger.info(f"OpenAIChatProvider requested tool: {fn_name} with args: {args} for Conv {sb_conversation_id}")
-
-                if fn_name == "find_products":
-                    query, city_arg = args.get("query"), args.get("city")
-                    if city_arg:
-                        conversation_location.set_conversation_city(sb_conversation_id, city_arg)
-                        warehouse_names_arg = conversation_location.get_city_warehouses(sb_conversation_id)
-                        if not warehouse_names_arg:
-                            output_txt = json.dumps({"status": "city_not_served", "city": city_arg}, ensure_ascii=False)
-                        else:
-                            search_res = product_service.find_products(query=query, warehouse_names=warehouse_names_arg)
-                            if not search_res or not (search_res.get("products_grouped") or search_res.get("product_details")):
-                                output_txt = json.dumps({"status": "not_found_in_city", "city": city_arg}, ensure_ascii=False)
-                            else:
-                                output_txt = self._format_results(search_res, fn_name)
+        """Runs a turn's tool calls (read-only ones concurrently, see utils/tool_executor); outputs keep call order."""
+        requests = [(tc, _parse_tool_args(tc)) for tc in tool_calls]
+        return tool_executor.run_tool_calls(
+            requests,
+            execute=lambda request: self._execute_tool_call(*request, sb_conversation_id),
+            parallel_safe=lambda request: request[0].function.name in tool_executor.READ_ONLY_TOOLS,
+            prepare=lambda request: tool_state.apply_tool_call_state(*request, sb_conversation_id),
+            max_workers=Config.TOOL_EXECUTION_MAX_WORKERS,
+            changes_state=lambda request: tool_state.changes_state(*request),
+        )
+
+    def _execute_tool_call(self, tc: Any, args: Optional[Dict[str, Any]], sb_conversation_id: str) -> Dict[str, str]:
+        fn_name = tc.function.name
+        tool_call_id = tc.id
+        output_txt = ""
+        try:
+            if args is None:
+                raise ValueError(f"Invalid JSON arguments: {tc.function.arguments}")
+            logger.info(f"OpenAIChatProvider requested tool: {fn_name} with args: {args} for Conv {sb_conversation_id}")
+
+            if fn_name == "find_products":
+                query, city_arg, page_token = args.get("query"), args.get("city"), args.get("page_token")
+                if city_arg:
+                    # The conversation city was already stored by tool_state.apply_tool_call_state.
+                    warehouse_names_arg = conversation_location.get_warehouses_for_city(city_arg)
+                    if not warehouse_names_arg:
+                        output_txt = json.dumps({"status": "city_not_served", "city": city_arg}, ensure_ascii=False)
                     else:
-                        search_res = product_service.find_products(query=query, warehouse_names=None)
-                        output_txt = self._format_results(search_res, fn_name)
-                elif fn_name == "get_available_brands":
-                    brands_list = product_service.get_available_brands_by_category(category=args.get("category", "CELULAR"))
-                    output_txt = self._format_brands(brands_list)
-                elif fn_name == "get_branch_address":
-                    result = product_service.get_branch_address(branch_name=args.get("branchName"), city=args.get("city"))
-                    output_txt = self._format_results(result, fn_name)
-                elif fn_name == "query_accessories":
-                    warehouses = conversation_location.get_city_warehouses(sb_conversation_id)
-                    result = product_service.query_accessories(main_product_item_code=args.get("itemCode"), city_warehouses=warehouses)
-                    output_txt = json.dumps({"status": "success", "accessories_list": ", ".join(result)} if result else {"status": "not_found"}, ensure_ascii=False)
-                elif fn_name == "get_location_details_from_address":
-                    result = geolocation_service.get_location_details_from_address(address=args.get("address"))
-                    output_txt = self._format_results(result, fn_name)
-                elif fn_name == "save_customer_reservation_details":
-                    saved_keys = [key for key, value in args.items() if conversation_details.store_reservation_detail(sb_conversation_id, key, value)]
-                    if 'city' in args: conversation_location.set_conversation_city(sb_conversation_id, args['city'])
-                    output_txt = json.dumps({"status": "success", "message": f"OK. Detalles guardados: {', '.join(saved_keys)}."} if saved_keys else {"status": "no_action"}, ensure_ascii=False)
-                elif fn_name == "send_whatsapp_order_summary_template":
-                    output_txt = json.dumps({"status": "success", "message": "OK_TEMPLATE_SENT"}, ensure_ascii=False)
+                        search_res = product_service.find_products(query=query, warehouse_names=warehouse_names_arg, page_token=page_token)
+                        if not search_res or not (search_res.get("products_grouped") or search_res.get("product_details")):
+                            output_txt = json.dumps({"status": "not_found_in_city", "city": city_arg}, ensure_ascii=False)
+                        else:
+                            output_txt = self._format_results(search_res, fn_name)
                 else:
-                    output_txt = json.dumps({"status": "error", "message": f"Herramienta desconocida '{fn_name}'."}, ensure_ascii=False)
-            except Exception as tool_exec_err:
-                logger.exception(f"Tool execution error for {fn_name}: {tool_exec_err}")
-                output_txt = json.dumps({"status": "error", "message": f"Error interno al ejecutar {fn_name}."}, ensure_ascii=False)
+                    search_res = product_service.find_products(query=query, warehouse_names=None, page_token=page_token)
+                    output_txt = self._format_results(search_res, fn_name)
+            elif fn_name == "get_available_brands":
+                brands_list = product_service.get_available_brands_by_category(category=args.get("category", "CELULAR"))
+                output_txt = self._format_brands(brands_list)
+            elif fn_name == "get_branch_address":
+                result = product_service.get_branch_address(branch_name=args.get("branchName"), city=args.get("city"))
+                output_txt = self._format_results(result, fn_name)
+            elif fn_name == "get_products_by_skus":
+                warehouses = conversation_location.get_city_warehouses(sb_conversation_id)
+                result = product_service.get_products_by_skus(codes=args.get("itemCodes") or [], warehouse_names=warehouses)
+                output_txt = self._format_results(result, fn_name)
+            elif fn_name == "query_accessories":
+                warehouses = conversation_location.get_city_warehouses(sb_conversation_id)
+                result = product_service.query_accessories(
+                    main_product_item_code=args.get("itemCode"), city_warehouses=warehouses,
+                    city=conversation_location.get_conversation_city(sb_conversation_id),
+                )
+                output_txt = json.dumps({"status": "success", "accessories_list": ", ".join(result)} if result else {"status": "not_found"}, ensure_ascii=False)
+            elif fn_name == "get_location_details_from_address":
+                result = geolocation_service.get_location_details_from_address(address=args.get("address"))
+                output_txt = self._format_results(result, fn_name)
+            elif fn_name == "save_customer_reservation_details":
+                saved_keys = [key for key, value in args.items() if conversation_details.store_reservation_detail(sb_conversation_id, key, value)]
+                if 'city' in args: conversation_location.set_conversation_city(sb_conversation_id, args['city'])
+                output_txt = json.dumps({"status": "success", "message": f"OK. Detalles guardados: {', '.join(saved_keys)}."} if saved_keys else {"status": "no_action"}, ensure_ascii=False)
+            elif fn_name == "send_whatsapp_order_summary_template":
+                output_txt = json.dumps({"status": "success", "message": "OK_TEMPLATE_SENT"}, ensure_ascii=False)
+            else:
+                output_txt = json.dumps({"status": "error", "message": f"Herramienta desconocida '{fn_name}'."}, ensure_ascii=False)
+        except Exception as tool_exec_err:
+            logger.exception(f"Tool execution error for {fn_name}: {tool_exec_err}")
+            output_txt = json.dumps({"status": "error", "message": f"Error interno al ejecutar {fn_name}."}, ensure_ascii=False)
 
-            tool_outputs_for_llm.append({"tool_call_id": tool_call_id, "role": "tool", "name": fn_name, "content": output_txt})
-        return tool_outputs_for_llm
+        return {"tool_call_id": tool_call_id, "role": "tool", "name": fn_name, "content": output_txt}
 
     def _format_brands(self, brands: Optional[List[str]]) -> str:
         if not brands:
@@ -308,32 +492,17 @@ class OpenAIChatProvider:
         if result is None:
             return json.dumps({"status": "error", "message": f"Error interno al ejecutar la herramienta {tool_name}."}, ensure_ascii=False)
         try:
-            return json.dumps(result, indent=2, ensure_ascii=False)
+            text, tokens = tool_result_encoder.encode(
+                result, Config.TOOL_RESULT_TOKEN_BUDGET,
+                count=lambda text: token_utils.count_tokens(text, self.model), fmt=Config.TOOL_RESULT_FORMAT,
+            )
+            logger.info(f"Tool result for {tool_name} encoded as {Config.TOOL_RESULT_FORMAT}: {tokens} tokens.")
+            return text
         except (TypeError, ValueError) as err:
             logger.error(f"JSON serialisation error for {tool_name} results: {err}", exc_info=True)
             return json.dumps({"status": "error", "message": "Error al formatear los resultados."}, ensure_ascii=False)
 
     def _format_sb_history_for_openai(self, sb_messages: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
         if not sb_messages: return []
-        openai_messages: List[Dict[str, Any]] = []
-        bot_user_id_str = str(Config.SUPPORT_BOARD_DM_BOT_USER_ID)
-        
-        for msg in sb_messages:
-            role = "assistant" if str(msg.get("user_id")) == bot_user_id_str else "user"
-            try:
-                if role == 'assistant' and 'payload' in msg and msg['payload']:
-                    payload_json = json.loads(msg['payload'])
-                    if 'tool_calls' in payload_json:
-                        openai_messages.append({"role": "assistant", "content": None, "tool_calls": payload_json['tool_calls']})
-                        continue
-                if role == 'tool' and 'payload' in msg and msg['payload']:
-                    payload_json = json.loads(msg['payload'])
-                    if 'tool_call_id' in payload_json and 'name' in payload_json:
-                        openai_messages.append({"role": "tool", "tool_call_id": payload_json['tool_call_id'], "name": payload_json['name'], "content": payload_json['content']})
-                        continue
-            except (json.JSONDecodeError, TypeError):
-                pass
-            text_content = msg.get("message", "").strip()
-            if text_content:
-                openai_messages.append({"role": role, "content": text_content})
-        return openai_messages
\ No newline at end of file
+        formatted = (conversation_history_service.format_sb_message(msg) for msg in sb_messages)
+        return [message for message in formatted if message]
@@ -0,0 +1,29 @@
+# namwoo_app/services/providers/tool_state.py
+"""
+Conversation state implied by the model's read-only tool calls, shared by the OpenAI providers.
+
+`find_products` with a city makes that city the conversation city. The providers apply it
+through tool_executor.run_tool_calls' `prepare` step and pass `changes_state`, so such a call
+starts a new segment: calls before it still see the previous city, calls after it the new one.
+"""
+from typing import Any, Dict, Optional
+
+from ...utils import conversation_location
+
+
+def tool_call_city(tc: Any, args: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The city a read-only call makes the conversation city (find_products with a city)."""
+    if tc.function.name == "find_products" and args and args.get("city"):
+        return args["city"]
+    return None
+
+
+def changes_state(tc: Any, args: Optional[Dict[str, Any]]) -> bool:
+    return tool_call_city(tc, args) is not None
+
+
+def apply_tool_call_state(tc: Any, args: Optional[Dict[str, Any]], sb_conversation_id: str) -> None:
+    """Conversation state implied by a read-only call, applied in call order before it runs."""
+    city = tool_call_city(tc, args)
+    if city:
+        conversation_location.set_conversation_city(sb_conversation_id, city)
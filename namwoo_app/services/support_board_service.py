@@ -85,6 +85,15 @@ def get_sb_conversation_data(conversation_id: str) -> Optional[Dict]:
         logger.error(f"Failed to fetch or parse valid conversation data dictionary for SB conversation {conversation_id}. Raw response from _call_sb_api call was not a valid dictionary: {response_data}")
         return None
 
+# --- PRIVATE HELPER: Keep the cached history in step with our own messages ---
+def _record_sent_message(conversation_id: str, response: Any, user_id: str, message: str, payload: str = '') -> None:
+    """Appends a message we just added to the cached conversation; its webhook echo is not guaranteed."""
+    from . import conversation_history_service  # Imports this module at load time.
+    message_id = response.get('id', response.get('message-id')) if isinstance(response, dict) else None
+    conversation_history_service.record_sent_message(conversation_id, {
+        'id': message_id, 'user_id': user_id, 'message': message, 'payload': payload,
+    })
+
 # --- NEW PUBLIC FUNCTION: Add Message to SB Conversation ---
 def add_message_to_sb_conversation(conversation_id: str, message_data: dict) -> bool:
     """
@@ -110,6 +119,7 @@ def add_message_to_sb_conversation(conversation_id: str, message_data: dict) ->
 
     if response:
         logger.info(f"Successfully added message to conv {conversation_id}. Response: {response}")
+        _record_sent_message(conversation_id, response, bot_user_id, payload['message'], payload['payload'])
         return True
     else:
         logger.error(f"Failed to add message to conv {conversation_id}.")
@@ -374,9 +384,11 @@ def _add_internal_sb_message(conversation_id: str, message_text: str, bot_user_i
     if isinstance(response_data, dict) and ('id' in response_data or 'message-id' in response_data):
         internal_msg_id = response_data.get('id', response_data.get('message-id', 'N/A'))
         logger.info(f"Internal SB message added successfully (Internal Msg ID: {internal_msg_id}) to conversation {conversation_id}")
+        _record_sent_message(conversation_id, response_data, bot_user_id, message_text)
         return True
     elif response_data is True: # Handle cases where SB API simply returns True for success
          logger.info(f"Internal SB message add attempt reported 'response': True for conversation {conversation_id}, treating as success.")
+         _record_sent_message(conversation_id, response_data, bot_user_id, message_text)
          return True
     else:
         logger.error(f"Failed to add internal SB message to conversation {conversation_id}. API response: {response_data}")
@@ -404,9 +416,14 @@ def log_bot_message_to_support_board(conversation_id: str, message: str) -> bool
     try:
         response = requests.post(api_url, data=payload, timeout=10)
         response.raise_for_status()
-        return True
     except Exception:
         return False
+    try:
+        response_data = response.json().get("response")
+    except (ValueError, AttributeError):
+        response_data = None
+    _record_sent_message(conversation_id, response_data, "0", message)
+    return True
 
 
 # --- NEW PRIVATE HELPER: Send WhatsApp Message DIRECTLY via Meta Cloud API ---
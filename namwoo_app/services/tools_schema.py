@@ -14,12 +14,13 @@ tools_schema: List[Dict[str, Any]] = [
     {
         "type": "function", "function": {
             "name": "find_products",
-            "description": "Searches the product catalog by keyword, SKU, or brand. If 'city' is provided, it filters for stock in that city's stores. Otherwise, it performs a nationwide search.",
+            "description": "Searches the product catalog by keyword, SKU, or brand. If 'city' is provided, it filters for stock in that city's stores. Otherwise, it performs a nationwide search. Returns the most relevant products first; 'has_more' and 'next_page_token' indicate that more results are available.",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "query": {"type": "string", "description": "User's search term (e.g., 'iPhone 15', 'Honor', 'celular 16gb ram')."},
-                    "city": {"type": "string", "description": "Optional. City to check for in-store stock."}
+                    "city": {"type": "string", "description": "Optional. City to check for in-store stock."},
+                    "page_token": {"type": "string", "description": "Optional. The 'next_page_token' of a previous find_products result, to see more products for the same query. Only use it when the user wants more options."}
                 }, "required": ["query"]
             }
         }
@@ -51,6 +52,16 @@ tools_schema: List[Dict[str, Any]] = [
             }
         }
     },
+    {
+        "type": "function", "function": {
+            "name": "get_products_by_skus",
+            "description": "Obtiene en una sola llamada los detalles (precios, variantes, tiendas) de varios productos por su itemCode (SKU), por ejemplo los del carrito. Usar en lugar de varias búsquedas individuales.",
+            "parameters": {"type": "object", "properties": {
+                    "itemCodes": {"type": "array", "items": {"type": "string"}, "description": "Lista de itemCodes (SKU) a consultar."}
+                },"required": ["itemCodes"]
+            }
+        }
+    },
     {
         "type": "function", "function": {
             "name": "query_accessories",
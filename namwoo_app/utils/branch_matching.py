@@ -0,0 +1,103 @@
+# namwoo_app/utils/branch_matching.py
+"""
+Accent-insensitive, fuzzy matching of user-typed branch names against the store directory.
+
+Lookups try, in order: the exact normalized name (O(1) dict hit), whole-word containment
+either way, fuzzy similarity (rapidfuzz when installed, difflib otherwise), and finally
+the name of a city with a single branch. A city hint narrows candidates when any branch
+of that city is known.
+"""
+import difflib
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    from rapidfuzz import fuzz, process as fuzz_process
+except ImportError:  # Optional dependency; difflib is good enough for a few dozen branches.
+    fuzz = None
+    fuzz_process = None
+
+FUZZY_CUTOFF = 85  # 0-100
+_STOPWORDS = {"tienda", "sucursal", "damasco", "almacen", "principal", "sede"}
+_ROMAN = {"i": "1", "ii": "2", "iii": "3", "iv": "4", "v": "5"}
+
+
+def normalize_name(value: Optional[str]) -> str:
+    """'Almacén Principal BARQUISIMETO II' -> 'barquisimeto 2'."""
+    text = unicodedata.normalize("NFKD", str(value or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    tokens = re.sub(r"[^a-z0-9]+", " ", text).split()
+    tokens = [_ROMAN.get(t, t) for t in tokens if t not in _STOPWORDS]
+    return " ".join(tokens)
+
+
+def _contains_words(haystack: str, needle: str) -> bool:
+    return bool(needle) and f" {needle} " in f" {haystack} "
+
+
+class BranchIndex:
+    """
+    Immutable lookup structure over branch records (dicts with at least 'branch_name').
+    Each record is indexed under its normalized branch name and any `aliases` (e.g. whsName).
+    """
+
+    def __init__(self, records: Iterable[Dict[str, Any]]):
+        self.records: List[Dict[str, Any]] = []
+        self._by_key: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            names = [record.get("branch_name")] + list(record.get("aliases") or [])
+            keys = {normalize_name(n) for n in names if n}
+            keys.discard("")
+            if not keys:
+                continue
+            record = dict(record, _keys=sorted(keys, key=len))
+            self.records.append(record)
+            for key in keys:
+                self._by_key.setdefault(key, []).append(record)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @staticmethod
+    def _in_city(candidates: List[Dict[str, Any]], city: Optional[str]) -> List[Dict[str, Any]]:
+        if not city:
+            return candidates
+        city_key = normalize_name(city)
+        in_city = [r for r in candidates if normalize_name(r.get("city")) == city_key]
+        return in_city or candidates
+
+    def match(self, name: str, city: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        key = normalize_name(name)
+        if not key:
+            return None
+
+        exact = self._by_key.get(key)
+        if exact:
+            return self._public(self._in_city(exact, city)[0])
+
+        candidates = self._in_city(self.records, city)
+        contained = [r for r in candidates
+                     if any(_contains_words(k, key) or _contains_words(key, k) for k in r["_keys"])]
+        if contained:
+            # Prefer the branch whose name is closest in length to what was typed.
+            best = min(contained, key=lambda r: (min(abs(len(k) - len(key)) for k in r["_keys"]), r["_keys"][0]))
+            return self._public(best)
+
+        choices = {k: r for r in candidates for k in r["_keys"]}
+        if fuzz_process is not None:
+            found = fuzz_process.extractOne(key, list(choices), scorer=fuzz.WRatio, score_cutoff=FUZZY_CUTOFF)
+            if found:
+                return self._public(choices[found[0]])
+        else:
+            close = difflib.get_close_matches(key, list(choices), n=1, cutoff=FUZZY_CUTOFF / 100)
+            if close:
+                return self._public(choices[close[0]])
+
+        # A city name is an unambiguous answer when that city has a single branch (e.g. 'Maracay' -> ARAGUA).
+        in_city = [r for r in self.records if normalize_name(r.get("city")) == key]
+        return self._public(in_city[0]) if len(in_city) == 1 else None
+
+    @staticmethod
+    def _public(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in record.items() if k != "_keys"}
@@ -174,6 +174,11 @@ def get_conversation_city(conversation_id: str) -> Optional[str]:
     return _conversation_cities.get(conversation_id)
 
 
+def get_warehouse_city_map() -> Dict[str, List[str]]:
+    """Canonical city -> exact warehouse names (`whsName`), as loaded from tiendas_data.json."""
+    return _load_and_process_tiendas_data()
+
+
 def get_city_warehouses(conversation_id: str) -> Optional[List[str]]:
     """
     Gets the list of exact warehouse names (`whsName`) associated with the city
@@ -182,10 +187,14 @@ def get_city_warehouses(conversation_id: str) -> Optional[List[str]]:
     city = get_conversation_city(conversation_id)
     if not city:
         return None
-    
+    return get_warehouses_for_city(city)
+
+
+def get_warehouses_for_city(city: str) -> Optional[List[str]]:
+    """Exact warehouse names (`whsName`) of a user-supplied city name, without touching conversation state."""
     warehouse_map = _load_and_process_tiendas_data()
     # Ensure we use the final canonical name from our logic
-    canonical_city = detect_city_from_text(city) or city
+    canonical_city = detect_city_from_text(city) or city.lower()
     warehouses = warehouse_map.get(canonical_city)
     
     if warehouses:
@@ -0,0 +1,54 @@
+# namwoo_app/utils/customer_info_prefilter.py
+"""
+Cheap local check run before the LLM customer-info extractor.
+
+The extractor only leads somewhere when a single message carries all seven order fields
+(full_name, cedula, telefono, correo, direccion, productos, total). Four of them have a
+recognizable shape: an e-mail address, a Venezuelan phone number, a cédula and an amount.
+A message missing any of those (or too short to also hold a name, an address and the
+products) cannot pass, so the LLM call is skipped.
+
+The check errs on the side of running the extractor: every pattern is permissive, and
+matched spans are blanked before the next check so one number is not counted twice
+(a phone number as a cédula, for instance).
+"""
+import re
+from typing import List
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# 0414-1234567, 04141234567, +58 414 123 45 67, (0212) 555.12.34
+PHONE_RE = re.compile(r"(?<!\d)(?:\+?\s*58[\s.-]*)?\(?0?[24]\d{2}\)?[\s.-]*\d{3}[\s.-]*\d{2}[\s.-]*\d{2}(?!\d)")
+_NUMBER = r"\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+# $150, 150$, 150 usd, Bs. 5.000,00, total: 320, monto 99,90
+AMOUNT_RE = re.compile(
+    rf"(?:(?:\$|us\$|usd|bs\.?|bs\.?s\.?|ref\.?|total|monto|precio|pago)\s*[:=]?\s*(?:{_NUMBER}))"
+    rf"|(?:(?:{_NUMBER})\s*(?:\$|usd|d[oó]lares|bs\b|bol[ií]vares))",
+    re.IGNORECASE,
+)
+# V-12.345.678, E 81234567, CI: 12345678, or a bare 6-9 digit number
+CEDULA_RE = re.compile(r"(?<![\w.,])(?:[VvEe]\s*[-.]?\s*)?(?:\d{1,3}(?:\.\d{3}){1,2}|\d{6,9})(?![\d.,]*\d)")
+_WORD_RE = re.compile(r"[^\W\d_]{2,}")
+
+# Name, address and products have no fixed shape; require at least this many words overall.
+MIN_WORDS = 5
+
+_CHECKS = (("correo", EMAIL_RE), ("telefono", PHONE_RE), ("total", AMOUNT_RE), ("cedula", CEDULA_RE))
+
+
+def missing_fields(text: str) -> List[str]:
+    """Fields the message cannot contain; "texto" stands for name/address/products."""
+    missing: List[str] = []
+    remaining = text or ""
+    for field, pattern in _CHECKS:
+        match = pattern.search(remaining)
+        if match is None:
+            missing.append(field)
+            continue
+        remaining = pattern.sub(" ", remaining)
+    if len(_WORD_RE.findall(remaining)) < MIN_WORDS:
+        missing.append("texto")
+    return missing
+
+
+def could_contain_customer_info(text: str) -> bool:
+    return not missing_fields(text)
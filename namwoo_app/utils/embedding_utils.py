@@ -3,26 +3,14 @@ import time
 from typing import List, Optional
 from openai import OpenAI, APIError, RateLimitError, APITimeoutError
 from ..config import Config
+from . import vector_storage
+from .llm_clients import get_openai_client
 
 logger = logging.getLogger(__name__)
 
-_openai_client = None
-
 def _get_openai_client() -> Optional[OpenAI]:
-    """Initializes and returns the OpenAI client, ensuring API key is set."""
-    global _openai_client
-    if _openai_client is None:
-        api_key = Config.OPENAI_API_KEY
-        if api_key:
-            try:
-                _openai_client = OpenAI(api_key=api_key, timeout=20.0)
-                logger.info("OpenAI client initialized for embedding generation.")
-            except Exception as e:
-                logger.exception(f"Failed to initialize OpenAI client: {e}")
-                _openai_client = None
-        else:
-            logger.error("OpenAI API key not configured. Embedding generation will fail.")
-    return _openai_client
+    """Returns the shared OpenAI client (see llm_clients), or None if no API key is set."""
+    return get_openai_client(timeout=20.0)
 
 def get_embedding(
     text: str,
@@ -63,7 +51,8 @@ def get_embedding(
         try:
             response = client.embeddings.create(
                 input=[processed_text],
-                model=model
+                model=model,
+                **vector_storage.embedding_request_kwargs(model, Config.EMBEDDING_DIMENSION)
             )
             embedding = response.data[0].embedding
             logger.debug(f"Generated embedding for text: '{processed_text[:50]}...'")
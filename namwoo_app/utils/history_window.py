@@ -0,0 +1,145 @@
+# namwoo_app/utils/history_window.py
+"""
+Token-bounded conversation history for chat completions.
+
+Messages are grouped into units that are kept or dropped as a whole: an assistant
+message with `tool_calls` together with the `tool` results answering it, or any other
+single message. Units whose calls have no results (or results without their call) are
+discarded, since the API rejects them. The newest units are kept while they fit the token
+budget; older ones are condensed into an extractive "rolling memory" (user requests,
+assistant answers and tool calls, one short line each) that fits its own small budget.
+
+Token counting is injected (`count`), so callers decide between tiktoken and an estimate.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Message = Dict[str, Any]
+
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators per message in the chat format
+MEMORY_HEADER = "Resumen de la conversación anterior (mensajes más antiguos, abreviados):"
+_MEMORY_LINE_CHARS = 160
+
+
+def group_messages(messages: List[Message]) -> List[List[Message]]:
+    """Splits history into atomic units; incomplete tool-call units are dropped."""
+    units: List[List[Message]] = []
+    i = 0
+    while i < len(messages):
+        message = messages[i]
+        if message.get("role") == "tool":
+            i += 1  # Result without its call
+            continue
+        if message.get("role") != "assistant" or not message.get("tool_calls"):
+            units.append([message])
+            i += 1
+            continue
+        expected = {call.get("id") for call in message["tool_calls"]}
+        unit, i = [message], i + 1
+        while i < len(messages) and messages[i].get("role") == "tool":
+            unit.append(messages[i])
+            i += 1
+        if {m.get("tool_call_id") for m in unit[1:]} >= expected:
+            units.append([unit[0]] + [m for m in unit[1:] if m.get("tool_call_id") in expected])
+    return units
+
+
+def message_tokens(message: Message, count: Callable[[str], int]) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + count(message.get("content") or "")
+    for call in message.get("tool_calls") or []:
+        function = call.get("function") or {}
+        tokens += count(function.get("name") or "") + count(function.get("arguments") or "")
+    return tokens
+
+
+def build_window(
+    messages: List[Message],
+    budget_tokens: int,
+    count: Callable[[str], int],
+    memory_budget_tokens: int = 0,
+) -> Tuple[List[Message], Optional[str], int]:
+    """
+    Returns (kept messages, rolling memory text or None, tokens of the kept messages).
+    The newest unit is always kept, with an over-long text message cut to the budget.
+    """
+    units = group_messages(messages)
+    kept: List[List[Message]] = []
+    used = 0
+    for index in range(len(units) - 1, -1, -1):
+        unit = units[index]
+        size = sum(message_tokens(m, count) for m in unit)
+        if used + size > budget_tokens:
+            if kept:
+                dropped = units[:index + 1]
+                break
+            unit = [_truncate(m, budget_tokens, count) for m in unit]
+            size = sum(message_tokens(m, count) for m in unit)
+        kept.append(unit)
+        used += size
+    else:
+        dropped = []
+
+    window = [m for unit in reversed(kept) for m in unit]
+    memory = summarize(dropped, memory_budget_tokens, count) if dropped and memory_budget_tokens > 0 else None
+    return window, memory, used
+
+
+def summarize(units: List[List[Message]], budget_tokens: int, count: Callable[[str], int]) -> Optional[str]:
+    """One line per user/assistant message or tool call, newest lines kept first."""
+    lines: List[str] = []
+    for unit in units:
+        for message in unit:
+            line = _memory_line(message)
+            if line:
+                lines.append(line)
+    used = count(MEMORY_HEADER)
+    selected: List[str] = []
+    for line in reversed(lines):
+        size = count(line) + 1
+        if used + size > budget_tokens:
+            break
+        selected.append(line)
+        used += size
+    if not selected:
+        return None
+    return "\n".join([MEMORY_HEADER] + list(reversed(selected)))
+
+
+def _memory_line(message: Message) -> Optional[str]:
+    role = message.get("role")
+    if role == "assistant" and message.get("tool_calls"):
+        calls = []
+        for call in message["tool_calls"]:
+            function = call.get("function") or {}
+            calls.append(f"{function.get('name')}({_compact_args(function.get('arguments'))})")
+        return _shorten("- Herramientas: " + "; ".join(calls))
+    text = " ".join(str(message.get("content") or "").split())
+    if not text or role == "tool":
+        return None
+    label = "Cliente" if role == "user" else "Asistente"
+    return _shorten(f"- {label}: {text}")
+
+
+def _compact_args(arguments: Optional[str]) -> str:
+    try:
+        parsed = json.loads(arguments or "{}")
+    except (TypeError, ValueError):
+        return str(arguments or "")
+    if not isinstance(parsed, dict):
+        return str(parsed)
+    return ", ".join(f"{k}={v}" for k, v in parsed.items() if v not in (None, "", []))
+
+
+def _shorten(line: str) -> str:
+    return line if len(line) <= _MEMORY_LINE_CHARS else line[:_MEMORY_LINE_CHARS - 1].rstrip() + "…"
+
+
+def _truncate(message: Message, budget_tokens: int, count: Callable[[str], int]) -> Message:
+    content = message.get("content")
+    if not isinstance(content, str) or message_tokens(message, count) <= budget_tokens:
+        return message
+    # Shrink proportionally until it fits; a couple of passes is enough for real tokenizers.
+    while content and message_tokens(dict(message, content=content), count) > budget_tokens:
+        ratio = budget_tokens / message_tokens(dict(message, content=content), count)
+        content = content[:max(0, int(len(content) * ratio * 0.95) - 1)]
+    return dict(message, content=content + "…")
@@ -0,0 +1,49 @@
+# namwoo_app/utils/intent_rules.py
+"""
+Deterministic recognition of trivial customer messages.
+
+`classify(text)` returns "greeting", "thanks" or "sku" when the *whole* message is one of
+those (after case/accent/punctuation/emoji folding), otherwise None. Anything with more
+content ("hola, busco un celular", "no, gracias") is left to the LLM.
+"""
+import re
+import unicodedata
+from typing import Optional
+
+GREETING_RE = re.compile(
+    r"(?:hola+|ola|holis|buenas|buen dia|buenos dias|buenas tardes|buenas noches|saludos|hey|hi|hello)"
+    r"(?: (?:hola+|buenas|buen dia|buenos dias|buenas tardes|buenas noches|saludos|que tal|como estas|como esta))*"
+)
+THANKS_RE = re.compile(
+    r"(?:ok |okey |okay |listo |perfecto |excelente |genial |vale )?"
+    r"(?:gracias|muchas gracias|mil gracias|muchisimas gracias|gracias mil|thank you|thanks)"
+    r"(?: (?:por todo|por la informacion|por la info|por tu ayuda|por su ayuda|amigo|amiga|hermano))?"
+)
+# Damasco item codes: one token of letters/digits (with . - / _), at least three digits.
+ITEM_CODE_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9._\-/]{3,31}")
+_MIN_CODE_DIGITS = 3
+
+
+def fold(text: str) -> str:
+    """Lower-cases, strips accents and keeps only letters, digits and single spaces."""
+    text = unicodedata.normalize("NFKD", str(text or "")).casefold()
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^\w\s]|_", " ", text).split())
+
+
+def looks_like_item_code(text: str) -> bool:
+    token = str(text or "").strip()
+    return bool(ITEM_CODE_RE.fullmatch(token)) and sum(ch.isdigit() for ch in token) >= _MIN_CODE_DIGITS
+
+
+def classify(text: str) -> Optional[str]:
+    if looks_like_item_code(text):
+        return "sku"
+    folded = fold(text)
+    if not folded:
+        return None
+    if GREETING_RE.fullmatch(folded):
+        return "greeting"
+    if THANKS_RE.fullmatch(folded):
+        return "thanks"
+    return None
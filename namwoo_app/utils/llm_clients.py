@@ -0,0 +1,100 @@
+# namwoo_app/utils/llm_clients.py
+"""
+Process-wide OpenAI-compatible clients sharing one pooled HTTP client.
+
+Every caller (chat/assistant/Gemini providers, embeddings, summarization, customer-info
+extraction) gets its client from `get_openai_client()`. All of them share a single
+httpx.Client, so keep-alive connections (HTTP/2 when the `h2` package is installed) are
+reused across messages instead of paying a TLS handshake per request. Clients are cached
+per (api_key, base_url, timeout); different timeouts are `with_options` copies over the
+same connection pool.
+
+The registry is rebuilt after a fork (gunicorn/Celery prefork workers), since sockets must
+not be shared between processes.
+"""
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import OpenAI
+
+from ..config import Config
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2)
+    _HTTP2_AVAILABLE = True
+except ImportError:  # Optional dependency; HTTP/1.1 keep-alive still avoids per-message handshakes.
+    _HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pid: Optional[int] = None
+_http_client: Optional[httpx.Client] = None
+_base_clients: Dict[Tuple[str, Optional[str]], OpenAI] = {}
+_clients: Dict[Tuple[str, Optional[str], float], OpenAI] = {}
+
+
+def _build_http_client() -> httpx.Client:
+    http2 = Config.LLM_HTTP2 and _HTTP2_AVAILABLE
+    client = httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=Config.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=Config.LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(Config.OPENAI_REQUEST_TIMEOUT, connect=Config.LLM_HTTP_CONNECT_TIMEOUT),
+        follow_redirects=True,
+    )
+    logger.info(f"Shared LLM HTTP client created (http2={http2}, max_connections={Config.LLM_HTTP_MAX_CONNECTIONS}).")
+    return client
+
+
+def _reset_after_fork() -> None:
+    global _pid, _http_client
+    if _pid != os.getpid():
+        _pid, _http_client = os.getpid(), None
+        _base_clients.clear()
+        _clients.clear()
+
+
+def get_openai_client(
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> Optional[OpenAI]:
+    """Shared client for `api_key` (default OPENAI_API_KEY) and `base_url`; None without a key."""
+    api_key = api_key or Config.OPENAI_API_KEY
+    if not api_key:
+        logger.error("No API key configured; LLM client unavailable.")
+        return None
+    timeout = float(timeout or Config.OPENAI_REQUEST_TIMEOUT)
+    key = (api_key, base_url, timeout)
+    with _lock:
+        _reset_after_fork()
+        client = _clients.get(key)
+        if client is None:
+            global _http_client
+            if _http_client is None:
+                _http_client = _build_http_client()
+            base = _base_clients.get((api_key, base_url))
+            if base is None:
+                base = _base_clients[(api_key, base_url)] = OpenAI(
+                    api_key=api_key, base_url=base_url, http_client=_http_client, max_retries=Config.LLM_MAX_RETRIES,
+                )
+            client = _clients[key] = base.with_options(timeout=timeout)
+        return client
+
+
+def close_all() -> None:
+    """Closes the shared connection pool (tests, graceful shutdown)."""
+    global _http_client
+    with _lock:
+        if _http_client is not None and _pid == os.getpid():
+            _http_client.close()
+        _http_client = None
+        _base_clients.clear()
+        _clients.clear()
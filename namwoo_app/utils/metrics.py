@@ -0,0 +1,50 @@
+# namwoo_app/utils/metrics.py
+"""
+Process-independent counters kept in a single Redis hash so that web workers and
+Celery workers report into the same place. Exposed through GET /api/metrics.
+Counter failures are logged and never raised; metrics must not break a request.
+"""
+import logging
+from typing import Dict
+
+from ..extensions import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = "namwoo:metrics"
+
+
+def incr(name: str, amount: int = 1) -> None:
+    try:
+        get_redis_client().hincrby(METRICS_KEY, name, amount)
+    except Exception as e:
+        logger.debug(f"Could not increment metric '{name}': {e}")
+
+
+def snapshot() -> Dict[str, int]:
+    try:
+        raw = get_redis_client().hgetall(METRICS_KEY) or {}
+    except Exception as e:
+        logger.error(f"Could not read metrics from Redis: {e}")
+        return {}
+    return {
+        (k.decode() if isinstance(k, bytes) else k): int(v)
+        for k, v in raw.items()
+    }
+
+
+def ratio(counters: Dict[str, int], hits_name: str, misses_name: str) -> float:
+    """hits / (hits + misses), 0.0 when nothing was recorded yet."""
+    hits, misses = counters.get(hits_name, 0), counters.get(misses_name, 0)
+    return round(hits / (hits + misses), 4) if hits + misses else 0.0
+
+
+def averages(counters: Dict[str, int]) -> Dict[str, float]:
+    """Average of every `<name>_ms_total` counter over its `<name>_count`."""
+    result: Dict[str, float] = {}
+    for name, total in counters.items():
+        if name.endswith("_ms_total"):
+            count = counters.get(name[:-len("_ms_total")] + "_count", 0)
+            if count:
+                result[name[:-len("_ms_total")]] = round(total / count, 1)
+    return result
@@ -1,6 +1,7 @@
 # namwoo_app/utils/product_utils.py
 import re
-from typing import Optional, Any
+import hashlib
+from typing import Optional, Any, Tuple
 import unicodedata # For a basic unaccent equivalent
 import logging # Optional: for logging issues within these utils
 
@@ -34,6 +35,46 @@ def generate_product_location_id(item_code_raw: Any, whs_name_raw: Any) -> Optio
 
     return f"{item_code}_{sanitized_whs}"[:512]
 
+def generate_content_hash(text: Any) -> Optional[str]:
+    """Return the SHA-256 hex digest of the normalized text, or ``None`` if empty.
+
+    Used as the change detector for ``product_embeddings``: an item is only
+    re-embedded when the hash of its searchable text changes.
+    """
+    normalized = " ".join(_normalize_raw_input_to_str(text).split())
+    if not normalized:
+        return None
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+_SKU_PAT = re.compile(r'\b(SM-[A-Z0-9]+[A-Z]*|[A-Z0-9]{8,})\b')
+_KNOWN_COLORS = {
+    'negro', 'blanco', 'azul', 'rojo', 'verde', 'gris', 'plata', 'dorado',
+    'rosado', 'violeta', 'morado', 'amarillo', 'naranja', 'marrón', 'beige',
+    'celeste', 'turquesa', 'lila', 'crema', 'grafito', 'titanio', 'cobre',
+    'negra', 'blanca', 'claro', 'oscuro', 'marino'
+}
+
+def split_base_name_and_color(item_name: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Split an item name into (base name without SKU, capitalized trailing color or ``None``).
+
+    Trailing words found in the known color list form the color; everything before
+    them is the base name. Computed once at ingestion and stored on ``products``.
+    """
+    if not item_name: return "", None
+    name_without_sku = _SKU_PAT.sub('', item_name).strip()
+    words = name_without_sku.split()
+    base_parts, color_parts = [], []
+    found_color = False
+    for w in reversed(words):
+        if not found_color and w.lower() in _KNOWN_COLORS:
+            color_parts.insert(0, w)
+        else:
+            found_color = True
+            base_parts.insert(0, w)
+    base = " ".join(base_parts).strip()
+    color = " ".join(color_parts).strip()
+    return (base or name_without_sku, color.capitalize() if color else None)
+
 def python_equivalent_of_canonicalize_whs(original_warehouse_name: Optional[str]) -> str:
     """
     Python equivalent of the PostgreSQL function `public.canonicalize_whs(text)`.
@@ -0,0 +1,132 @@
+# namwoo_app/utils/query_parser.py
+"""
+Query understanding for product search, computed once per distinct query.
+
+`parse_query()` folds case and accents and extracts everything the find_products
+stages need (category, spec filters, SKU candidate) into an immutable ParsedQuery.
+Results are memoized in an LRU keyed by the folded text, so the model repeating,
+re-casing or re-accenting a query costs a dict lookup. Brand detection depends on the
+live catalog and stays in catalog_index_service (memoized there per catalog version).
+"""
+import re
+import time
+import unicodedata
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..config import Config
+from . import spec_parser
+
+CATEGORY_KEYWORDS = {
+    'CELULAR': ['celular', 'celulares', 'teléfono', 'telefonos', 'smartphone'],
+    'TABLET': ['tablet', 'tablets'],
+    'LAPTOP': ['laptop', 'laptops', 'portátil', 'portatiles'],
+    'TELEVISOR': ['televisor', 'televisores', 'tv', 'pantalla'],
+}
+
+# Item codes are a single token with at least one digit (e.g. 'D0008141', 'SM-A155M').
+_SKU_CANDIDATE = re.compile(r"[A-Za-z0-9][A-Za-z0-9._\-/]{2,63}")
+
+
+def fold(text: Optional[str]) -> str:
+    """NFKD accent folding, case folding and whitespace collapsing."""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return " ".join(text.split())
+
+
+_FOLDED_CATEGORY_KEYWORDS = {
+    category: tuple(fold(k) for k in keywords) for category, keywords in CATEGORY_KEYWORDS.items()
+}
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    raw: str                                   # Stripped query as received (brand match, embedding)
+    key: str                                   # Folded text; used for cache keys and page tokens
+    category: Optional[str]                    # CATEGORY_KEYWORDS key
+    spec_filters: Tuple[spec_parser.SpecFilter, ...]
+    sku_candidate: Optional[str]               # Folded query when it looks like an item code
+
+
+def _detect_category(folded: str) -> Optional[str]:
+    for category, keywords in _FOLDED_CATEGORY_KEYWORDS.items():
+        if any(keyword in folded for keyword in keywords):
+            return category
+    return None
+
+
+def _sku_candidate(text: str) -> Optional[str]:
+    # The SKU stage compares lower(item_code), so the folded text matches as well as the raw one.
+    if _SKU_CANDIDATE.fullmatch(text) and any(ch.isdigit() for ch in text):
+        return text
+    return None
+
+
+def _parse_folded(folded: str) -> ParsedQuery:
+    return ParsedQuery(
+        raw=folded,
+        key=folded,
+        category=_detect_category(folded),
+        spec_filters=tuple(spec_parser.parse_query_filters(folded)),
+        sku_candidate=_sku_candidate(folded),
+    )
+
+
+@lru_cache(maxsize=Config.QUERY_PARSE_CACHE_SIZE)
+def _parse_cached(folded: str) -> ParsedQuery:
+    return _parse_folded(folded)
+
+
+def _with_raw(parsed: ParsedQuery, stripped: str) -> ParsedQuery:
+    return parsed if parsed.raw == stripped else replace(parsed, raw=stripped)
+
+
+def parse_uncached(query: str) -> ParsedQuery:
+    stripped = str(query or "").strip()
+    return _with_raw(_parse_folded(fold(stripped)), stripped)
+
+
+def parse_query(query: str) -> ParsedQuery:
+    """Memoized parse_uncached(); queries that fold to the same text share one cache entry."""
+    stripped = str(query or "").strip()
+    return _with_raw(_parse_cached(fold(stripped)), stripped)
+
+
+def cache_info() -> Dict[str, int]:
+    info = _parse_cached.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+def benchmark(queries: Iterable[str], rounds: int = 5) -> Dict[str, Any]:
+    """
+    Times parse_uncached() against parse_query() over a corpus replayed `rounds` times
+    (the cache is cleared first, so round one pays the misses).
+    """
+    corpus = [q for q in queries if q and q.strip()]
+    if not corpus:
+        return {"queries": 0}
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for q in corpus:
+            parse_uncached(q)
+    uncached = time.perf_counter() - started
+
+    _parse_cached.cache_clear()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for q in corpus:
+            parse_query(q)
+    cached = time.perf_counter() - started
+
+    calls = len(corpus) * rounds
+    return {
+        "queries": len(corpus),
+        "distinct_queries": len(set(fold(q) for q in corpus)),
+        "rounds": rounds,
+        "uncached_us_per_query": round(1e6 * uncached / calls, 2),
+        "cached_us_per_query": round(1e6 * cached / calls, 2),
+        "speedup": round(uncached / cached, 1) if cached else None,
+        "cache": cache_info(),
+    }
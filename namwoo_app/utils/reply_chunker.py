@@ -0,0 +1,73 @@
+# namwoo_app/utils/reply_chunker.py
+"""
+Splits a streamed assistant reply into channel messages as it is generated.
+
+Tokens are buffered until at least `min_chars` have accumulated and a paragraph break or
+the end of a sentence arrives; everything up to the last such boundary is released as one
+message. Line breaks inside a paragraph are not boundaries, so product lists stay in one
+message. Messages never exceed `max_chars` (the platform limit); an over-long paragraph is
+cut at its last line break, then at its last space.
+"""
+import re
+from typing import List, Optional
+
+# Characters per message accepted by each channel (Support Board source codes).
+PLATFORM_MAX_CHARS = {"wa": 4096, "fb": 2000, "ig": 1000}
+DEFAULT_MAX_CHARS = 4000
+
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+# ". ", "! ", "? " followed by the start of a new sentence on the same line; "1. " list markers excluded.
+_SENTENCE_END = re.compile(r"(?<!\d)[.!?…]+[\"')»]*[ \t]+(?=[¿¡\"«A-ZÁÉÍÓÚÑ])")
+
+
+def max_chars_for(source: Optional[str]) -> int:
+    return PLATFORM_MAX_CHARS.get((source or "").strip().lower(), DEFAULT_MAX_CHARS)
+
+
+class SentenceChunker:
+    def __init__(self, min_chars: int = 200, max_chars: int = DEFAULT_MAX_CHARS):
+        self.max_chars = max(1, max_chars)
+        self.min_chars = max(0, min(min_chars, self.max_chars))
+        self._buffer = ""
+
+    def feed(self, delta: Optional[str]) -> List[str]:
+        """Adds streamed text; returns the messages that are ready to send."""
+        if delta:
+            self._buffer += delta
+        ready: List[str] = []
+        while True:
+            cut = self._next_cut()
+            if cut is None:
+                return ready
+            chunk, self._buffer = self._buffer[:cut].strip(), self._buffer[cut:]
+            if chunk:
+                ready.append(chunk)
+
+    def flush(self) -> List[str]:
+        """Releases whatever is left once the stream has ended."""
+        ready = self.feed(None)
+        while self._buffer.strip():
+            cut = self._forced_cut() if len(self._buffer) > self.max_chars else len(self._buffer)
+            chunk, self._buffer = self._buffer[:cut].strip(), self._buffer[cut:]
+            if chunk:
+                ready.append(chunk)
+        self._buffer = ""
+        return ready
+
+    def _next_cut(self) -> Optional[int]:
+        boundaries = [m.end() for m in _PARAGRAPH_BREAK.finditer(self._buffer)]
+        boundaries += [m.end() for m in _SENTENCE_END.finditer(self._buffer)]
+        eligible = [b for b in boundaries if len(self._buffer[:b].strip()) >= self.min_chars and b <= self.max_chars]
+        if eligible:
+            return max(eligible)
+        if len(self._buffer) > self.max_chars:
+            return self._forced_cut()
+        return None
+
+    def _forced_cut(self) -> int:
+        window = self._buffer[:self.max_chars]
+        for separator in ("\n", " "):
+            position = window.rfind(separator)
+            if position > 0:
+                return position + 1
+        return self.max_chars
@@ -0,0 +1,147 @@
+# namwoo_app/utils/search_cache.py
+"""
+Redis-backed cache for product search results.
+
+Keys embed the current catalog version, so bumping the version after an ingestion
+commit makes every older entry unreachable at once (they then expire through the TTL).
+Concurrent identical lookups are coalesced with a short-lived Redis lock: the first
+caller computes and stores the result, the others poll for it. The lock holds a token
+unique to its owner and is released with a compare-and-delete, so an owner whose lock
+expired mid-compute never deletes the lock a later caller has taken.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+import uuid
+from typing import Any, Callable, Iterable, Optional
+
+from ..config import Config
+from ..extensions import get_redis_client
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = "catalog:version"
+_KEY_PREFIX = "find_products"
+_POLL_INTERVAL_SECONDS = 0.05
+# Deletes KEYS[1] only while it still holds this caller's token.
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Case-folds, NFKC-normalizes and collapses whitespace; accents are kept."""
+    text = unicodedata.normalize("NFKC", str(query or "")).casefold()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def get_catalog_version() -> int:
+    try:
+        return int(get_redis_client().get(CATALOG_VERSION_KEY) or 0)
+    except Exception as e:
+        logger.warning(f"Could not read catalog version: {e}")
+        return 0
+
+
+def bump_catalog_version() -> Optional[int]:
+    """Invalidates every cached search. Call after committing catalog changes."""
+    try:
+        version = int(get_redis_client().incr(CATALOG_VERSION_KEY))
+        logger.info(f"Catalog version bumped to {version}; cached searches invalidated.")
+        return version
+    except Exception as e:
+        logger.error(f"Could not bump catalog version: {e}")
+        return None
+
+
+def build_key(query: str, warehouse_names: Optional[Iterable[str]], version: int, page: str = "") -> str:
+    warehouses = "|".join(sorted(set(warehouse_names or [])))
+    digest = hashlib.sha256(f"{normalize_query(query)}\x1f{warehouses}\x1f{page}".encode("utf-8")).hexdigest()
+    return f"{_KEY_PREFIX}:v{version}:{digest}"
+
+
+def _load(redis_client, key: str) -> Optional[Any]:
+    raw = redis_client.get(key)
+    return json.loads(raw) if raw is not None else None
+
+
+def _is_cacheable(result: Any) -> bool:
+    # None signals a DB failure and 'error' a bad request; neither should be replayed.
+    return isinstance(result, dict) and result.get("status") != "error"
+
+
+def cached_search(
+    query: str,
+    warehouse_names: Optional[Iterable[str]],
+    compute: Callable[[], Any],
+    page: str = "",
+) -> Any:
+    """
+    Returns the cached result for (query, warehouse set, page) under the current catalog
+    version, computing it once via `compute()` on a miss. Any Redis failure falls
+    back to calling `compute()` directly.
+    """
+    if not Config.FIND_PRODUCTS_CACHE_ENABLED:
+        return compute()
+
+    try:
+        redis_client = get_redis_client()
+        key = build_key(query, warehouse_names, get_catalog_version(), page)
+        cached = _load(redis_client, key)
+    except Exception as e:
+        logger.warning(f"Search cache unavailable, running uncached: {e}")
+        return compute()
+
+    if cached is not None:
+        metrics.incr("find_products_cache_hits")
+        return cached
+    metrics.incr("find_products_cache_misses")
+
+    lock_key = f"{key}:lock"
+    lock_token = uuid.uuid4().hex
+    lock_timeout = Config.FIND_PRODUCTS_CACHE_LOCK_TIMEOUT
+    try:
+        have_lock = bool(redis_client.set(lock_key, lock_token, nx=True, px=int(lock_timeout * 1000)))
+    except Exception as e:
+        logger.warning(f"Search cache lock failed, running uncached: {e}")
+        return compute()
+
+    if not have_lock:
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(_POLL_INTERVAL_SECONDS)
+            try:
+                cached = _load(redis_client, key)
+                if cached is not None:
+                    metrics.incr("find_products_cache_coalesced")
+                    return cached
+                if not redis_client.exists(lock_key):
+                    break  # Owner finished without caching (e.g. an error result); compute ourselves.
+            except Exception:
+                break
+        return compute()
+
+    try:
+        # Double check: another worker may have stored the result between our GET and SET NX.
+        cached = _load(redis_client, key)
+        if cached is not None:
+            return cached
+        result = compute()
+        if _is_cacheable(result):
+            try:
+                redis_client.set(key, json.dumps(result, ensure_ascii=False), ex=Config.FIND_PRODUCTS_CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"Could not store search result in cache: {e}")
+        return result
+    finally:
+        try:
+            redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, lock_token)
+        except Exception as e:
+            logger.warning(f"Could not release search cache lock (it expires on its own): {e}")
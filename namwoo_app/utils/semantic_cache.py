@@ -0,0 +1,224 @@
+# namwoo_app/utils/semantic_cache.py
+"""
+Semantic cache of FAQ-style replies for the chat provider.
+
+A reply is stored only for turns that answered the customer without calling a tool and
+without a reservation in progress, i.e. answers that came from the system prompt alone
+(store hours, payment methods, delivery, Cashea). Both storing and serving also require a
+conversation without earlier context: no tool calls or results and no earlier customer
+message other than a greeting or thanks, so neither the reply nor the question depends on
+earlier turns or carries the customer's data. A later message whose embedding is at
+least SEMANTIC_CACHE_THRESHOLD cosine-similar to a stored question gets the stored reply.
+
+SEMANTIC_CACHE_MODE:
+    off     nothing is embedded, stored or served
+    shadow  replies are stored and would-be hits are logged (and counted), never served
+    on      hits are served
+
+Entries live in Redis under a namespace derived from the system prompt, the tool schema and
+the chat/embedding models, so editing the prompt makes every older entry unreachable (they
+expire through SEMANTIC_CACHE_TTL). Each `SemanticCache` keeps the namespace's vectors in
+memory as a normalized matrix and rebuilds it when the namespace version changes or its
+oldest entry passes SEMANTIC_CACHE_TTL, so expired entries are never served.
+
+The module has no app imports: settings (the Config class), the Redis client, the embedding
+function, the query normalizer, the metrics counter and the greeting/thanks test are passed
+to `SemanticCache`.
+"""
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "semcache"
+_EMBED_CACHE_SIZE = 512
+
+
+@dataclass(frozen=True)
+class Match:
+    similarity: float
+    question: str
+    answer: str
+
+
+def _keys(ns: str) -> Tuple[str, str]:
+    return f"{_KEY_PREFIX}:{ns}:entries", f"{_KEY_PREFIX}:{ns}:version"
+
+
+def clear(client) -> int:
+    """Deletes every namespace; returns the number of Redis keys removed."""
+    keys: List[Any] = list(client.scan_iter(match=f"{_KEY_PREFIX}:*"))
+    return int(client.delete(*keys)) if keys else 0
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        settings: Any,
+        get_client: Callable[[], Any],
+        embed: Callable[[str], Optional[List[float]]],
+        normalize: Callable[[str], str],
+        incr: Callable[[str], None] = lambda name: None,
+        is_trivial: Callable[[str], bool] = lambda text: False,
+    ):
+        self.settings = settings
+        self._get_client = get_client
+        self._embed_text = embed
+        self._normalize = normalize
+        self._incr = incr
+        self._is_trivial = is_trivial
+        self._embed = lru_cache(maxsize=_EMBED_CACHE_SIZE)(self._embed_uncached)
+        self._lock = threading.Lock()
+        self._index: Dict[str, Any] = {"namespace": None, "version": None, "ids": [], "entries": [],
+                                       "expired": [], "matrix": None, "oldest": None}
+
+    def mode(self) -> str:
+        value = (self.settings.SEMANTIC_CACHE_MODE or "off").lower()
+        return value if value in ("shadow", "on") else "off"
+
+    def namespace(self, system_prompt: str, tools: Any, model: str) -> str:
+        """Changes whenever anything that shapes an answer changes."""
+        material = json.dumps([system_prompt, tools, model, self.settings.OPENAI_EMBEDDING_MODEL],
+                              sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+    def is_eligible(
+        self,
+        message: Optional[str],
+        reservation_context: Optional[Dict[str, Any]],
+        history: Sequence[Dict[str, Any]] = (),
+    ) -> bool:
+        """`history` is the conversation in chat-completions form; it may end with `message` itself."""
+        if self.mode() == "off" or not message or reservation_context:
+            return False
+        text = self._normalize(message)
+        # Very short messages ("sí", "y en Valencia?") are follow-ups whose answer depends on the conversation.
+        if not (len(text) <= self.settings.SEMANTIC_CACHE_MAX_QUERY_CHARS
+                and len(text.split()) >= self.settings.SEMANTIC_CACHE_MIN_WORDS):
+            return False
+        return not self._has_prior_context(message, history)
+
+    def _has_prior_context(self, message: str, history: Sequence[Dict[str, Any]]) -> bool:
+        prior = list(history)
+        if prior and prior[-1].get("role") == "user" and (prior[-1].get("content") or "").strip() == message.strip():
+            prior.pop()
+        for msg in prior:
+            if msg.get("role") == "tool" or msg.get("tool_calls"):
+                return True
+            if msg.get("role") == "user" and not self._is_trivial(msg.get("content") or ""):
+                return True
+        return False
+
+    def _embed_uncached(self, text: str) -> np.ndarray:
+        vector = self._embed_text(text)
+        if not vector:
+            raise ValueError("embedding unavailable")  # Not cached by lru_cache
+        array = np.asarray(vector, dtype=np.float32)
+        return array / (np.linalg.norm(array) or 1.0)
+
+    def _load_index(self, client, ns: str) -> Dict[str, Any]:
+        """
+        The namespace's live entries; after a version change only entries not yet in memory are
+        fetched. An unchanged index is rebuilt (from memory) once its oldest entry has expired.
+        """
+        entries_key, version_key = _keys(ns)
+        version = client.get(version_key)
+        with self._lock:
+            oldest = self._index["oldest"]
+            fresh = oldest is None or time.time() - oldest <= self.settings.SEMANTIC_CACHE_TTL
+            if self._index["namespace"] == ns and self._index["version"] == version and fresh:
+                return self._index
+            known = dict(zip(self._index["ids"], self._index["entries"])) if self._index["namespace"] == ns else {}
+        current_ids = list(client.hkeys(entries_key) or [])
+        new_ids = [entry_id for entry_id in current_ids if entry_id not in known]
+        if new_ids:
+            for entry_id, raw in zip(new_ids, client.hmget(entries_key, new_ids)):
+                if raw is not None:
+                    known[entry_id] = json.loads(raw)
+        now = time.time()
+        ids, entries, expired = [], [], []
+        for entry_id in current_ids:
+            entry = known.get(entry_id)
+            if entry is None:
+                continue
+            if now - entry.get("created_at", 0) > self.settings.SEMANTIC_CACHE_TTL:
+                expired.append(entry_id)
+                continue
+            if "array" not in entry:
+                entry["array"] = np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32)
+            ids.append(entry_id)
+            entries.append(entry)
+        with self._lock:
+            self._index.update(namespace=ns, version=version, ids=ids, entries=entries, expired=expired,
+                               matrix=np.vstack([e["array"] for e in entries]) if entries else None,
+                               oldest=min((e.get("created_at", 0) for e in entries), default=None))
+            return self._index
+
+    @staticmethod
+    def _best_match(index: Dict[str, Any], vector: np.ndarray) -> Optional[Match]:
+        if index["matrix"] is None or index["matrix"].shape[1] != vector.shape[0]:
+            return None
+        scores = index["matrix"] @ vector
+        best = int(np.argmax(scores))
+        entry = index["entries"][best]
+        return Match(similarity=float(scores[best]), question=entry["question"], answer=entry["answer"])
+
+    def lookup(self, message: str, ns: str, sb_conversation_id: str = "") -> Optional[str]:
+        """The cached reply to serve (mode "on" only); shadow hits are logged and counted."""
+        try:
+            vector = self._embed(self._normalize(message))
+            match = self._best_match(self._load_index(self._get_client(), ns), vector)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed for Conv {sb_conversation_id}: {e}")
+            return None
+        if match is None or match.similarity < self.settings.SEMANTIC_CACHE_THRESHOLD:
+            self._incr("semantic_cache_misses")
+            return None
+        if self.mode() == "shadow":
+            self._incr("semantic_cache_shadow_hits")
+            logger.info(f"Semantic cache would hit for Conv {sb_conversation_id} (similarity {match.similarity:.3f}): "
+                        f"'{message[:80]}' ~ '{match.question[:80]}'")
+            return None
+        self._incr("semantic_cache_hits")
+        logger.info(f"Semantic cache hit for Conv {sb_conversation_id} (similarity {match.similarity:.3f}).")
+        return match.answer
+
+    def store(self, message: str, answer: str, ns: str) -> None:
+        """Caches `answer` unless an equivalent question is already cached or the namespace is full."""
+        if not answer:
+            return
+        question = self._normalize(message)
+        try:
+            vector = self._embed(question)
+            client = self._get_client()
+            index = self._load_index(client, ns)
+            match = self._best_match(index, vector)
+            if match is not None and match.similarity >= self.settings.SEMANTIC_CACHE_THRESHOLD:
+                return
+            if len(index["ids"]) >= self.settings.SEMANTIC_CACHE_MAX_ENTRIES:
+                logger.debug(f"Semantic cache namespace {ns} is full; not storing.")
+                return
+            entries_key, version_key = _keys(ns)
+            entry = {"question": question, "answer": answer, "created_at": time.time(),
+                     "vector": base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")}
+            pipe = client.pipeline()
+            if index["expired"]:
+                pipe.hdel(entries_key, *index["expired"])
+            pipe.hset(entries_key, uuid.uuid4().hex, json.dumps(entry, ensure_ascii=False))
+            pipe.incr(version_key)
+            pipe.expire(entries_key, self.settings.SEMANTIC_CACHE_TTL)
+            pipe.expire(version_key, self.settings.SEMANTIC_CACHE_TTL)
+            pipe.execute()
+            self._incr("semantic_cache_stores")
+        except Exception as e:
+            logger.warning(f"Could not store semantic cache entry: {e}")
@@ -0,0 +1,199 @@
+# namwoo_app/utils/spec_parser.py
+"""
+Typed product attributes parsed from `specifitacion` / `item_name`, and structured
+filters parsed from search queries.
+
+Attributes (all floats, ``None`` when absent):
+    ram_gb, storage_gb, screen_in, camera_mp, battery_mah
+
+Ingestion stores them in indexed columns on `products`; the spec stage of find_products
+turns queries such as "celular 8gb ram", "más de 128gb" or "entre 64 y 256 gb" into
+comparisons on those columns.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+ATTRIBUTES = ("ram_gb", "storage_gb", "screen_in", "camera_mp", "battery_mah")
+
+# GB values without a RAM/storage label: phones and laptops have <= 24 GB of RAM and >= 32 GB of storage.
+_MAX_UNLABELED_RAM_GB = 24
+_MIN_UNLABELED_STORAGE_GB = 32
+
+_NUM = r"(\d+(?:[.,]\d+)?)"
+_RAM_WORDS = r"(?:ram|memoria\s+ram)"
+_STORAGE_WORDS = r"(?:almacenamiento|memoria\s+interna|interna|interno|rom|storage|capacidad|disco|ssd)"
+
+_RAM_LABEL_FIRST = re.compile(rf"\b{_RAM_WORDS}\s*(?:de\s*)?[:=\-]?\s*{_NUM}\s*(gb|mb)\b")
+_RAM_VALUE_FIRST = re.compile(rf"\b{_NUM}\s*(gb|mb)\s*(?:de\s*)?{_RAM_WORDS}\b")
+_STORAGE_LABEL_FIRST = re.compile(rf"\b{_STORAGE_WORDS}\s*(?:de\s*)?[:=\-]?\s*{_NUM}\s*(gb|tb)\b")
+_STORAGE_VALUE_FIRST = re.compile(rf"\b{_NUM}\s*(gb|tb)\s*(?:de\s*)?{_STORAGE_WORDS}\b")
+# "8GB+256GB", "8+256GB", "8GB/256GB", "4 + 128 gb"
+_RAM_PLUS_STORAGE = re.compile(rf"\b{_NUM}\s*(?:gb)?\s*[+/]\s*{_NUM}\s*(gb|tb)\b")
+# "4GB+4GB RAM virtual": physical + virtual (extended) RAM, not RAM + storage.
+_RAM_LABEL_AFTER = re.compile(r"\s*(?:de\s*)?(?:memoria\s+)?(?:ram|virtual|extendida)\b")
+_GB_VALUE = re.compile(rf"\b{_NUM}\s*(gb|tb)\b")
+_SCREEN = re.compile(rf"(?<![\d.,]){_NUM}\s*(?:\"|''|”|″|pulgadas|pulg\b|in\b|inch)")
+_SCREEN_LABELED = re.compile(rf"\b(?:pantalla|display|screen)\s*(?:de\s*)?[:=\-]?\s*{_NUM}\b")
+_CAMERA = re.compile(rf"\b{_NUM}\s*mp\b")
+_BATTERY = re.compile(r"\b(\d{1,2}[.,]\d{3}|\d{3,5})\s*mah\b")
+
+
+def _fold(text: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+
+
+def _num(raw: str) -> float:
+    return float(raw.replace(",", "."))
+
+
+def _gb(raw: str, unit: str) -> float:
+    value = _num(raw)
+    if unit == "tb":
+        return value * 1024
+    if unit == "mb":
+        return value / 1024
+    return value
+
+
+def parse_specs(specifitacion: Optional[str], item_name: Optional[str] = None) -> Dict[str, Optional[float]]:
+    """Extracts ATTRIBUTES from the spec text, falling back to the item name for anything missing."""
+    attrs: Dict[str, Optional[float]] = dict.fromkeys(ATTRIBUTES)
+    for source in (specifitacion, item_name):
+        text = _fold(source)
+        if not text:
+            continue
+        found = _parse_text(text)
+        for key, value in found.items():
+            if attrs[key] is None and value is not None:
+                attrs[key] = value
+    return attrs
+
+
+def _parse_text(text: str) -> Dict[str, Optional[float]]:
+    attrs: Dict[str, Optional[float]] = dict.fromkeys(ATTRIBUTES)
+
+    m = _RAM_LABEL_FIRST.search(text) or _RAM_VALUE_FIRST.search(text)
+    if m:
+        attrs["ram_gb"] = _gb(m.group(1), m.group(2))
+    m = _STORAGE_LABEL_FIRST.search(text) or _STORAGE_VALUE_FIRST.search(text)
+    if m:
+        attrs["storage_gb"] = _gb(m.group(1), m.group(2))
+    m = next((m for m in _RAM_PLUS_STORAGE.finditer(text)
+              if not _RAM_LABEL_AFTER.match(text, m.end())
+              and _gb(m.group(2), m.group(3)) >= _MIN_UNLABELED_STORAGE_GB), None)
+    if m:
+        attrs["ram_gb"] = attrs["ram_gb"] or _num(m.group(1))
+        attrs["storage_gb"] = attrs["storage_gb"] or _gb(m.group(2), m.group(3))
+
+    if attrs["ram_gb"] is None or attrs["storage_gb"] is None:
+        values = sorted({_gb(v, u) for v, u in _GB_VALUE.findall(text)})
+        if attrs["storage_gb"] is None and values and values[-1] >= _MIN_UNLABELED_STORAGE_GB:
+            attrs["storage_gb"] = values[-1]
+        if attrs["ram_gb"] is None and len(values) >= 2 and values[0] <= _MAX_UNLABELED_RAM_GB:
+            attrs["ram_gb"] = values[0]
+
+    m = _SCREEN_LABELED.search(text) or _SCREEN.search(text)
+    if m and 2 <= _num(m.group(1)) <= 120:
+        attrs["screen_in"] = _num(m.group(1))
+    cameras = [_num(v) for v in _CAMERA.findall(text)]
+    if cameras:
+        attrs["camera_mp"] = max(cameras)  # Main (highest resolution) camera
+    m = _BATTERY.search(text)
+    if m:
+        attrs["battery_mah"] = float(m.group(1).replace(".", "").replace(",", ""))
+    return attrs
+
+
+# ===========================================================================
+# Query side
+# ===========================================================================
+
+SpecFilter = Tuple[str, str, float]  # (attribute, operator, value); operator in =, >, >=, <, <=
+
+_GREATER = r"(?:mas\s+de|mayor\s+(?:a|de|que)|superior\s+a|arriba\s+de|\+\s*de|over)"
+_AT_LEAST = r"(?:al\s+menos|minimo(?:\s+de)?|desde|por\s+lo\s+menos|como\s+minimo)"
+_LESS = r"(?:menos\s+de|menor\s+(?:a|de|que)|inferior\s+a|debajo\s+de)"
+_AT_MOST = r"(?:hasta|maximo(?:\s+de)?|como\s+maximo|no\s+mas\s+de)"
+_OPERATOR = rf"(?:(?P<gt>{_GREATER})|(?P<ge>{_AT_LEAST})|(?P<lt>{_LESS})|(?P<le>{_AT_MOST}))"
+
+_UNIT_ATTRS = {"gb": None, "tb": None, "mp": "camera_mp", "mah": "battery_mah",
+               "\"": "screen_in", "pulgadas": "screen_in", "pulg": "screen_in"}
+_UNIT = r"(gb|tb|mp|mah|\"|pulgadas|pulg)"
+_RANGE = re.compile(rf"\bentre\s+{_NUM}\s*{_UNIT}?\s+y\s+{_NUM}\s*{_UNIT}")
+_VALUE = re.compile(rf"(?:{_OPERATOR}\s*)?{_NUM}\s*{_UNIT}(?!\w)(?:\s*(?:de\s*)?(?P<label>{_RAM_WORDS}|{_STORAGE_WORDS}))?")
+# A unitless GB value named by the label after it: "256 de almacenamiento", "8 de ram".
+_BARE_LABELED = re.compile(rf"(?:{_OPERATOR}\s*)?(?<![\d.,]){_NUM}\s+(?:de\s+)?(?P<label>{_RAM_WORDS}|{_STORAGE_WORDS})\b")
+_LABEL_BEFORE = re.compile(rf"(?P<label>{_RAM_WORDS}|{_STORAGE_WORDS}|pantalla|camara|bateria)\s*(?:de\s*)?$")
+
+
+def _attr_for(unit: str, value: float, label: Optional[str]) -> Optional[str]:
+    if unit in ("gb", "tb"):
+        if label:
+            return "ram_gb" if re.fullmatch(_RAM_WORDS, label) else "storage_gb"
+        return "ram_gb" if value <= _MAX_UNLABELED_RAM_GB else "storage_gb"
+    return _UNIT_ATTRS.get(unit)
+
+
+def _value_in_unit(raw: str, unit: str) -> float:
+    return _gb(raw, unit) if unit in ("gb", "tb") else _num(raw)
+
+
+def _operator(m: "re.Match[str]") -> str:
+    return ">" if m.group("gt") else ">=" if m.group("ge") else "<" if m.group("lt") else "<=" if m.group("le") else "="
+
+
+def parse_query_filters(query: Optional[str]) -> List[SpecFilter]:
+    """
+    Structured filters named in a search query, e.g.
+    "celular 8gb ram más de 128gb" -> [("ram_gb", "=", 8.0), ("storage_gb", ">", 128.0)],
+    "celular 8/256gb" -> [("ram_gb", "=", 8.0), ("storage_gb", "=", 256.0)].
+    """
+    text = _fold(query)
+    filters: List[SpecFilter] = []
+    consumed: List[Tuple[int, int]] = []
+
+    for m in _RANGE.finditer(text):
+        unit = m.group(4)
+        low, high = _value_in_unit(m.group(1), m.group(2) or unit), _value_in_unit(m.group(3), unit)
+        attr = _attr_for(unit, max(low, high), _label_before(text, 0, m.start()))
+        if attr:
+            filters += [(attr, ">=", min(low, high)), (attr, "<=", max(low, high))]
+            consumed.append(m.span())
+
+    # RAM/storage pairs, read the same way as in item names.
+    for m in _RAM_PLUS_STORAGE.finditer(text):
+        storage = _gb(m.group(2), m.group(3))
+        if (any(start <= m.start() < end for start, end in consumed) or _RAM_LABEL_AFTER.match(text, m.end())
+                or storage < _MIN_UNLABELED_STORAGE_GB):
+            continue
+        filters += [("ram_gb", "=", _num(m.group(1))), ("storage_gb", "=", storage)]
+        consumed.append(m.span())
+
+    previous_end = 0
+    for m in _VALUE.finditer(text):
+        if any(start <= m.start() < end for start, end in consumed):
+            continue
+        unit = m.group(6)
+        value = _value_in_unit(m.group(5), unit)
+        # A label before the value only counts if no earlier value sits in between ("8gb ram más de 128gb").
+        attr = _attr_for(unit, value, m.group("label") or _label_before(text, previous_end, m.start()))
+        previous_end = m.end()
+        if not attr:
+            continue
+        filters.append((attr, _operator(m), value))
+
+    for m in _BARE_LABELED.finditer(text):
+        if any(start <= m.start() < end for start, end in consumed):
+            continue
+        filters.append((_attr_for("gb", _num(m.group(5)), m.group("label")), _operator(m), _num(m.group(5))))
+    return filters
+
+
+def _label_before(text: str, start: int, position: int) -> Optional[str]:
+    m = _LABEL_BEFORE.search(text[start:position].rstrip())
+    if not m:
+        return None
+    label = m.group("label")
+    return None if label in ("pantalla", "camara", "bateria") else label
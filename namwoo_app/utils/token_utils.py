@@ -0,0 +1,45 @@
+# namwoo_app/utils/token_utils.py
+"""
+Token counting for prompt budgeting. Uses tiktoken when installed; otherwise falls
+back to a ~4 characters per token estimate, which is close enough for budgets.
+"""
+import logging
+from functools import lru_cache
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_ENCODING = "o200k_base"  # gpt-4o family
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(_DEFAULT_ENCODING)
+        except KeyError:  # Unknown model name
+            return tiktoken.get_encoding(_DEFAULT_ENCODING)
+    except Exception as e:  # e.g. encoding files cannot be downloaded
+        logger.warning(f"tiktoken unavailable ({e}); using character-based token estimates.")
+        return None
+
+
+def count_tokens(text: Optional[str], model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def is_exact() -> bool:
+    """True when counts come from a real tokenizer rather than the estimate."""
+    return _get_encoding(None) is not None
@@ -0,0 +1,84 @@
+# namwoo_app/utils/tool_executor.py
+"""
+Runs the tool calls of one model turn, concurrently where that is safe.
+
+Calls are processed in their original order as a sequence of segments: each run of
+consecutive read-only calls is one segment executed on a bounded thread pool, and every
+stateful call is a segment of its own that waits for everything before it. So a turn with
+two searches and a branch lookup costs the slowest of the three, while reservation updates
+keep their order relative to everything else. A read-only call that also sets conversation
+state (find_products with a city) starts a new segment, so the state it sets is seen by the
+calls after it but never by the calls before it. Results are returned in call order.
+
+Worker threads get the caller's Flask app context; DB sessions are per thread
+(db_utils uses a scoped_session).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, TypeVar
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Tools that only read the catalog/directory (they may depend on, but never change, conversation state).
+READ_ONLY_TOOLS = frozenset({
+    "find_products",
+    "get_available_brands",
+    "get_branch_address",
+    "get_products_by_skus",
+    "query_accessories",
+    "get_location_details_from_address",
+})
+
+
+def run_tool_calls(
+    calls: Sequence[T],
+    execute: Callable[[T], R],
+    parallel_safe: Callable[[T], bool],
+    prepare: Optional[Callable[[T], None]] = None,
+    max_workers: int = 4,
+    changes_state: Optional[Callable[[T], bool]] = None,
+) -> List[R]:
+    """
+    Returns [execute(call) for call in calls], running consecutive `parallel_safe` calls
+    concurrently. `prepare(call)`, if given, runs in the calling thread, in call order,
+    right before a call's segment starts (for state updates the call implies); a call for
+    which `changes_state(call)` is true starts a new segment, after the earlier calls ran.
+    `execute` is expected to turn its own errors into a result.
+    """
+    results: List[R] = []
+    index = 0
+    while index < len(calls):
+        end = index + 1
+        if parallel_safe(calls[index]):
+            while (end < len(calls) and parallel_safe(calls[end])
+                   and not (changes_state and changes_state(calls[end]))):
+                end += 1
+        segment = calls[index:end]
+        if prepare:
+            for call in segment:
+                prepare(call)
+        if len(segment) == 1 or max_workers <= 1:
+            results.extend(execute(call) for call in segment)
+        else:
+            results.extend(_run_concurrently(segment, execute, max_workers))
+        index = end
+    return results
+
+
+def _run_concurrently(segment: Sequence[T], execute: Callable[[T], R], max_workers: int) -> List[R]:
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def run(call: T) -> R:
+        if app is None:
+            return execute(call)
+        with app.app_context():
+            return execute(call)
+
+    logger.debug(f"Running {len(segment)} read-only tool calls concurrently.")
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(segment)), thread_name_prefix="tool") as pool:
+        return list(pool.map(run, segment))
@@ -0,0 +1,172 @@
+# namwoo_app/utils/tool_result_encoder.py
+"""
+Compact, token-budgeted encoding of tool results for the LLM.
+
+Keys that data/system_prompt.txt refers to (products_grouped, base_name, variants,
+price, price_bolivar, product_details, locations, branch_name, status, ...) are kept
+verbatim and only the others are shortened. Values are kept as they are (a variant's
+"N/A" color, an empty `products` list); only empty free-text fields in _DROPPABLE_WHEN_EMPTY
+are left out. JSON is emitted without whitespace. Product groups arrive in relevance order, so when the budget is
+exceeded the tail is dropped (after clipping long descriptions) and a `truncated`
+note tells the model how many products were left out.
+"""
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("json", "table")
+
+# Only keys the system prompt never mentions are renamed.
+_SHORT_KEYS = {
+    "marketing_description": "desc",
+    "technical_specs": "specs",
+    "full_item_name": "name",
+    "total_stock": "stock",
+    "sub_category": "subcat",
+    "search_method": "via",
+}
+_DESCRIPTION_KEYS = ("desc", "specs", "specifitacion")
+_CLIPPED_DESCRIPTION_CHARS = 160
+# Optional free-text fields that carry nothing when empty (original key names).
+_DROPPABLE_WHEN_EMPTY = frozenset({"marketing_description", "technical_specs", "specifitacion", "sub_category"})
+_EMPTY = (None, "", "N/A")
+
+
+def _compact(value: Any) -> Any:
+    """Renames long keys and drops the empty _DROPPABLE_WHEN_EMPTY fields, recursively."""
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            if key in _DROPPABLE_WHEN_EMPTY and (item in _EMPTY or (isinstance(item, str) and not item.strip())):
+                continue
+            out[_SHORT_KEYS.get(key, key)] = _compact(item)
+        return out
+    if isinstance(value, list):
+        return [_compact(v) for v in value]
+    return value
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+def _clip_group(group: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: (_clip(v, _CLIPPED_DESCRIPTION_CHARS) if k in _DESCRIPTION_KEYS and isinstance(v, str) else v)
+            for k, v in group.items()}
+
+
+# ===========================================================================
+# Tabular format
+# ===========================================================================
+
+def _variant_cell(variant: Dict[str, Any]) -> str:
+    price = variant.get("price")
+    price_bs = variant.get("price_bolivar")
+    parts = [variant.get("item_code") or "", variant.get("color") or ""]
+    parts.append(f"${price:g}" if isinstance(price, (int, float)) else "")
+    parts.append(f"Bs{price_bs:g}" if isinstance(price_bs, (int, float)) else "")
+    return ":".join(parts)
+
+
+def _group_line(group: Dict[str, Any]) -> str:
+    variants = ";".join(_variant_cell(v) for v in group.get("variants", []))
+    stores = ";".join(
+        f"{loc.get('branch_name')}({loc['stock']})" if "stock" in loc else str(loc.get("branch_name"))
+        for loc in group.get("locations", [])
+    )
+    cells = [group.get("base_name", ""), group.get("brand", ""), variants, stores,
+             group.get("desc", ""), group.get("specs", "")]
+    return "|".join(str(c).replace("|", "/").replace("\n", " ") for c in cells)
+
+
+def _encode_table(header: Dict[str, Any], groups: List[Dict[str, Any]]) -> str:
+    lines = [_dumps(header),
+             "products_grouped: base_name|brand|variants(item_code:color:price:price_bolivar)|locations(branch_name(stock))|desc|specs"]
+    lines.extend(_group_line(g) for g in groups)
+    return "\n".join(lines)
+
+
+# ===========================================================================
+# Public API
+# ===========================================================================
+
+def encode(result: Any, token_budget: int, count: Callable[[str], int], fmt: str = "json") -> Tuple[str, int]:
+    """
+    Encodes a tool result within `token_budget` tokens as measured by `count` (best effort:
+    a single clipped product may still exceed very small budgets). Returns (text, tokens).
+    """
+    fmt = fmt if fmt in FORMATS else "json"
+    compact = _compact(result)
+    groups = compact.get("products_grouped") if isinstance(compact, dict) else None
+
+    if not groups:
+        text = _dumps(compact)
+        return text, count(text)
+
+    header = {k: v for k, v in compact.items() if k != "products_grouped"}
+    overhead = count(_dumps(header)) + 16  # wrapper keys and the truncation note
+
+    kept: List[Dict[str, Any]] = []
+    used = overhead
+    for index, group in enumerate(groups):
+        cost = count(_group_line(group) if fmt == "table" else _dumps(group))
+        if used + cost > token_budget:
+            group = _clip_group(group)
+            cost = count(_group_line(group) if fmt == "table" else _dumps(group))
+        if used + cost > token_budget and kept:
+            break
+        kept.append(group)
+        used += cost
+
+    if len(kept) < len(groups):
+        header["truncated"] = {"shown": len(kept), "omitted_products": len(groups) - len(kept)}
+        logger.info(f"Tool result truncated to {len(kept)}/{len(groups)} products for a {token_budget}-token budget.")
+
+    if fmt == "table":
+        text = _encode_table(header, kept)
+    else:
+        text = _dumps({**header, "products_grouped": kept})
+    return text, count(text)
+
+
+def benchmark(
+    tool_outputs: Iterable[Any],
+    token_budget: int,
+    count: Callable[[str], int],
+    fmt: str = "json",
+) -> Dict[str, Any]:
+    """
+    Compares prompt tokens of the legacy `json.dumps(indent=2)` encoding with `encode()`
+    over recorded tool outputs (dicts or JSON strings).
+    """
+    legacy_total = compact_total = count = 0
+    per_item: List[Tuple[int, int]] = []
+    for output in tool_outputs:
+        if isinstance(output, str):
+            try:
+                output = json.loads(output)
+            except json.JSONDecodeError:
+                continue
+        legacy = count(json.dumps(output, indent=2, ensure_ascii=False))
+        _, compact = encode(output, token_budget, count, fmt)
+        legacy_total += legacy
+        compact_total += compact
+        per_item.append((legacy, compact))
+        count += 1
+    return {
+        "outputs": count,
+        "format": fmt,
+        "token_budget": token_budget,
+        "legacy_tokens": legacy_total,
+        "encoded_tokens": compact_total,
+        "mean_legacy_tokens": round(legacy_total / count, 1) if count else 0,
+        "mean_encoded_tokens": round(compact_total / count, 1) if count else 0,
+        "reduction_pct": round(100 * (1 - compact_total / legacy_total), 1) if legacy_total else 0.0,
+        "max_encoded_tokens": max((c for _, c in per_item), default=0),
+    }
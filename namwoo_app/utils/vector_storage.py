@@ -0,0 +1,247 @@
+# namwoo_app/utils/vector_storage.py
+"""
+Embedding storage modes for pgvector.
+
+- ``vector``:  float32 ``vector(d)`` with an HNSW cosine index (original layout).
+- ``halfvec``: float16 ``halfvec(d)``; half the table and index size, near-identical recall.
+- ``binary``:  ``halfvec(d)`` column plus an HNSW index over ``binary_quantize(embedding)::bit(d)``.
+               Candidates are fetched by Hamming distance and re-ranked by exact cosine distance.
+
+``EMBEDDING_DIMENSION`` below the model's native size uses the ``dimensions`` parameter of
+text-embedding-3 models; existing vectors are shortened with ``subvector`` + ``l2_normalize``.
+halfvec, binary_quantize, subvector and l2_normalize need pgvector >= 0.7 in the database.
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import Index, cast, func, text
+from sqlalchemy.orm import Session
+from pgvector.sqlalchemy import VECTOR, HALFVEC, BIT
+
+logger = logging.getLogger(__name__)
+
+STORAGE_MODES = ("vector", "halfvec", "binary")
+DEFAULT_STORAGE_MODE = "vector"
+
+# (table, index name) for every embedding column the migration manages. The legacy
+# products.embedding column keeps no ANN index since product_embeddings replaced it.
+MANAGED_EMBEDDING_COLUMNS = (
+    ("product_embeddings", "idx_product_embeddings_hnsw"),
+    ("products", None),
+)
+
+
+def normalize_mode(mode: Optional[str]) -> str:
+    mode = (mode or DEFAULT_STORAGE_MODE).strip().lower()
+    if mode not in STORAGE_MODES:
+        logger.error(f"Unknown EMBEDDING_STORAGE '{mode}'. Falling back to '{DEFAULT_STORAGE_MODE}'.")
+        return DEFAULT_STORAGE_MODE
+    return mode
+
+
+def column_type(mode: str, dimension: int):
+    """SQLAlchemy column type for the given storage mode."""
+    return VECTOR(dimension) if normalize_mode(mode) == "vector" else HALFVEC(dimension)
+
+
+def sql_column_type(mode: str, dimension: int) -> str:
+    return f"vector({dimension})" if normalize_mode(mode) == "vector" else f"halfvec({dimension})"
+
+
+def hnsw_index(name: str, embedding_column, mode: str, dimension: int) -> Index:
+    """HNSW index definition for the model's __table_args__."""
+    mode = normalize_mode(mode)
+    if mode == "binary":
+        bits = cast(func.binary_quantize(embedding_column), BIT(dimension)).label("embedding_bits")
+        return Index(name, bits, postgresql_using="hnsw", postgresql_ops={"embedding_bits": "bit_hamming_ops"})
+    ops = "vector_cosine_ops" if mode == "vector" else "halfvec_cosine_ops"
+    return Index(name, embedding_column, postgresql_using="hnsw", postgresql_ops={embedding_column.name: ops})
+
+
+def hnsw_index_ddl(table: str, index_name: str, mode: str, dimension: int) -> str:
+    mode = normalize_mode(mode)
+    if mode == "binary":
+        target = f"(binary_quantize(embedding)::bit({dimension})) bit_hamming_ops"
+    elif mode == "halfvec":
+        target = "embedding halfvec_cosine_ops"
+    else:
+        target = "embedding vector_cosine_ops"
+    return f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} USING hnsw ({target})"
+
+
+def hamming_distance(embedding_column, query_embedding: Sequence[float], dimension: int):
+    """Hamming distance between binary-quantized stored and query vectors (uses the bit HNSW index)."""
+    stored_bits = cast(func.binary_quantize(embedding_column), BIT(dimension))
+    query_bits = cast(func.binary_quantize(cast(as_float_list(query_embedding), HALFVEC(dimension))), BIT(dimension))
+    return stored_bits.op("<~>")(query_bits)
+
+
+def as_float_list(embedding) -> List[float]:
+    """Plain float list from a list, numpy array or pgvector HalfVector/Vector value."""
+    if hasattr(embedding, "to_list"):
+        return [float(v) for v in embedding.to_list()]
+    return [float(v) for v in embedding]
+
+
+def set_ef_search(session: Session, candidates: int) -> None:
+    """HNSW returns at most ef_search rows (default 40); raise it when over-fetching for re-ranking."""
+    if candidates > 40:
+        session.execute(text(f"SET LOCAL hnsw.ef_search = {int(candidates)}"))
+
+
+def embedding_request_kwargs(model: str, dimension: Optional[int]) -> Dict[str, Any]:
+    """Extra embeddings.create() arguments; text-embedding-3 models accept a reduced `dimensions`."""
+    if dimension and model and model.startswith("text-embedding-3"):
+        return {"dimensions": int(dimension)}
+    return {}
+
+
+# ===========================================================================
+# Migration
+# ===========================================================================
+
+def current_column_type(session: Session, table: str) -> Optional[str]:
+    return session.execute(text(
+        "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+        "WHERE attrelid = to_regclass(:table) AND attname = 'embedding' AND NOT attisdropped"
+    ), {"table": table}).scalar()
+
+
+def _parse_dimension(type_str: Optional[str]) -> Optional[int]:
+    if not type_str or "(" not in type_str:
+        return None
+    return int(type_str.split("(", 1)[1].rstrip(")"))
+
+
+def migrate_embedding_storage(session: Session, mode: str, dimension: int) -> List[str]:
+    """
+    Converts every managed embedding column to the requested storage mode/dimension and
+    rebuilds its index. Shrinking dimensions truncates and re-normalizes existing vectors
+    (valid for text-embedding-3 models); growing them requires re-embedding and is refused.
+    Returns the executed statements. The caller owns the transaction.
+    """
+    mode = normalize_mode(mode)
+    target_type = sql_column_type(mode, dimension)
+    executed: List[str] = []
+    for table, index_name in MANAGED_EMBEDDING_COLUMNS:
+        current_type = current_column_type(session, table)
+        if current_type is None:
+            logger.warning(f"Table '{table}' has no embedding column. Skipping.")
+            continue
+        current_dim = _parse_dimension(current_type)
+        if current_dim is not None and dimension > current_dim:
+            raise ValueError(f"Cannot grow {table}.embedding from {current_dim} to {dimension} dimensions; re-embed instead.")
+
+        statements = []
+        if index_name:
+            statements.append(f"DROP INDEX IF EXISTS {index_name}")
+        if current_type != target_type:
+            source = "embedding::vector"
+            if current_dim is not None and dimension < current_dim:
+                source = f"l2_normalize(subvector(embedding::vector, 1, {dimension}))"
+            statements.append(f"ALTER TABLE {table} ALTER COLUMN embedding TYPE {target_type} USING ({source})::{target_type}")
+        if index_name:
+            statements.append(hnsw_index_ddl(table, index_name, mode, dimension))
+
+        for stmt in statements:
+            logger.info(f"Vector storage migration: {stmt}")
+            session.execute(text(stmt))
+            executed.append(stmt)
+    return executed
+
+
+# ===========================================================================
+# Recall / latency / size report
+# ===========================================================================
+
+def _exact_neighbors(matrix: np.ndarray, query_idx: np.ndarray, k: int) -> List[List[int]]:
+    normalized = matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+    scores = normalized[query_idx] @ normalized.T
+    scores[np.arange(len(query_idx)), query_idx] = -np.inf  # exclude the query item itself
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return [list(row[np.argsort(-scores[i, row])]) for i, row in enumerate(top)]
+
+
+def storage_report(
+    session: Session,
+    modes: Sequence[str] = STORAGE_MODES,
+    dimensions: Sequence[int] = (1536,),
+    sample_size: int = 100,
+    k: int = 10,
+    rerank_factor: int = 4,
+) -> List[Dict[str, Any]]:
+    """
+    Compares storage modes on a copy of product_embeddings held in temp tables.
+    Queries are the embeddings of sampled items; ground truth is exact float32 cosine
+    search in NumPy over the full-dimension vectors. Reports recall@k, mean query
+    latency, index build time and table/index sizes. Nothing outside pg_temp is modified.
+    """
+    rows = session.execute(text("SELECT item_code, embedding::vector::text FROM product_embeddings")).all()
+    if len(rows) <= k:
+        logger.warning("Not enough product embeddings for a storage report.")
+        return []
+    codes = [r[0] for r in rows]
+    matrix = np.array([np.fromstring(r[1].strip("[]"), sep=",") for r in rows], dtype=np.float32)
+    rng = np.random.default_rng(42)
+    query_idx = rng.choice(len(codes), size=min(sample_size, len(codes)), replace=False)
+    truth = _exact_neighbors(matrix, query_idx, k)
+
+    report = []
+    for dimension in dimensions:
+        for mode in (normalize_mode(m) for m in modes):
+            table = f"pg_temp.emb_eval_{mode}_{dimension}"
+            col_type = sql_column_type(mode, dimension)
+            source = "embedding::vector"
+            if dimension < matrix.shape[1]:
+                source = f"l2_normalize(subvector(embedding::vector, 1, {dimension}))"
+            session.execute(text(f"DROP TABLE IF EXISTS {table}"))
+            session.execute(text(
+                f"CREATE TEMP TABLE emb_eval_{mode}_{dimension} AS "
+                f"SELECT item_code, ({source})::{col_type} AS embedding FROM product_embeddings"
+            ))
+            started = time.perf_counter()
+            session.execute(text(hnsw_index_ddl(table, f"emb_eval_{mode}_{dimension}_hnsw", mode, dimension)))
+            build_seconds = time.perf_counter() - started
+            table_bytes, index_bytes = session.execute(text(
+                f"SELECT pg_relation_size('{table}'), pg_relation_size('pg_temp.emb_eval_{mode}_{dimension}_hnsw')"
+            )).one()
+
+            candidates = k * rerank_factor if mode == "binary" else k
+            set_ef_search(session, candidates + 1)
+            if mode == "binary":
+                sql = text(
+                    f"SELECT item_code FROM (SELECT item_code, embedding FROM {table} "
+                    f"ORDER BY binary_quantize(embedding)::bit({dimension}) <~> binary_quantize(CAST(:q AS halfvec({dimension})))::bit({dimension}) "
+                    f"LIMIT :candidates) c ORDER BY embedding <=> CAST(:q AS halfvec({dimension})) LIMIT :k"
+                )
+            else:
+                sql = text(f"SELECT item_code FROM {table} ORDER BY embedding <=> CAST(:q AS {col_type}) LIMIT :k")
+
+            hits, latencies = 0, []
+            for i, idx in enumerate(query_idx):
+                q = matrix[idx][:dimension]
+                q = q / max(float(np.linalg.norm(q)), 1e-12)
+                q_literal = "[" + ",".join(f"{v:.7f}" for v in q) + "]"
+                started = time.perf_counter()
+                found = [r[0] for r in session.execute(sql, {"q": q_literal, "k": k + 1, "candidates": candidates + 1})]
+                latencies.append(time.perf_counter() - started)
+                found = [c for c in found if c != codes[idx]][:k]
+                expected = {codes[j] for j in truth[i]}
+                hits += len(expected.intersection(found))
+
+            report.append({
+                "mode": mode,
+                "dimension": dimension,
+                "recall_at_k": round(hits / (len(query_idx) * k), 4),
+                "k": k,
+                "mean_query_ms": round(1000 * sum(latencies) / len(latencies), 3),
+                "p95_query_ms": round(1000 * sorted(latencies)[int(0.95 * (len(latencies) - 1))], 3),
+                "index_build_s": round(build_seconds, 3),
+                "table_mb": round(table_bytes / 1048576, 2),
+                "index_mb": round(index_bytes / 1048576, 2),
+                "items": len(codes),
+            })
+            session.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    return report
@@ -0,0 +1,36 @@
+import os
+import sys
+import json
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from namwoo_app.services.providers.openai_assistant_provider import OpenAIAssistantProvider
+from namwoo_app.utils import conversation_location
+
+
+def _tool_call(call_id, name, **args):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+
+
+def test_find_products_city_only_applies_to_later_calls():
+    conversation_id = "test-assistant-city-order"
+    conversation_location.set_conversation_city(conversation_id, "valencia")
+    provider = OpenAIAssistantProvider.__new__(OpenAIAssistantProvider)  # No API client needed
+    seen = {}
+
+    def execute(tc, args, sb_conversation_id):
+        seen[tc.id] = conversation_location.get_conversation_city(sb_conversation_id)
+        return {"tool_call_id": tc.id, "output": "{}"}
+
+    provider._execute_tool_call = execute
+    tool_calls = [
+        _tool_call("c1", "query_accessories", itemCode="D0006521"),
+        _tool_call("c2", "get_products_by_skus", itemCodes=["D0008141"]),
+        _tool_call("c3", "find_products", query="samsung", city="Caracas"),
+        _tool_call("c4", "query_accessories", itemCode="D0008141"),
+    ]
+    outputs = provider._execute_tool_calls(tool_calls, conversation_id)
+
+    assert [o["tool_call_id"] for o in outputs] == ["c1", "c2", "c3", "c4"]
+    assert seen == {"c1": "valencia", "c2": "valencia", "c3": "caracas", "c4": "caracas"}
@@ -0,0 +1,34 @@
+import os
+import importlib.util
+
+UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "namwoo_app", "utils", "branch_matching.py"))
+spec = importlib.util.spec_from_file_location("branch_matching", UTILS_PATH)
+branch_matching = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(branch_matching)
+
+RECORDS = [
+    {"branch_name": "BARQUISIMETO", "city": "Barquisimeto", "address": "Av. Venezuela"},
+    {"branch_name": "BARQUISIMETO 2", "city": "Barquisimeto", "address": "Av. Venezuela II",
+     "aliases": ["ALMACEN PRINCIPAL BARQUISIMETO II"]},
+    {"branch_name": "EL PARAÍSO", "city": "Caracas", "address": "Av. Páez"},
+    {"branch_name": "LA CALIFORNIA", "city": "Caracas", "address": "Av. Francisco de Miranda"},
+    {"branch_name": "VALENCIA CENTRO", "city": "Valencia", "address": "Av. Bolívar"},
+]
+
+
+def test_normalize_name():
+    assert branch_matching.normalize_name("Almacén Principal BARQUISIMETO II") == "barquisimeto 2"
+    assert branch_matching.normalize_name("  El Paraíso ") == "el paraiso"
+
+
+def test_match_exact_alias_substring_and_fuzzy():
+    index = branch_matching.BranchIndex(RECORDS)
+    assert index.match("el paraiso")["address"] == "Av. Páez"
+    assert index.match("Barquisimeto II")["branch_name"] == "BARQUISIMETO 2"
+    assert index.match("barquisimeto")["branch_name"] == "BARQUISIMETO"
+    assert index.match("tienda la california")["branch_name"] == "LA CALIFORNIA"
+    assert index.match("valencia")["branch_name"] == "VALENCIA CENTRO"
+    assert index.match("la califronia")["branch_name"] == "LA CALIFORNIA"
+    assert index.match("maracaibo") is None
+    assert index.match("valencia", city="Valencia")["branch_name"] == "VALENCIA CENTRO"
+    assert "_keys" not in index.match("el paraiso")
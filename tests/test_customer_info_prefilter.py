@@ -0,0 +1,27 @@
+import os
+import importlib.util
+
+UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "namwoo_app", "utils", "customer_info_prefilter.py"))
+spec = importlib.util.spec_from_file_location("customer_info_prefilter", UTILS_PATH)
+customer_info_prefilter = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(customer_info_prefilter)
+
+
+def test_complete_order_messages_pass():
+    messages = [
+        "Juan Pérez, V-12.345.678, 0414-1234567, juan@gmail.com, Av. Bolívar Valencia, Samsung A15, total $150",
+        "Nombre: María Gómez\nCI 24123456\nTeléfono +58 424 555 12 34\nCorreo maria.g@hotmail.com\n"
+        "Dirección: Calle 5, Maracay\nProducto: Tecno Spark 20\nTotal: 320,50",
+        "ana@correo.com 04121234567 E-81234567 Ana Ruiz urb. El Trigal nevera Samsung 1.250$",
+    ]
+    for text in messages:
+        assert customer_info_prefilter.missing_fields(text) == [], text
+
+
+def test_ordinary_messages_are_skipped():
+    assert not customer_info_prefilter.could_contain_customer_info("hola")
+    assert not customer_info_prefilter.could_contain_customer_info("¿Cuánto cuesta el Samsung A15? Estoy en Valencia")
+    # A phone number alone must not also count as the cédula.
+    assert customer_info_prefilter.missing_fields(
+        "Soy Luis Díaz, mi número es 0414-1234567 y mi correo luis@gmail.com, quiero el iPhone de $900 en Caracas"
+    ) == ["cedula"]
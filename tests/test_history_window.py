@@ -0,0 +1,55 @@
+import os
+import json
+import importlib.util
+
+UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "namwoo_app", "utils", "history_window.py"))
+spec = importlib.util.spec_from_file_location("history_window", UTILS_PATH)
+history_window = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(history_window)
+
+
+def count(text):
+    return len(text.split())
+
+
+def _tool_turn(call_id, query, result_words):
+    return [
+        {"role": "assistant", "content": None, "tool_calls": [
+            {"id": call_id, "type": "function", "function": {"name": "find_products", "arguments": json.dumps({"query": query})}}]},
+        {"role": "tool", "tool_call_id": call_id, "name": "find_products", "content": "x " * result_words},
+    ]
+
+
+def test_tool_calls_stay_with_their_results_and_orphans_are_dropped():
+    messages = (
+        [{"role": "tool", "tool_call_id": "old", "name": "find_products", "content": "orphan"}]
+        + [{"role": "assistant", "content": None, "tool_calls": [{"id": "lost", "function": {"name": "f", "arguments": "{}"}}]}]
+        + [{"role": "user", "content": "hola"}]
+        + _tool_turn("c1", "iphone", 3)
+    )
+    units = history_window.group_messages(messages)
+    assert [[m["role"] for m in unit] for unit in units] == [["user"], ["assistant", "tool"]]
+
+
+def test_window_respects_budget_and_summarizes_older_turns():
+    messages = (
+        [{"role": "user", "content": "busco un celular samsung"}]
+        + _tool_turn("c1", "samsung", 200)
+        + [{"role": "assistant", "content": "Tenemos el Galaxy A15."},
+           {"role": "user", "content": "y en tecno?"}]
+        + _tool_turn("c2", "tecno", 20)
+        + [{"role": "assistant", "content": "El Spark 20 está disponible."}]
+    )
+    window, memory, used = history_window.build_window(messages, budget_tokens=60, count=count, memory_budget_tokens=50)
+    assert used <= 60
+    assert window[0] == {"role": "assistant", "content": "Tenemos el Galaxy A15."}
+    assert [m.get("tool_call_id") for m in window if m["role"] == "tool"] == ["c2"]
+    assert memory.startswith(history_window.MEMORY_HEADER)
+    assert "- Cliente: busco un celular samsung" in memory
+    assert "find_products(query=samsung)" in memory
+
+
+def test_newest_message_is_kept_even_when_over_budget():
+    window, memory, used = history_window.build_window(
+        [{"role": "user", "content": "palabra " * 500}], budget_tokens=50, count=count)
+    assert len(window) == 1 and used <= 50 and memory is None
@@ -0,0 +1,13 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from namwoo_app.services import intent_router
+
+
+def test_bare_numbers_during_a_reservation_go_to_the_llm():
+    reservation = {"item_code": "D0006521"}
+    assert intent_router.detect_intent("D0006521", None, None) == "sku"
+    for text in ["12345678", "04141234567", "D0006521", "gracias"]:
+        assert intent_router.detect_intent(text, None, reservation) is None, text
@@ -0,0 +1,21 @@
+import os
+import importlib.util
+
+UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "namwoo_app", "utils", "intent_rules.py"))
+spec = importlib.util.spec_from_file_location("intent_rules", UTILS_PATH)
+intent_rules = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(intent_rules)
+
+
+def test_trivial_messages_are_classified():
+    assert intent_rules.classify("Hola!") == "greeting"
+    assert intent_rules.classify("Buenos días 😊") == "greeting"
+    assert intent_rules.classify("hola buenas tardes") == "greeting"
+    assert intent_rules.classify("Muchas gracias!!") == "thanks"
+    assert intent_rules.classify("ok gracias por la información") == "thanks"
+    assert intent_rules.classify(" D0006521 ") == "sku"
+
+
+def test_messages_with_content_go_to_the_llm():
+    for text in ["hola, busco un celular", "no, gracias", "gracias, y el precio?", "A15", "iphone 15", "Samsung", ""]:
+        assert intent_rules.classify(text) is None, text
@@ -29,3 +29,22 @@ def test_generate_product_location_id_truncates():
     result = generate_product_location_id(item_code, whs_name)
     expected = (f"{item_code}_{whs_name}")[:512]
     assert result == expected
+
+
+def test_generate_content_hash_normalizes_whitespace():
+    generate_content_hash = product_utils.generate_content_hash
+    assert generate_content_hash("samsung  galaxy\nA15") == generate_content_hash(" samsung galaxy A15 ")
+    assert len(generate_content_hash("samsung galaxy a15")) == 64
+
+
+def test_generate_content_hash_empty():
+    assert product_utils.generate_content_hash(None) is None
+    assert product_utils.generate_content_hash("   ") is None
+
+
+def test_split_base_name_and_color():
+    split = product_utils.split_base_name_and_color
+    assert split("SAMSUNG GALAXY A15 SM-A155FZKDLTL NEGRO") == ("SAMSUNG GALAXY A15", "Negro")
+    assert split("TCL 40SE AZUL OSCURO") == ("TCL 40SE", "Azul oscuro")
+    assert split("XIAOMI REDMI NOTE 13") == ("XIAOMI REDMI NOTE 13", None)
+    assert split(None) == ("", None)
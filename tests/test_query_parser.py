@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from namwoo_app.utils import query_parser
+
+
+def test_fold_strips_accents_case_and_extra_whitespace():
+    assert query_parser.fold("  Teléfono   SAMSUNG ") == "telefono samsung"
+    assert query_parser.fold("Portátil Ñandú") == "portatil nandu"
+    assert query_parser.fold(None) == ""
+
+
+def test_sku_candidate_requires_a_single_token_with_a_digit():
+    assert query_parser.parse_query("D0008141").sku_candidate == "d0008141"
+    assert query_parser.parse_query("SM-A155M").sku_candidate == "sm-a155m"
+    assert query_parser.parse_query("samsung").sku_candidate is None
+    assert query_parser.parse_query("samsung a15").sku_candidate is None
+
+
+def test_category_detection_ignores_accents():
+    assert query_parser.parse_query("Teléfono Samsung").category == "CELULAR"
+    assert query_parser.parse_query("portatil hp").category == "LAPTOP"
+    assert query_parser.parse_query("TV 55 pulgadas").category == "TELEVISOR"
+    assert query_parser.parse_query("audífonos").category is None
+
+
+def test_queries_that_fold_alike_share_one_cache_entry():
+    query_parser._parse_cached.cache_clear()
+    accented = query_parser.parse_query("Teléfono 8gb ram")
+    plain = query_parser.parse_query("telefono 8GB RAM")
+    assert query_parser.cache_info()["misses"] == 1
+    assert query_parser.cache_info()["hits"] == 1
+    assert accented.key == plain.key == "telefono 8gb ram"
+    assert accented.spec_filters == plain.spec_filters
+    assert (accented.raw, plain.raw) == ("Teléfono 8gb ram", "telefono 8GB RAM")
@@ -0,0 +1,38 @@
+import os
+import importlib.util
+
+UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "namwoo_app", "utils", "reply_chunker.py"))
+spec = importlib.util.spec_from_file_location("reply_chunker", UTILS_PATH)
+reply_chunker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(reply_chunker)
+
+
+def _stream(text, chunker, step=3):
+    sent = []
+    for i in range(0, len(text), step):
+        sent += chunker.feed(text[i:i + step])
+    return sent, chunker.flush()
+
+
+def test_sentences_released_once_min_chars_reached():
+    text = "Hola. Tenemos el Samsung A15 disponible en Valencia. ¿Quieres reservarlo? Te espero."
+    streamed, rest = _stream(text, reply_chunker.SentenceChunker(min_chars=40))
+    assert streamed == ["Hola. Tenemos el Samsung A15 disponible en Valencia."]
+    assert rest == ["¿Quieres reservarlo? Te espero."]
+    assert " ".join(streamed + rest) == text
+
+
+def test_lists_stay_together_and_paragraphs_split():
+    text = "Opciones:\n1. Samsung A15 - $150.\n2. Tecno Spark - $120.\n\nTodos con garantía. ¿Cuál te interesa?"
+    streamed, rest = _stream(text, reply_chunker.SentenceChunker(min_chars=20))
+    assert streamed[0] == "Opciones:\n1. Samsung A15 - $150.\n2. Tecno Spark - $120."
+    assert streamed[1:] + rest == ["Todos con garantía. ¿Cuál te interesa?"]  # first sentence is under min_chars
+
+
+def test_max_chars_is_never_exceeded():
+    chunker = reply_chunker.SentenceChunker(min_chars=10, max_chars=30)
+    streamed, rest = _stream("palabra " * 20, chunker, step=7)
+    assert all(len(chunk) <= 30 for chunk in streamed + rest)
+    assert " ".join(streamed + rest).split() == ["palabra"] * 20
+    assert reply_chunker.max_chars_for("IG") == 1000
+    assert reply_chunker.max_chars_for(None) == reply_chunker.DEFAULT_MAX_CHARS
@@ -0,0 +1,59 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from namwoo_app.utils import search_cache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def exists(self, key):
+        return int(key in self.values)
+
+    def eval(self, script, numkeys, key, token):
+        assert script == search_cache._RELEASE_LOCK_SCRIPT
+        if self.values.get(key) == token:
+            del self.values[key]
+            return 1
+        return 0
+
+
+def _use(monkeypatch, redis):
+    monkeypatch.setattr(search_cache, "get_redis_client", lambda: redis)
+    monkeypatch.setattr(search_cache.metrics, "incr", lambda *args, **kwargs: None)
+    monkeypatch.setattr(search_cache.Config, "FIND_PRODUCTS_CACHE_ENABLED", True)
+
+
+def test_owner_releases_its_lock_and_caches_the_result(monkeypatch):
+    redis = FakeRedis()
+    _use(monkeypatch, redis)
+    result = search_cache.cached_search("samsung", ["CCS"], lambda: {"status": "success"})
+    assert result == {"status": "success"}
+    assert not [key for key in redis.values if key.endswith(":lock")]
+    assert search_cache.cached_search("Samsung", ["CCS"], lambda: {"status": "recomputed"}) == result
+
+
+def test_expired_owner_does_not_delete_a_lock_taken_by_another_caller(monkeypatch):
+    redis = FakeRedis()
+    _use(monkeypatch, redis)
+
+    def slow_compute():
+        # Our lock expires mid-compute and another caller takes it.
+        lock_key = next(key for key in redis.values if key.endswith(":lock"))
+        redis.values[lock_key] = "other-token"
+        return {"status": "success"}
+
+    search_cache.cached_search("samsung", None, slow_compute)
+    assert [value for key, value in redis.values.items() if key.endswith(":lock")] == ["other-token"]
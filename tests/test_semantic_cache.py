@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import importlib.util
+from types import SimpleNamespace
+
+UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "namwoo_app", "utils", "semantic_cache.py"))
+spec = importlib.util.spec_from_file_location("semantic_cache", UTILS_PATH)
+semantic_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(semantic_cache)
+
+NS = "ns"
+VECTORS = {
+    "horario de las tiendas": [1.0, 0.0, 0.0],
+    "¿cuál es el horario de las tiendas?": [0.99, 0.05, 0.0],
+    "métodos de pago": [0.0, 1.0, 0.0],
+    "hacen envíos a maracay": [0.0, 0.0, 1.0],
+}
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.ops = redis, []
+
+    def __getattr__(self, name):
+        return lambda *args: self.ops.append((name, args))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args) for name, args in self.ops]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values, self.hashes, self.hmget_calls = {}, {}, []
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key) or 0) + 1
+        return self.values[key]
+
+    def expire(self, key, seconds):
+        return True
+
+    def hkeys(self, key):
+        return list(self.hashes.get(key, {}))
+
+    def hmget(self, key, fields):
+        self.hmget_calls.append(list(fields))
+        return [self.hashes.get(key, {}).get(f) for f in fields]
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        return [k for k in list(self.values) + list(self.hashes) if k.startswith(prefix)]
+
+    def delete(self, *keys):
+        return sum(1 for k in keys if self.values.pop(k, None) is not None or self.hashes.pop(k, None) is not None)
+
+
+def make_cache(redis, mode="on", is_trivial=lambda text: False, **overrides):
+    settings = SimpleNamespace(
+        SEMANTIC_CACHE_MODE=mode, SEMANTIC_CACHE_THRESHOLD=0.95, SEMANTIC_CACHE_TTL=3600,
+        SEMANTIC_CACHE_MAX_ENTRIES=100, SEMANTIC_CACHE_MIN_WORDS=2, SEMANTIC_CACHE_MAX_QUERY_CHARS=60,
+        OPENAI_EMBEDDING_MODEL="text-embedding-3-small",
+    )
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+    counters = {}
+
+    def incr(name):
+        counters[name] = counters.get(name, 0) + 1
+
+    cache = semantic_cache.SemanticCache(settings, lambda: redis, embed=VECTORS.get,
+                                         normalize=lambda text: " ".join(text.casefold().split()), incr=incr,
+                                         is_trivial=is_trivial)
+    return cache, counters
+
+
+def test_eligibility():
+    cache, _ = make_cache(FakeRedis())
+    assert cache.is_eligible("Métodos de pago", None)
+    assert not cache.is_eligible("Métodos de pago", {"item_code": "D0006521"})  # Reservation in progress
+    assert not cache.is_eligible("sí", None)  # Follow-up
+    assert not cache.is_eligible("hola " * 20, None)  # Too long to be an FAQ
+    assert not cache.is_eligible(None, None)
+    off_cache, _ = make_cache(FakeRedis(), mode="off")
+    assert not off_cache.is_eligible("Métodos de pago", None)
+
+
+def test_only_turns_without_earlier_context_are_eligible():
+    cache, _ = make_cache(FakeRedis(), is_trivial=lambda text: text.lower().startswith("hola"))
+    question = "Métodos de pago"
+    greeting = [{"role": "user", "content": "Hola"}, {"role": "assistant", "content": "¡Hola! ¿En qué te ayudo?"}]
+    assert cache.is_eligible(question, None, [{"role": "user", "content": question}])
+    assert cache.is_eligible(question, None, greeting + [{"role": "user", "content": question}])
+    personal = [{"role": "user", "content": "Soy Ana, cédula 12345678"}, {"role": "assistant", "content": "Gracias, Ana."}]
+    assert not cache.is_eligible(question, None, personal + [{"role": "user", "content": question}])
+    tool_turn = [
+        {"role": "assistant", "content": None, "tool_calls": [{"id": "c1", "function": {"name": "find_products", "arguments": "{}"}}]},
+        {"role": "tool", "tool_call_id": "c1", "name": "find_products", "content": "{}"},
+    ]
+    assert not cache.is_eligible(question, None, greeting + tool_turn + [{"role": "user", "content": question}])
+
+
+def test_namespace_changes_with_everything_that_shapes_the_answer():
+    cache, _ = make_cache(FakeRedis())
+    tools = [{"name": "find_products"}]
+    base = cache.namespace("prompt", tools, "gpt-4o-mini")
+    assert cache.namespace("prompt", tools, "gpt-4o-mini") == base
+    assert cache.namespace("prompt v2", tools, "gpt-4o-mini") != base
+    assert cache.namespace("prompt", tools + [{"name": "x"}], "gpt-4o-mini") != base
+    assert cache.namespace("prompt", tools, "gpt-4o") != base
+    other_embeddings, _ = make_cache(FakeRedis(), OPENAI_EMBEDDING_MODEL="text-embedding-3-large")
+    assert other_embeddings.namespace("prompt", tools, "gpt-4o-mini") != base
+
+
+def test_store_dedupes_equivalent_questions():
+    redis = FakeRedis()
+    cache, counters = make_cache(redis)
+    cache.store("Horario de las tiendas", "De 9 a 6.", NS)
+    cache.store("¿Cuál es el horario de las tiendas?", "Otra redacción.", NS)
+    cache.store("métodos de pago", "Zelle y Cashea.", NS)
+    assert counters["semantic_cache_stores"] == 2
+    answers = sorted(json.loads(raw)["answer"] for raw in redis.hashes["semcache:ns:entries"].values())
+    assert answers == ["De 9 a 6.", "Zelle y Cashea."]
+
+
+def test_index_merges_new_entries_and_drops_expired_ones():
+    redis = FakeRedis()
+    writer, _ = make_cache(redis)
+    reader, _ = make_cache(redis)
+    writer.store("horario de las tiendas", "De 9 a 6.", NS)
+    assert reader.lookup("horario de las tiendas", NS) == "De 9 a 6."
+
+    writer.store("métodos de pago", "Zelle y Cashea.", NS)
+    redis.hmget_calls.clear()
+    assert reader.lookup("métodos de pago", NS) == "Zelle y Cashea."
+    assert [len(fields) for fields in redis.hmget_calls] == [1]  # Only the new entry is fetched
+
+    entries = redis.hashes["semcache:ns:entries"]
+    old_id = next(k for k, raw in entries.items() if json.loads(raw)["answer"] == "De 9 a 6.")
+    reader._index["entries"][reader._index["ids"].index(old_id)]["created_at"] = time.time() - 7200
+    redis.incr("semcache:ns:version")
+    assert reader.lookup("horario de las tiendas", NS) is None
+    assert reader._index["expired"] == [old_id]
+
+    reader.store("hacen envíos a maracay", "Sí, con delivery.", NS)
+    assert old_id not in entries  # Expired entries are removed on the next store
+    assert len(entries) == 2
+
+
+def test_entries_expire_without_a_version_change(monkeypatch):
+    redis = FakeRedis()
+    writer, _ = make_cache(redis)
+    reader, _ = make_cache(redis)
+    writer.store("horario de las tiendas", "De 9 a 6.", NS)
+    assert reader.lookup("horario de las tiendas", NS) == "De 9 a 6."
+
+    entry_id = next(iter(redis.hashes["semcache:ns:entries"]))
+    later = time.time() + 7200  # Past SEMANTIC_CACHE_TTL; nothing was stored meanwhile
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: later)
+    redis.hmget_calls.clear()
+    assert reader.lookup("horario de las tiendas", NS) is None
+    assert reader._index["expired"] == [entry_id]
+    assert redis.hmget_calls == []  # Rebuilt from memory
+
+
+def test_shadow_mode_counts_hits_without_serving_them():
+    redis = FakeRedis()
+    shadow, shadow_counters = make_cache(redis, mode="shadow")
+    shadow.store("horario de las tiendas", "De 9 a 6.", NS)
+    assert shadow.lookup("¿Cuál es el horario de las tiendas?", NS) is None
+    assert shadow.lookup("hacen envíos a maracay", NS) is None
+    assert shadow_counters == {"semantic_cache_stores": 1, "semantic_cache_shadow_hits": 1, "semantic_cache_misses": 1}
+
+    on, on_counters = make_cache(redis, mode="on")
+    assert on.lookup("¿Cuál es el horario de las tiendas?", NS) == "De 9 a 6."
+    assert on_counters == {"semantic_cache_hits": 1}
+
+
+def test_clear_removes_every_namespace():
+    redis = FakeRedis()
+    cache, _ = make_cache(redis)
+    cache.store("horario de las tiendas", "De 9 a 6.", "a")
+    cache.store("métodos de pago", "Zelle y Cashea.", "b")
+    assert semantic_cache.clear(redis) == 4
+    assert not redis.hashes and not redis.values
@@ -0,0 +1,43 @@
+import os
+import importlib.util
+
+import pytest
+
+UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "namwoo_app", "utils", "spec_parser.py"))
+spec = importlib.util.spec_from_file_location("spec_parser", UTILS_PATH)
+spec_parser = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(spec_parser)
+
+
+@pytest.mark.parametrize("specifitacion, item_name, expected", [
+    ("Pantalla: 6.5\" HD+ | RAM: 4GB | Almacenamiento: 128GB | Cámara: 50MP + 2MP | Batería: 5000mAh", None,
+     {"ram_gb": 4.0, "storage_gb": 128.0, "screen_in": 6.5, "camera_mp": 50.0, "battery_mah": 5000.0}),
+    ("Memoria interna de 1TB, 12 GB de RAM, pantalla de 6,7 pulgadas, cámara 200 MP, batería de 5.000 mAh", None,
+     {"ram_gb": 12.0, "storage_gb": 1024.0, "screen_in": 6.7, "camera_mp": 200.0, "battery_mah": 5000.0}),
+    (None, "SAMSUNG GALAXY A15 8GB+256GB NEGRO",
+     {"ram_gb": 8.0, "storage_gb": 256.0, "screen_in": None, "camera_mp": None, "battery_mah": None}),
+    ("", "XIAOMI REDMI A3 64GB",
+     {"ram_gb": None, "storage_gb": 64.0, "screen_in": None, "camera_mp": None, "battery_mah": None}),
+    ('Pantalla 6.6" 90Hz; 4GB+4GB RAM virtual; 128GB', None,
+     {"ram_gb": 4.0, "storage_gb": 128.0, "screen_in": 6.6, "camera_mp": None, "battery_mah": None}),
+])
+def test_parse_specs(specifitacion, item_name, expected):
+    assert spec_parser.parse_specs(specifitacion, item_name) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("celular 16gb ram", [("ram_gb", "=", 16.0)]),
+    ("celulares de más de 128gb", [("storage_gb", ">", 128.0)]),
+    ("celular entre 64 y 256gb", [("storage_gb", ">=", 64.0), ("storage_gb", "<=", 256.0)]),
+    ("telefono con ram de 6gb y 128gb", [("ram_gb", "=", 6.0), ("storage_gb", "=", 128.0)]),
+    ("celular bateria de al menos 5000mah", [("battery_mah", ">=", 5000.0)]),
+    ("celular hasta 4gb de ram", [("ram_gb", "<=", 4.0)]),
+    ("celular 8gb ram más de 128gb", [("ram_gb", "=", 8.0), ("storage_gb", ">", 128.0)]),
+    ("telefono 8gb de ram y 256 de almacenamiento", [("ram_gb", "=", 8.0), ("storage_gb", "=", 256.0)]),
+    ("celular con mas de 128 de almacenamiento", [("storage_gb", ">", 128.0)]),
+    ("celular 8/256gb", [("ram_gb", "=", 8.0), ("storage_gb", "=", 256.0)]),
+    ("samsung 6gb+128gb", [("ram_gb", "=", 6.0), ("storage_gb", "=", 128.0)]),
+    ("iphone 15", []),
+])
+def test_parse_query_filters(query, expected):
+    assert spec_parser.parse_query_filters(query) == expected
@@ -0,0 +1,43 @@
+import os
+import importlib.util
+import warnings
+
+import pytest
+
+UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "namwoo_app", "utils", "text_utils.py"))
+spec = importlib.util.spec_from_file_location("text_utils", UTILS_PATH)
+text_utils = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(text_utils)
+strip_html_to_text = text_utils.strip_html_to_text
+
+PARITY_CORPUS = [
+    "plain text only",
+    "<p>Hola <b>mundo</b></p>\n\n<p>  x  </p>",
+    "<ul><li>Pantalla 6.5\"</li><li>RAM 4GB</li></ul>",
+    "<p>a<!-- comentario -->b</p><script>var x=1;</script><style>p{}</style>ok",
+    "a &amp; b&nbsp;c<br>d",
+    "&lt;tag&gt; &#233; &eacute; café",
+    "<p>unclosed <b>bold",
+    "<table><tr><td>a</td><td>b</td></tr></table>",
+    "<p>a</p>tail<span>s</span>",
+    "<html><head><title>T</title></head><body>B</body></html>",
+    "a < b > c",
+    "<template>t</template>u",
+    "<![CDATA[z]]>q",
+    "<p>x</p><!--unterminated",
+    "<?xml version='1.0' encoding='utf-8'?><p>x</p>",
+    "   ",
+]
+
+
+@pytest.mark.parametrize("html", PARITY_CORPUS)
+def test_strip_html_to_text_matches_beautifulsoup(html):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert strip_html_to_text(html) == text_utils._strip_with_bs4(html)
+
+
+def test_strip_html_to_text_empty_inputs():
+    assert strip_html_to_text(None) == ""
+    assert strip_html_to_text("") == ""
+    assert strip_html_to_text(123) == ""
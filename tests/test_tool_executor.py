@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+import importlib.util
+
+UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "namwoo_app", "utils", "tool_executor.py"))
+spec = importlib.util.spec_from_file_location("tool_executor", UTILS_PATH)
+tool_executor = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(tool_executor)
+
+
+def test_read_only_calls_overlap_and_results_keep_call_order():
+    calls = ["find_products:a", "find_products:b", "get_branch_address:c"]
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def execute(call):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05 if call.endswith("a") else 0.01)
+        with lock:
+            running[0] -= 1
+        return call.upper()
+
+    started = time.perf_counter()
+    results = tool_executor.run_tool_calls(
+        calls, execute, parallel_safe=lambda c: c.split(":")[0] in tool_executor.READ_ONLY_TOOLS)
+    assert results == [c.upper() for c in calls]
+    assert peak[0] == 3
+    assert time.perf_counter() - started < 0.07 + 0.05  # max of the calls, not their sum
+
+
+def test_stateful_calls_are_barriers_and_prepare_runs_in_order():
+    calls = ["find_products:1", "save_customer_reservation_details:2", "query_accessories:3", "find_products:4"]
+    events = []
+    lock = threading.Lock()
+
+    def execute(call):
+        with lock:
+            events.append(("run", call))
+        return call
+
+    results = tool_executor.run_tool_calls(
+        calls, execute,
+        parallel_safe=lambda c: c.split(":")[0] in tool_executor.READ_ONLY_TOOLS,
+        prepare=lambda c: events.append(("prepare", c)),
+    )
+    assert results == calls
+    position = {event: i for i, event in enumerate(events)}
+    save = ("run", "save_customer_reservation_details:2")
+    assert position[("run", "find_products:1")] < position[("prepare", "save_customer_reservation_details:2")]
+    assert position[save] < position[("prepare", "query_accessories:3")] < position[("run", "query_accessories:3")]
+    assert position[("prepare", "find_products:4")] < position[("run", "query_accessories:3")]
+
+
+def test_state_changing_call_starts_a_new_segment():
+    calls = ["query_accessories:1", "find_products:caracas", "query_accessories:2", "get_branch_address:3"]
+    city = ["valencia"]
+    seen = {}
+
+    def prepare(call):
+        if call == "find_products:caracas":
+            city[0] = "caracas"
+
+    def execute(call):
+        seen[call] = city[0]
+        return call
+
+    results = tool_executor.run_tool_calls(
+        calls, execute,
+        parallel_safe=lambda c: c.split(":")[0] in tool_executor.READ_ONLY_TOOLS,
+        prepare=prepare,
+        changes_state=lambda c: c == "find_products:caracas",
+    )
+    assert results == calls
+    assert seen == {"query_accessories:1": "valencia", "find_products:caracas": "caracas",
+                    "query_accessories:2": "caracas", "get_branch_address:3": "caracas"}
@@ -0,0 +1,66 @@
+import os
+import json
+import importlib.util
+
+UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "namwoo_app", "utils", "tool_result_encoder.py"))
+spec = importlib.util.spec_from_file_location("tool_result_encoder", UTILS_PATH)
+tool_result_encoder = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(tool_result_encoder)
+
+
+def count(text):
+    return len(text) // 4 + 1
+
+
+def _group(n, description="Pantalla AMOLED de 6.5 pulgadas " * 10):
+    return {
+        "base_name": f"SAMSUNG A{n}", "brand": "SAMSUNG", "sub_category": "", "marketing_description": description,
+        "technical_specs": None,
+        "variants": [{"color": "N/A", "price": 199.0, "price_bolivar": 7000.0,
+                      "full_item_name": f"SAMSUNG A{n} 128GB", "item_code": f"D000{n}"}],
+        "locations": [{"branch_name": "CCCT", "total_stock": 3}],
+    }
+
+
+def test_long_keys_are_shortened_and_values_kept():
+    text, tokens = tool_result_encoder.encode({"status": "success", "products_grouped": [_group(1, "Buena")]}, 10_000, count)
+    data = json.loads(text)
+    group = data["products_grouped"][0]
+    assert group["desc"] == "Buena"
+    assert "sub_category" not in group and "subcat" not in group and "specs" not in group  # Empty free text
+    assert group["variants"][0] == {"color": "N/A", "price": 199.0, "price_bolivar": 7000.0,
+                                    "name": "SAMSUNG A1 128GB", "item_code": "D0001"}
+    assert group["locations"] == [{"branch_name": "CCCT", "stock": 3}]
+    assert text == json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    assert tokens == count(text)
+
+
+def test_empty_results_keep_their_shape():
+    for result in [{"status": "not_found", "products": []},
+                   {"status": "not_found", "product_details": None, "message": ""},
+                   {"status": "success", "accessories": {}}]:
+        text, _ = tool_result_encoder.encode(result, 1000, count)
+        assert json.loads(text) == result
+
+
+def test_budget_drops_the_tail_after_clipping_descriptions():
+    result = {"status": "success", "products_grouped": [_group(n) for n in range(1, 11)]}
+    full, _ = tool_result_encoder.encode(result, 100_000, count)
+    assert len(json.loads(full)["products_grouped"]) == 10
+
+    text, tokens = tool_result_encoder.encode(result, 400, count)
+    data = json.loads(text)
+    kept = data["products_grouped"]
+    assert 0 < len(kept) < 10
+    assert [g["base_name"] for g in kept] == [f"SAMSUNG A{n}" for n in range(1, len(kept) + 1)]  # Relevance order
+    assert data["truncated"] == {"shown": len(kept), "omitted_products": 10 - len(kept)}
+    assert any(g["desc"].endswith("…") for g in kept)
+    assert tokens <= 400
+
+
+def test_table_format():
+    text, _ = tool_result_encoder.encode({"status": "success", "products_grouped": [_group(1, "Buena")]}, 10_000, count, fmt="table")
+    header, columns, row = text.split("\n")
+    assert json.loads(header) == {"status": "success"}
+    assert columns.startswith("products_grouped: base_name|brand|")
+    assert row == "SAMSUNG A1|SAMSUNG|D0001:N/A:$199:Bs7000|CCCT(3)|Buena|"